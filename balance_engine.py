@@ -0,0 +1,178 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import money
+
+SHARE_SUFFIX = "'s share"
+
+# Function to build the name of the explicit share column for a person
+def share_column(person):
+    return f"{person}{SHARE_SUFFIX}"
+
+# Function to intern participant names into integer IDs, in order of first appearance (payers first)
+def build_participant_registry(payers, members):
+    names = pd.Series(list(payers) + list(members), dtype=object)
+    codes, participants = pd.factorize(names, use_na_sentinel=True)
+    codes = codes.astype(np.int32)
+    return np.asarray(participants, dtype=object), codes[:len(payers)], codes[len(payers):]
+
+# Function to encode a preprocessed ledger into compact arrays keyed by participant IDs
+def encode_ledger(df):
+    n_rows = len(df)
+    shared_with = [people if isinstance(people, list) else [] for people in df['Shared with']]
+
+    # 'Shared with' as CSR: row i's members are shared_members[shared_offsets[i]:shared_offsets[i + 1]]
+    shared_offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum([len(people) for people in shared_with], out=shared_offsets[1:])
+    members = list(itertools.chain.from_iterable(shared_with))
+
+    payers = df['Paying person'].where(df['Paying person'] != '')
+    participants, payer_ids, shared_members = build_participant_registry(payers, members)
+
+    # Explicit shares as a sparse (row, participant, value) list; the column name is resolved once per column
+    person_ids = {person: i for i, person in enumerate(participants)}
+    explicit_rows, explicit_people, explicit_values = [], [], []
+    for column in df.columns:
+        if not (isinstance(column, str) and column.endswith(SHARE_SUFFIX)):
+            continue
+        person_id = person_ids.get(column[:-len(SHARE_SUFFIX)])
+        if person_id is None:
+            continue  # Nobody by that name shares any expense, so the column can never apply
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+        rows = np.flatnonzero(~np.isnan(values))
+        explicit_rows.append(rows)
+        explicit_people.append(np.full(len(rows), person_id, dtype=np.int32))
+        explicit_values.append(values[rows])
+
+    return {
+        'participants': participants,
+        'payer_ids': payer_ids,
+        'amounts': df['Amount'].to_numpy(dtype=float),
+        'shared_offsets': shared_offsets,
+        'shared_members': shared_members,
+        'explicit_rows': np.concatenate(explicit_rows) if explicit_rows else np.zeros(0, dtype=np.int64),
+        'explicit_people': np.concatenate(explicit_people) if explicit_people else np.zeros(0, dtype=np.int32),
+        'explicit_values': np.concatenate(explicit_values) if explicit_values else np.zeros(0),
+    }
+
+# Function to look up the explicit share of every 'Shared with' entry, NaN where none is given
+def lookup_explicit_shares(ledger, entry_rows, entry_people):
+    n_people = max(len(ledger['participants']), 1)
+    explicit_keys = ledger['explicit_rows'].astype(np.int64) * n_people + ledger['explicit_people']
+    order = np.argsort(explicit_keys, kind='stable')
+    explicit_keys = explicit_keys[order]
+    explicit_values = ledger['explicit_values'][order]
+
+    entry_keys = entry_rows * n_people + entry_people
+    positions = np.searchsorted(explicit_keys, entry_keys)
+    found = positions < len(explicit_keys)
+    found[found] = explicit_keys[positions[found]] == entry_keys[found]
+    explicit = np.full(len(entry_keys), np.nan)
+    explicit[found] = explicit_values[positions[found]]
+    return explicit
+
+# Function to compute the share of every 'Shared with' entry using explicit, equal and remainder splits.
+# With exact=True all amounts are int64 øre and splits use largest-remainder allocation, so the
+# shares of every expense add up to its amount exactly.
+def compute_shares(ledger, exact=False):
+    offsets = ledger['shared_offsets']
+    n_rows = len(offsets) - 1
+    participants_per_row = np.diff(offsets)
+    entry_rows = np.repeat(np.arange(n_rows, dtype=np.int64), participants_per_row)
+    entry_people = ledger['shared_members']
+    explicit = lookup_explicit_shares(ledger, entry_rows, entry_people)
+    has_explicit = ~np.isnan(explicit)
+
+    amounts = ledger['amounts']
+    explicit_values = np.where(has_explicit, explicit, 0.0)
+    if exact:
+        amounts = money.to_minor_units(amounts)
+        explicit_values = money.to_minor_units(explicit_values)
+
+    # Per-expense aggregates
+    explicit_per_row = np.bincount(entry_rows, weights=has_explicit, minlength=n_rows).astype(np.int64)
+    if exact:
+        explicit_total_per_row = money.sum_by_group(entry_rows, explicit_values, n_rows)
+    else:
+        explicit_total_per_row = np.bincount(entry_rows, weights=explicit_values, minlength=n_rows)
+    row_amount = amounts[entry_rows]
+    row_has_explicit = explicit_per_row[entry_rows] > 0
+    without_shares = participants_per_row[entry_rows] - explicit_per_row[entry_rows]
+
+    # No explicit shares: split the amount equally between everybody in 'Shared with'
+    equal_split = ~row_has_explicit
+    # Explicit shares not covering the amount: split the remainder between people without a share
+    remainder_split = row_has_explicit & ~has_explicit & (explicit_total_per_row[entry_rows] < row_amount)
+    remainder = row_amount - explicit_total_per_row[entry_rows]
+
+    if exact:
+        # Position of each entry among everybody in the row, and among the people without a share
+        position = np.arange(len(entry_rows)) - offsets[entry_rows]
+        without_prefix = np.concatenate([[0], np.cumsum(~has_explicit)])
+        remainder_position = without_prefix[:-1] - without_prefix[offsets[entry_rows]]
+        shares = np.where(has_explicit, explicit_values, 0)
+        shares = np.where(equal_split, money.allocate_evenly(row_amount, participants_per_row[entry_rows], position), shares)
+        shares = np.where(remainder_split, money.allocate_evenly(remainder, without_shares, remainder_position), shares)
+    else:
+        shares = explicit_values
+        shares = np.where(equal_split, row_amount / np.maximum(participants_per_row[entry_rows], 1), shares)
+        shares = np.where(remainder_split, remainder / np.maximum(without_shares, 1), shares)
+
+    applied = (has_explicit | equal_split | remainder_split) & (entry_people >= 0)
+    return {'rows': entry_rows, 'people': entry_people, 'explicit': explicit, 'shares': shares, 'applied': applied, 'exact': exact}
+
+# Function to sum the paid amounts per participant ID, in øre when exact
+def paid_totals(ledger, exact=False):
+    payer_ids = ledger['payer_ids']
+    known = payer_ids >= 0
+    size = len(ledger['participants'])
+    counts = np.bincount(payer_ids[known], minlength=size)
+    if exact:
+        return money.sum_by_group(payer_ids[known], money.to_minor_units(ledger['amounts'][known]), size), counts
+    return np.bincount(payer_ids[known], weights=ledger['amounts'][known], minlength=size), counts
+
+# Function to sum the applied shares per participant ID, in øre when the entries are exact
+def share_totals(ledger, entries=None):
+    if entries is None:
+        entries = compute_shares(ledger)
+    applied = entries['applied']
+    size = len(ledger['participants'])
+    counts = np.bincount(entries['people'][applied], minlength=size)
+    if entries['exact']:
+        return money.sum_by_group(entries['people'][applied], entries['shares'][applied], size), counts
+    return np.bincount(entries['people'][applied], weights=entries['shares'][applied], minlength=size), counts
+
+# Function to convert the compact share entries to a long DataFrame with participant names
+def entries_to_frame(ledger, entries):
+    people = entries['people']
+    names = ledger['participants'][np.maximum(people, 0)] if len(ledger['participants']) else np.zeros(len(people), dtype=object)
+    shares = money.from_minor_units(entries['shares']) if entries['exact'] else entries['shares']
+    return pd.DataFrame({
+        'row': entries['rows'],
+        'person': names,
+        'explicit': entries['explicit'],
+        'share': shares,
+        'applied': entries['applied'],
+    })
+
+# Function to calculate the total expenses paid by each individual
+def calculate_paid_totals(df, ledger=None, exact=False):
+    if ledger is None:
+        ledger = encode_ledger(df)
+    totals, counts = paid_totals(ledger, exact)
+    if exact:
+        totals = money.from_minor_units(totals)
+    return {person: round(float(amount), 2) for person, amount, count in zip(ledger['participants'], totals, counts) if count > 0}
+
+# Function to calculate the total shares owed by each individual
+def calculate_share_totals(df, ledger=None, entries=None, exact=False):
+    if ledger is None:
+        ledger = encode_ledger(df)
+    if entries is None:
+        entries = compute_shares(ledger, exact)
+    totals, counts = share_totals(ledger, entries)
+    if entries['exact']:
+        totals = money.from_minor_units(totals)
+    return {person: float(share) for person, share, count in zip(ledger['participants'], totals, counts) if count > 0}
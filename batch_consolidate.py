@@ -0,0 +1,126 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import ledger
+import money
+import rate_provider
+import report_writer
+
+SUMMARY_FILE = 'batch_summary.txt'
+
+# Function to expand the given paths and glob patterns into a sorted list of unique workbooks
+def expand_paths(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*.xlsx')
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        files.extend(match for match in matches if match.endswith('.xlsx') and not os.path.basename(match).startswith('~$'))
+    return sorted(dict.fromkeys(os.path.abspath(f) for f in files))
+
+# Function to run the whole consolidation pipeline on one workbook, timing each stage
+def consolidate_workbook(file_name, exchange_rates, output_dir=None, exact=False, formats=None):
+    timings = {}
+    result = {'file': file_name, 'timings': timings}
+    try:
+        start = time.perf_counter()
+        expenses = ledger.Ledger.load(file_name, exchange_rates=exchange_rates, exact=exact)
+        timings['load'] = time.perf_counter() - start
+        result['rows'] = expenses.row_count
+        if expenses.empty:
+            result['status'] = 'empty'
+            return result
+
+        start = time.perf_counter()
+        net_balances = expenses.net_balances
+        timings['balances'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        simplified_debts = expenses.settlement()
+        timings['settlement'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result['report'] = expenses.write_reports(output_dir=output_dir or os.path.dirname(file_name), formats=formats)
+        timings['report'] = time.perf_counter() - start
+
+        result['people'] = len(net_balances)
+        result['transfers'] = len(simplified_debts)
+        result['status'] = 'ok'
+    except Exception as e:
+        # One broken workbook should not stop the rest of the batch
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+# Function to consolidate many workbooks across a process pool
+def consolidate_many(files, workers=None, output_dir=None, rate_source=None, exact=False, formats=None):
+    # Fetch the rates once in the parent and hand the same snapshot to every worker
+    exchange_rates = rate_provider.get_exchange_rates(rate_source)
+    if exchange_rates is None:
+        print(f"No exchange rates available: using only {rate_provider.base_currency()} values, other currencies are not converted.")
+        exchange_rates = {}
+
+    if workers == 1 or len(files) <= 1:
+        return [consolidate_workbook(f, exchange_rates, output_dir, exact, formats) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(consolidate_workbook, files, [exchange_rates] * len(files), [output_dir] * len(files),
+                             [exact] * len(files), [formats] * len(files)))
+
+# Function to write the combined summary of a batch run
+def write_summary(results, summary_file, elapsed):
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        f.write("Batch Consolidation Summary\n")
+        f.write(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Workbooks: {len(results)}, total time {elapsed:.2f} s\n\n")
+        for result in results:
+            timings = result['timings']
+            f.write(f"{result['file']}\n")
+            f.write(f"  Status: {result['status']}\n")
+            if result['status'] == 'error':
+                f.write(f"  Error: {result['error']}\n")
+            if 'rows' in result:
+                f.write(f"  Rows: {result['rows']}\n")
+            if result['status'] == 'ok':
+                f.write(f"  People: {result['people']}, transfers: {result['transfers']}\n")
+                f.write(f"  Report: {result['report']}\n")
+            stages = ', '.join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items())
+            f.write(f"  Timings: {stages or 'n/a'} (total {sum(timings.values()) * 1000:.1f} ms)\n\n")
+    return summary_file
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consolidate many expense workbooks without prompting.")
+    parser.add_argument('paths', nargs='+', help="Workbooks, directories or glob patterns (e.g. 'groups/**/*.xlsx')")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('-o', '--output-dir', default=None, help="Directory for the reports (default: next to each workbook)")
+    parser.add_argument('--summary', default=SUMMARY_FILE, help=f"Combined summary file (default: {SUMMARY_FILE})")
+    parser.add_argument('--rates', default=None, help="Exchange-rate source: a URL or a local JSON/CSV file")
+    parser.add_argument('--exact-money', action='store_true', default=money.exact_money_enabled(),
+                        help="Compute in integer øre so every expense splits exactly")
+    parser.add_argument('--formats', default=None,
+                        help=f"Comma-separated report formats out of {', '.join(report_writer.REPORT_FORMATS)} (default: txt)")
+    args = parser.parse_args(argv)
+
+    files = expand_paths(args.paths)
+    if not files:
+        print("No .xlsx files matched.")
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Processing {len(files)} workbooks...")
+    start = time.perf_counter()
+    formats = report_writer.report_formats(args.formats)
+    results = consolidate_many(files, args.workers, args.output_dir, args.rates, args.exact_money, formats)
+    summary_file = write_summary(results, args.summary, time.perf_counter() - start)
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    print(f"Summary written to {summary_file} ({len(results) - failed} succeeded, {failed} failed)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
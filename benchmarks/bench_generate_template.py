@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_template
+
+# Per-cell cost may vary by at most this factor between the smallest and largest template
+LINEARITY_TOLERANCE = 2.0
+
+# Function to time the generation of one template and measure its file size
+def measure(directory, num_rows, num_people):
+    people_names = [f"Person{i:03d}" for i in range(num_people)]
+    doc_name = os.path.join(directory, f"bench_{num_rows}_{num_people}")
+    start = time.perf_counter()
+    generate_template.create_expense_template(doc_name, people_names, 'DKK', num_rows)
+    elapsed = time.perf_counter() - start
+    return elapsed, os.path.getsize(f"{doc_name}.xlsx")
+
+# Main function to execute the benchmark
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that template generation scales linearly.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 2000, 4000, 8000])
+    parser.add_argument('--people', type=int, nargs='+', default=[5, 40])
+    args = parser.parse_args(argv)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        for num_people in args.people:
+            print(f"\n{num_people} people")
+            print(f"{'rows':>8} {'seconds':>9} {'us/cell':>9} {'KB':>9} {'bytes/cell':>11}")
+            per_cell = []
+            for num_rows in args.rows:
+                elapsed, size = measure(directory, num_rows, num_people)
+                cells = num_rows * (len(generate_template.BASE_COLUMNS) + len(generate_template.OPTIONAL_COLUMNS) + num_people)
+                per_cell.append(elapsed / cells)
+                print(f"{num_rows:>8} {elapsed:>9.3f} {elapsed / cells * 1e6:>9.2f} {size / 1024:>9.1f} {size / cells:>11.2f}")
+            ratio = max(per_cell) / min(per_cell)
+            verdict = 'linear' if ratio <= LINEARITY_TOLERANCE else 'NOT linear'
+            print(f"per-cell time varies by {ratio:.2f}x: {verdict}")
+            failed = failed or ratio > LINEARITY_TOLERANCE
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
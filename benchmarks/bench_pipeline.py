@@ -0,0 +1,124 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ledger
+from synthetic_ledger import generate_ledger, write_rates_file
+
+# Scenarios as (name, rows, people, currencies, explicit share density)
+SCENARIOS = {
+    'small': [('small', 200, 5, 1, 0.1)],
+    'default': [
+        ('rows-10k', 10000, 10, 1, 0.1),
+        ('rows-50k', 50000, 10, 1, 0.1),
+        ('people-60', 10000, 60, 1, 0.1),
+        ('currencies-5', 10000, 10, 5, 0.1),
+        ('explicit-50pct', 10000, 10, 1, 0.5),
+    ],
+}
+SCENARIOS['all'] = SCENARIOS['small'] + SCENARIOS['default']
+
+# Timings slower than baseline * tolerance are reported as regressions
+DEFAULT_TOLERANCE = 1.5
+
+# Function to time each stage and, if requested, measure its peak traced memory
+def measure_stages(file_name, rates_file, output_dir, measure_memory=True):
+    # Every stage uses the aggregate the ledger from the load stage computed before, as consolidate_report does
+    stages = [
+        ('load', lambda state: ledger.Ledger.load(file_name, rate_source=rates_file, use_cache=False)),
+        ('paid', lambda state: state['load'].paid_totals),
+        ('payments', lambda state: state['load'].person_payments),
+        ('shares', lambda state: (state['load'].share_totals, state['load'].personal_item_costs)),
+        ('settlement', lambda state: state['load'].settlement()),
+        ('report', lambda state: state['load'].write_reports(output_dir=output_dir)),
+    ]
+
+    measurements = {}
+    state = {}
+    for name, stage in stages:
+        gc.collect()
+        start = time.perf_counter()
+        state[name] = stage(state)
+        measurements[name] = {'seconds': time.perf_counter() - start}
+
+    if measure_memory:
+        # A separate pass, because tracing allocations slows every stage down
+        state = {}
+        for name, stage in stages:
+            gc.collect()
+            tracemalloc.start()
+            state[name] = stage(state)
+            measurements[name]['peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+    measurements['rows'] = state['load'].row_count
+    return measurements
+
+# Function to compare measurements against a stored baseline, returning a list of regressions
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scenario, stages in results.items():
+        for stage, values in stages.items():
+            if not isinstance(values, dict):
+                continue
+            base = baseline.get(scenario, {}).get(stage)
+            if not base:
+                continue
+            for metric in ('seconds', 'peak_mb'):
+                if metric in values and metric in base and base[metric] > 0 and values[metric] > base[metric] * tolerance:
+                    regressions.append(f"{scenario}/{stage} {metric}: {values[metric]:.3f} vs baseline {base[metric]:.3f}")
+    return regressions
+
+# Function to print the measurements of one scenario as a table
+def print_table(scenario, measurements):
+    print(f"\n{scenario} ({measurements['rows']} rows)")
+    print(f"{'stage':<12} {'seconds':>9} {'peak MB':>9}")
+    for stage, values in measurements.items():
+        if isinstance(values, dict):
+            peak = f"{values['peak_mb']:.1f}" if 'peak_mb' in values else '-'
+            print(f"{stage:<12} {values['seconds']:>9.3f} {peak:>9}")
+
+# Main function to execute the benchmark
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the consolidation pipeline on synthetic ledgers.")
+    parser.add_argument('--scenarios', choices=sorted(SCENARIOS), default='default')
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--output', help="Write the measurements to this JSON file")
+    parser.add_argument('--save-baseline', help="Store the measurements as the baseline in this JSON file")
+    parser.add_argument('--baseline', help="Compare against the baseline in this JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, rows, people, currencies, density in SCENARIOS[args.scenarios]:
+            file_name = generate_ledger(os.path.join(directory, f"{name}.xlsx"), rows, people, currencies, density)
+            rates_file = write_rates_file(os.path.join(directory, 'rates.json'))
+            results[name] = measure_stages(file_name, rates_file, directory, not args.no_memory)
+            print_table(name, results[name])
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_ledger import generate_ledger, write_rates_file
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points whose import must stay cheap, and the import-time budget for each in seconds
+ENTRY_POINTS = ['consolidate', 'consolidate_report', 'batch_consolidate', 'consolidate_groups']
+DEFAULT_IMPORT_BUDGET = 0.15
+
+# Modules that importing an entry point must not load
+HEAVY_MODULES = ['pandas', 'numpy', 'requests']
+
+# Modules the small-ledger path must not load (openpyxl itself imports numpy when it is installed)
+SMALL_LEDGER_HEAVY_MODULES = ['pandas', 'requests']
+
+SMALL_LEDGER_ROWS = 200
+
+# Each measurement runs in a fresh interpreter, so nothing is already imported
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+SMALL_LEDGER_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import consolidate_report, ledger
+ledger.select_file = lambda: {file_name!r}
+consolidate_report.main()
+print(json.dumps({{'seconds': time.perf_counter() - start, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+# Function to run a script in a fresh interpreter and return the JSON it prints last
+def run_fresh(script, env=None, cwd=None):
+    result = subprocess.run([sys.executable, '-c', script], cwd=cwd or REPO_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# Function to measure the import time of every entry point, keeping the best of several runs
+def measure_imports(repeat):
+    results = {}
+    for module in ENTRY_POINTS:
+        runs = [run_fresh(IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)) for _ in range(repeat)]
+        results[module] = {'seconds': min(run['seconds'] for run in runs), 'heavy': runs[0]['heavy']}
+    return results
+
+# Function to time a whole consolidate_report run on a small ledger in a fresh interpreter
+def measure_small_ledger(repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = generate_ledger(os.path.join(directory, 'small.xlsx'), SMALL_LEDGER_ROWS, 5, 2, 0.1)
+        env = dict(os.environ, PYTHONPATH=REPO_DIR, EXPENSE_SPLITTER_RATES=write_rates_file(os.path.join(directory, 'rates.json')))
+        env.pop('EXPENSE_SPLITTER_EXACT_MONEY', None)
+        script = SMALL_LEDGER_SCRIPT.format(file_name=file_name, heavy=SMALL_LEDGER_HEAVY_MODULES)
+        runs = [run_fresh(script, env, directory) for _ in range(repeat)]
+    return {'seconds': min(run['seconds'] for run in runs), 'heavy': runs[0]['heavy']}
+
+# Main function to execute the benchmark
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the command-line entry points start quickly.")
+    parser.add_argument('--budget', type=float, default=DEFAULT_IMPORT_BUDGET, help="Import-time budget per entry point in seconds")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'entry point':<22} {'import s':>9}  heavy modules")
+    for module, result in measure_imports(args.repeat).items():
+        print(f"{module:<22} {result['seconds']:>9.3f}  {', '.join(result['heavy']) or '-'}")
+        if result['seconds'] > args.budget:
+            failures.append(f"importing {module} took {result['seconds']:.3f} s (budget {args.budget:.3f} s)")
+        if result['heavy']:
+            failures.append(f"importing {module} loaded {', '.join(result['heavy'])}")
+
+    small = measure_small_ledger(args.repeat)
+    print(f"\nconsolidate_report on {SMALL_LEDGER_ROWS} rows: {small['seconds']:.3f} s, heavy modules: {', '.join(small['heavy']) or '-'}")
+    if small['heavy']:
+        failures.append(f"the small-ledger path loaded {', '.join(small['heavy'])}")
+
+    if failures:
+        print("\nOver budget:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nAll entry points within budget.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_ledger import SYNTHETIC_RATES
+
+# Function to express the synthetic DKK rates relative to another base currency
+def rebase(rates, base):
+    base_rate = rates.get(base)
+    if base_rate is None:
+        return None
+    return {currency: rate / base_rate for currency, rate in rates.items()}
+
+# Local stand-in for the exchange-rate services: /latest/<base> like the latest-rates API,
+# and /<YYYY-MM-DD>?from=<base> like the historical API. Every date gets the same synthetic rates.
+class StubRatesHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'latest':
+            base = parts[1].upper()
+        elif len(parts) == 1 and parts[0]:
+            base = parse_qs(url.query).get('from', ['DKK'])[0].upper()
+        else:
+            base = None
+        rates = rebase(SYNTHETIC_RATES, base) if base else None
+
+        if rates is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({'base': base, 'rates': rates}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to start the stub server in a background thread, returning the server and its base URL
+def start_stub_server(port=0, delay=0.0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubRatesHandler)
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic exchange rates locally in place of the real services.")
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before every answer, to exercise timeouts")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubRatesHandler)
+    server.delay = args.delay
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Latest rates:     {url}/latest/{{base}}")
+    print(f"Historical rates: {url}/{{date}}?from={{base}}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+
+import generate_template
+
+# Currencies with fixed, made-up rates (units per DKK) so benchmark runs never touch the network
+SYNTHETIC_RATES = {'DKK': 1.0, 'EUR': 0.134, 'SEK': 1.55, 'NOK': 1.57, 'USD': 0.146, 'GBP': 0.115, 'CHF': 0.128, 'PLN': 0.58}
+
+# Function to write a rates file the rate provider can read instead of the exchange-rate service
+def write_rates_file(path, currencies=None):
+    rates = {currency: rate for currency, rate in SYNTHETIC_RATES.items() if currencies is None or currency in currencies or currency == 'DKK'}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'rates': rates}, f)
+    return path
+
+# Function to generate a filled-in expense workbook with the template's column layout
+def generate_ledger(path, num_rows, num_people, num_currencies=1, explicit_density=0.1, seed=0):
+    rng = random.Random(seed)
+    people_names = [f"Person{i:03d}" for i in range(num_people)]
+    currencies = list(SYNTHETIC_RATES)[:max(1, min(num_currencies, len(SYNTHETIC_RATES)))]
+    share_columns = len(people_names)
+
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet('Sheet1')
+    sheet.append(generate_template.BASE_COLUMNS + [f"{person}'s share" for person in people_names])
+
+    for i in range(num_rows):
+        amount = round(rng.uniform(5, 2000), 2)
+        shared_with = rng.sample(people_names, rng.randint(1, num_people))
+        shares = [None] * share_columns
+        # Explicit shares for some of the sharers, never more than the amount in total
+        if rng.random() < explicit_density:
+            for person in rng.sample(shared_with, rng.randint(1, len(shared_with))):
+                shares[people_names.index(person)] = round(amount / (len(shared_with) + 1), 2)
+        sheet.append([rng.choice(people_names), f"Expense {i}", amount, rng.choice(currencies), ', '.join(shared_with)] + shares)
+
+    book.save(path)
+    return path
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic expense workbook for benchmarking.")
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--people', type=int, default=10)
+    parser.add_argument('--currencies', type=int, default=1)
+    parser.add_argument('--explicit-density', type=float, default=0.1, help="Fraction of rows with explicit shares")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    generate_ledger(args.path, args.rows, args.people, args.currencies, args.explicit_density, args.seed)
+    print(f"Synthetic ledger written to {args.path}")
+
+if __name__ == "__main__":
+    main()
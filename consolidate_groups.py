@@ -0,0 +1,160 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ledger
+import money
+import rate_provider
+import report_writer
+
+# Function to split a --sheets value into a list of sheet names, None meaning every sheet
+def sheet_list(sheets):
+    if not sheets:
+        return None
+    if isinstance(sheets, str):
+        sheets = sheets.split(',')
+    return [sheet.strip() for sheet in sheets if sheet.strip()]
+
+# Function to read the raw rows of every expense sheet (or only the chosen ones) in one pass over the workbook.
+# Returns {sheet name: (header, rows)}; hidden sheets and sheets without a 'Paying person' column are skipped
+# unless they were asked for by name.
+def read_groups(file_name, sheets=None):
+    from openpyxl import load_workbook
+
+    wanted = sheet_list(sheets)
+    groups = {}
+    # Read-only mode streams the rows, and the workbook is opened and parsed once for all sheets
+    book = load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        for sheet in book.worksheets:
+            if wanted is not None and sheet.title not in wanted:
+                continue
+            if wanted is None and sheet.sheet_state != 'visible':
+                continue
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            header = [str(name).strip() if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+            if 'Paying person' not in header:
+                if wanted is not None:
+                    print(f"Sheet {sheet.title} has no 'Paying person' column, skipping it.")
+                continue
+            groups[sheet.title] = (header, [row[:len(header)] for row in rows])
+    finally:
+        book.close()
+
+    if wanted is not None:
+        for name in wanted:
+            if name not in groups and name not in book.sheetnames:
+                print(f"Sheet {name} not found in {file_name}.")
+    return groups
+
+# Function to build the file name a group's reports are named after, e.g. trips.xlsx + Rome -> trips_Rome.xlsx
+def group_file_name(file_name, group):
+    base, extension = os.path.splitext(file_name)
+    return f"{base}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', group).strip('_') or 'sheet'}{extension}"
+
+# Function to consolidate one group from its raw rows and write its reports, timing each stage
+def consolidate_group(file_name, group, header, rows, exchange_rates, output_dir=None, exact=False, formats=None):
+    import streaming
+
+    timings = {}
+    result = {'group': group, 'timings': timings}
+    try:
+        start = time.perf_counter()
+        df = streaming.convert_chunk(streaming.clean_chunk(rows, header), exchange_rates or None)
+        expenses = ledger.Ledger(df, exact, group_file_name(file_name, group))
+        timings['load'] = time.perf_counter() - start
+        result['rows'] = expenses.row_count
+        if expenses.empty:
+            result['status'] = 'empty'
+            result['net_balances'] = {}
+            return result
+
+        start = time.perf_counter()
+        net_balances = expenses.net_balances
+        timings['balances'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        simplified_debts = expenses.settlement()
+        timings['settlement'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result['report'] = expenses.write_reports(output_dir=output_dir or os.path.dirname(os.path.abspath(file_name)),
+                                                  formats=formats)
+        timings['report'] = time.perf_counter() - start
+
+        result['net_balances'] = net_balances
+        result['transfers'] = len(simplified_debts)
+        result['status'] = 'ok'
+    except Exception as e:
+        # One broken sheet should not stop the other groups
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+# Function to consolidate every group of a workbook, in a process pool when workers is not 1
+def consolidate_groups(file_name, sheets=None, workers=1, output_dir=None, rate_source=None, exact=False, formats=None):
+    groups = read_groups(file_name, sheets)
+
+    # Fetch the rates once and hand the same snapshot to every group
+    exchange_rates = rate_provider.get_exchange_rates(rate_source)
+    if not exchange_rates:
+        print(f"No exchange rates available: using only {rate_provider.base_currency()} values, other currencies are not converted.")
+        exchange_rates = {}
+
+    jobs = [(file_name, group, header, rows, exchange_rates, output_dir, exact, formats) for group, (header, rows) in groups.items()]
+    if workers == 1 or len(jobs) <= 1:
+        return [consolidate_group(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(consolidate_group, *zip(*jobs)))
+
+# Function to add up everybody's balance over all groups: {person: {group: balance}} and {person: total}
+def combine_balances(results):
+    by_person = {}
+    for result in results:
+        for person, balance in result.get('net_balances', {}).items():
+            by_person.setdefault(person, {})[result['group']] = balance
+    combined = {person: round(sum(balances.values()), 2) for person, balances in by_person.items()}
+    return by_person, combined
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consolidate every sheet of a workbook as a separate group, plus a combined view.")
+    parser.add_argument('file', help="Workbook with one sheet per group or period")
+    parser.add_argument('--sheets', default=None, help="Comma-separated sheet names to consolidate (default: every visible sheet)")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="Number of worker processes (default: 1, 0 for the CPU count)")
+    parser.add_argument('-o', '--output-dir', default=None, help="Directory for the reports (default: next to the workbook)")
+    parser.add_argument('--rates', default=None, help="Exchange-rate source: a URL or a local JSON/CSV file")
+    parser.add_argument('--exact-money', action='store_true', default=money.exact_money_enabled(),
+                        help="Compute in integer øre so every expense splits exactly")
+    parser.add_argument('--formats', default=None,
+                        help=f"Comma-separated report formats out of {', '.join(report_writer.REPORT_FORMATS)} (default: txt)")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Processing {args.file}...")
+    start = time.perf_counter()
+    formats = report_writer.report_formats(args.formats)
+    results = consolidate_groups(args.file, args.sheets, args.workers or None, args.output_dir, args.rates,
+                                 args.exact_money, formats)
+    if not results:
+        print("No expense sheets found.")
+        return 1
+
+    by_person, combined = combine_balances(results)
+    simplified_debts = ledger.simplify_debts(combined)
+    summary_file = report_writer.write_group_summary(args.file, results, by_person, combined, simplified_debts,
+                                                     time.perf_counter() - start, args.output_dir)
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    print(f"Combined balances written to {summary_file} ({len(results) - failed} groups succeeded, {failed} failed)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import incremental_state
+import ledger
+import money
+import rate_provider
+import rate_table
+import settlement
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_POLL_SECONDS = 1.0
+
+# Resident ledger for one workbook. Readers only ever see a complete snapshot: a reload builds
+# the next snapshot on the side and swaps it in with a single assignment, so queries never wait on it.
+class LedgerService:
+
+    def __init__(self, file_name, rate_source=None, exact=False):
+        self.file_name = os.path.abspath(file_name)
+        self.rate_source = rate_source
+        self.exact = exact
+        self.exchange_rates = None
+        self.rates_loaded_at = 0
+        self.state = None
+        self.file_signature = None
+        self.reload_lock = threading.Lock()
+        self.snapshot = None
+        self.reload()
+
+    # Keep the rates resident, refreshing them once they are older than the rate cache TTL
+    def current_rates(self):
+        if self.exchange_rates is None or time.time() - self.rates_loaded_at > rate_provider.DEFAULT_TTL_SECONDS:
+            self.exchange_rates = rate_provider.get_exchange_rates(self.rate_source) or {}
+            self.rates_loaded_at = time.time()
+        return self.exchange_rates
+
+    # Function to identify the current version of the workbook on disk
+    def signature(self):
+        stat = os.stat(self.file_name)
+        return stat.st_mtime_ns, stat.st_size
+
+    # Re-read the workbook and recompute only the rows that changed since the previous snapshot
+    def reload(self):
+        with self.reload_lock:
+            signature = self.signature()
+            start = time.perf_counter()
+            # Dates whose rates failed during an earlier reload are asked for again, rather than for the life of the process
+            rate_table.forget_remote_history()
+            expenses = ledger.Ledger.load(self.file_name, exchange_rates=self.current_rates(), exact=self.exact)
+            if self.exact:
+                processed_rows = expenses.row_count
+            else:
+                self.state, processed_rows = incremental_state.refresh_state(expenses.df, self.state)
+                expenses.paid_totals, expenses.share_totals = incremental_state.state_totals(self.state)
+            # Only the totals stay resident, not the DataFrame; the auto settlement is ready before the swap
+            totals = ledger.Ledger.from_totals(expenses.paid_totals, expenses.share_totals, row_count=expenses.row_count,
+                                               file_name=self.file_name, unconverted_currencies=expenses.unconverted_currencies)
+            totals.settlement()
+
+            self.snapshot = {
+                'file': self.file_name,
+                'rows': totals.row_count,
+                'processed_rows': processed_rows,
+                'loaded_at': datetime.now().isoformat(timespec='seconds'),
+                'reload_seconds': time.perf_counter() - start,
+                'paid': totals.paid_totals,
+                'shares': totals.share_totals,
+                'balances': totals.net_balances,
+                'unconverted_currencies': totals.unconverted_currencies,
+                'ledger': totals,
+            }
+            self.file_signature = signature
+            return self.snapshot
+
+    # Reload if the workbook changed on disk; returns True when a reload happened
+    def reload_if_changed(self):
+        try:
+            if self.signature() == self.file_signature:
+                return False
+            self.reload()
+            return True
+        except Exception as e:
+            # Keep serving the last good snapshot, e.g. while the workbook is half-written
+            print(f"Reload of {self.file_name} failed: {type(e).__name__}: {e}")
+            return False
+
+    # Settle the current snapshot with the given strategy; the snapshot's ledger keeps one result per strategy
+    def settlement(self, strategy='auto'):
+        return self.snapshot['ledger'].settlement(strategy)
+
+# Function to poll the workbook for changes in a background thread
+def watch(service, poll_seconds=DEFAULT_POLL_SECONDS, stop_event=None):
+    stop_event = stop_event or threading.Event()
+
+    def run():
+        while not stop_event.wait(poll_seconds):
+            if service.reload_if_changed():
+                print(f"Reloaded {service.file_name}: {service.snapshot['processed_rows']} rows recomputed "
+                      f"in {service.snapshot['reload_seconds'] * 1000:.1f} ms")
+
+    thread = threading.Thread(target=run, name='ledger-watcher', daemon=True)
+    thread.start()
+    return stop_event
+
+# Function to answer one query against the current snapshot, returning (status, payload)
+def handle_query(service, method, path, query):
+    snapshot = service.snapshot
+    if method == 'POST' and path == '/reload':
+        snapshot = service.reload()
+        return 200, {'rows': snapshot['rows'], 'processed_rows': snapshot['processed_rows'], 'loaded_at': snapshot['loaded_at']}
+    if method != 'GET':
+        return 405, {'error': f"{method} not allowed"}
+
+    if path == '/status':
+        return 200, {key: snapshot[key] for key in ('file', 'rows', 'processed_rows', 'loaded_at', 'reload_seconds', 'unconverted_currencies')}
+    if path == '/balances':
+        return 200, snapshot['balances']
+    if path == '/paid':
+        return 200, snapshot['paid']
+    if path == '/shares':
+        return 200, snapshot['shares']
+    if path.startswith('/balances/'):
+        person = unquote(path[len('/balances/'):])
+        if person not in snapshot['balances']:
+            return 404, {'error': f"Unknown person '{person}'"}
+        return 200, {'person': person, 'paid': snapshot['paid'].get(person, 0), 'share': snapshot['shares'].get(person, 0),
+                     'balance': snapshot['balances'][person]}
+    if path == '/settlement':
+        strategy = query.get('strategy', ['auto'])[0]
+        if strategy not in settlement.STRATEGIES:
+            return 400, {'error': f"Unknown strategy '{strategy}', expected one of {', '.join(settlement.STRATEGIES)}"}
+        return 200, [{'debtor': debtor, 'creditor': creditor, 'amount': amount} for debtor, creditor, amount in service.settlement(strategy)]
+    return 404, {'error': f"Unknown path '{path}'"}
+
+# HTTP handler serving JSON answers from the service attached to the server
+class QueryHandler(BaseHTTPRequestHandler):
+
+    def respond(self, method):
+        url = urlparse(self.path)
+        try:
+            status, payload = handle_query(self.server.service, method, url.path.rstrip('/') or '/', parse_qs(url.query))
+        except Exception as e:
+            status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.respond('GET')
+
+    def do_POST(self):
+        self.respond('POST')
+
+    def log_message(self, format, *args):
+        pass  # Queries are too frequent to log one line each
+
+# The same HTTP protocol over a Unix domain socket
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('local', 0)
+
+# Function to create the server, on a Unix socket if a path is given and on TCP otherwise
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, QueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.service = service
+    return server
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve balance and settlement queries for a workbook from memory.")
+    parser.add_argument('file', help="The expense workbook to serve")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix-socket', default=None, help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS, help="Seconds between checks for workbook changes")
+    parser.add_argument('--rates', default=None, help="Exchange-rate source: a URL or a local JSON/CSV file")
+    args = parser.parse_args(argv)
+
+    service = LedgerService(args.file, args.rates, money.exact_money_enabled())
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    stop_event = watch(service, args.poll)
+    where = args.unix_socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving {service.file_name} ({service.snapshot['rows']} rows) on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,38 @@
-import pandas as pd
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.datavalidation import DataValidation
-import openpyxl
+from openpyxl.worksheet.formula import ArrayFormula
+
+DEFAULT_ROWS = 10
+
+# Excel rejects inline dropdown lists longer than this, so longer lists go on a hidden sheet
+MAX_INLINE_LIST_LENGTH = 255
+
+BASE_COLUMNS = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+
+# Optional columns: a row with a date is converted at that day's rate, and both can be used for rollups by period
+# or category. Workbooks without them still work.
+OPTIONAL_COLUMNS = ['Date', 'Category']
+
+DATE_FORMAT = 'yyyy-mm-dd'
+
+# Shared formula: the first cell of a column holds the formula text and every other cell only refers to it.
+# openpyxl has no writer for these, but writes whatever attributes a formula value yields.
+class SharedFormula(ArrayFormula):
+
+    t = "shared"
+
+    def __init__(self, si, ref=None, text=None):
+        super().__init__(ref, text)
+        self.si = si
+
+    def __iter__(self):
+        yield 't', self.t
+        if self.ref:
+            yield 'ref', self.ref
+        yield 'si', str(self.si)
 
 def get_document_name():
     return input("Enter the name of the document: ")
@@ -27,58 +58,71 @@ def get_person_names(size):
 def get_default_currency():
     return input("Enter the default currency code (e.g. DKK or EUR): ")
 
-def create_expense_template(doc_name, people_names, default_currency):
-    data = {'Paying person': [], 'Description': [], 'Amount': [], 'Currency': [], 'Shared with': []}
-    
-    # Initialize columns for each person's share
-    for person in people_names:
-        data[f"{person}'s share"] = []
-
-    # Number of people in the group
-    num_people = len(people_names)
-
-    # Add 10 blank lines with default values/formulas
-    for i in range(10):
-        data['Paying person'].append('')
-        data['Description'].append('')
-        data['Amount'].append('')
-        data['Currency'].append(default_currency)
-        data['Shared with'].append(', '.join(people_names))
-
-         # Adding share formula for each person
+# Formula to check if person is included in 'Shared with' and calculate share
+def share_formula(person, row):
+    return f'=IF(ISNUMBER(SEARCH("{person}"; E{row})); C{row} / (LEN(E{row})-LEN(SUBSTITUTE(E{row}; ","; ""))+1); 0)'
+
+# Function to style a header cell the way pandas' to_excel did
+def header_cell(sheet, value):
+    cell = WriteOnlyCell(sheet, value=value)
+    thin = Side(style='thin')
+    cell.font = Font(bold=True)
+    cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    cell.alignment = Alignment(horizontal='center', vertical='top')
+    return cell
+
+def create_expense_template(doc_name, people_names, default_currency, num_rows=DEFAULT_ROWS, optional_columns=OPTIONAL_COLUMNS):
+    # Write-only mode streams rows straight to the file in a single pass
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet('Sheet1')
+
+    fixed_columns = BASE_COLUMNS + list(optional_columns)
+    headers = fixed_columns + [f"{person}'s share" for person in people_names]
+    shared_with = ', '.join(people_names)
+    last_row = num_rows + 1
+
+    # Column widths must be set before any row is written
+    base_values = ['', '', '', default_currency, shared_with] + [DATE_FORMAT if column == 'Date' else '' for column in optional_columns]
+    for i, (header, value) in enumerate(zip(fixed_columns, base_values), start=1):
+        sheet.column_dimensions[get_column_letter(i)].width = max(len(header), len(str(value))) + 2
+    max_share_header_length = max((len(header) for header in headers[len(fixed_columns):]), default=0)
+    for i in range(len(fixed_columns) + 1, len(headers) + 1):
+        sheet.column_dimensions[get_column_letter(i)].width = max_share_header_length + 2
+
+    # Add dropdown list for "Paying person" column covering every template row
+    names_list = ','.join(people_names)
+    if len(names_list) <= MAX_INLINE_LIST_LENGTH:
+        dv = DataValidation(type="list", formula1=f'"{names_list}"', allow_blank=True)
+    else:
+        participants_sheet = book.create_sheet('Participants')
+        participants_sheet.sheet_state = 'hidden'
         for person in people_names:
-            # Formula to check if person is included in 'Shared with' and calculate share
-            data[f"{person}'s share"].append(f'=IF(ISNUMBER(SEARCH("{person}"; E{i+2})); C{i+2} / (LEN(E{i+2})-LEN(SUBSTITUTE(E{i+2}; ","; ""))+1); 0)')
-    
-    # Create DataFrame from the base data
-    df = pd.DataFrame(data)
-
-     # Create a new Workbook and add the DataFrame to it
-    book = Workbook()
-    book.remove(book.active)
-    df.to_excel(f"{doc_name}.xlsx", index=False, engine='openpyxl')
-
-    # Open the workbook again using openpyxl for further modifications
-    book = load_workbook(f"{doc_name}.xlsx")
-    sheet = book.active
-
-    # Add dropdown list for "Paying person" column
-    dv = DataValidation(type="list", formula1=f'"{", ".join(people_names)}"', allow_blank=True)
-    sheet.add_data_validation(dv)
-    dv.add(f'A2:A{len(people_names)+1}')  # Assuming A is the column for "Paying person"
-
-    # Find maximum length of the share header
-    max_share_header_length = max(len(f"{person}'s share") for person in people_names)
-
-    # Set the width of the columns, including the new columns
-    for i, column_cells in enumerate(sheet.columns):
-        column_letter = openpyxl.utils.get_column_letter(i+1)
-        if i >= 5:  # This assumes that the first share column is 'F'
-            sheet.column_dimensions[column_letter].width = max_share_header_length + 2
-        else:
-            max_length = max(len(str(cell.value)) for cell in column_cells if cell.value)
-            adjusted_width = max_length + 2
-            sheet.column_dimensions[column_letter].width = adjusted_width
+            participants_sheet.append([person])
+        dv = DataValidation(type="list", formula1=f"Participants!$A$1:$A${len(people_names)}", allow_blank=True)
+    dv.add(f'A2:A{last_row}')
+    sheet.data_validations.append(dv)
+
+    sheet.append([header_cell(sheet, header) for header in headers])
+
+    # One shared formula per share column: the text is written once, in the first row
+    first_share_column = len(fixed_columns) + 1
+    master_formulas = []
+    follower_formulas = []
+    for si, person in enumerate(people_names):
+        column_letter = get_column_letter(first_share_column + si)
+        ref = f"{column_letter}2:{column_letter}{last_row}"
+        master_formulas.append(SharedFormula(si, ref=ref, text=share_formula(person, 2)))
+        follower_formulas.append(SharedFormula(si))
+
+    for row in range(2, last_row + 1):
+        formulas = master_formulas if row == 2 else follower_formulas
+        optional_cells = []
+        for column in optional_columns:
+            cell = WriteOnlyCell(sheet, value=None)
+            if column == 'Date':
+                cell.number_format = DATE_FORMAT
+            optional_cells.append(cell)
+        sheet.append([None, None, None, default_currency, shared_with] + optional_cells + formulas)
 
     # Save the Excel file
     book.save(f"{doc_name}.xlsx")
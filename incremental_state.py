@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import balance_engine
+import rate_provider
+
+# Bump when the state layout changes so old state files trigger a full recompute
+STATE_VERSION = 1
+
+# Above this fraction of changed rows a full recompute is cheaper than applying deltas
+FULL_RECOMPUTE_FRACTION = 0.5
+
+# Function to get the state file used for incremental runs on a workbook
+def state_file_for(file_name):
+    file_base = os.path.splitext(os.path.basename(file_name))[0]
+    return f"{file_base}_state.npz"
+
+# Function to fingerprint the columns the balance computation depends on
+def layout_fingerprint(df):
+    columns = ['Paying person', 'Amount', 'Currency', 'Shared with'] + rate_provider.share_columns(df)
+    return '\x1f'.join(columns)
+
+# Function to fingerprint every preprocessed row so edits and appends can be detected
+def row_fingerprints(df):
+    columns = ['Paying person', 'Amount', 'Currency'] + rate_provider.share_columns(df)
+    frame = df[columns].reset_index(drop=True)
+    frame['Shared with'] = [('\x1f'.join(people) if isinstance(people, list) else '') for people in df['Shared with']]
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+
+# Function to gather the CSR entry indices belonging to the given rows
+def entry_indices(offsets, rows):
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Offset of each entry within its row, added to the row's start
+    within = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + within
+
+# Function to intern names into the participant registry, growing it as needed
+def intern(names, registry, participants):
+    ids = np.empty(len(names), dtype=np.int32)
+    for i, name in enumerate(names):
+        person_id = registry.get(name)
+        if person_id is None:
+            person_id = len(participants)
+            registry[name] = person_id
+            participants.append(name)
+        ids[i] = person_id
+    return ids
+
+# Function to compute the paid and share contributions of a set of rows
+def row_contributions(df, rows, registry, participants):
+    ledger = balance_engine.encode_ledger(df.iloc[rows])
+    # Map the subset's participant IDs onto the persistent registry
+    global_ids = intern(list(ledger['participants']), registry, participants)
+    payer_ids = global_ids[ledger['payer_ids']]
+
+    entries = balance_engine.compute_shares(ledger)
+    applied = entries['applied']
+    entry_rows = rows[entries['rows'][applied]]
+    entry_people = global_ids[entries['people'][applied]]
+    return payer_ids, ledger['amounts'], entry_rows, entry_people, entries['shares'][applied]
+
+# Function to load the state of a previous run, or None if it is missing or unusable
+def load_state(state_file, layout):
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with np.load(state_file, allow_pickle=False) as arrays:
+            state = {name: arrays[name] for name in arrays.files}
+    except (OSError, ValueError):
+        return None
+    if int(state['version']) != STATE_VERSION or str(state['layout']) != layout:
+        return None
+    return state
+
+# Function to save the state for the next incremental run
+def save_state(state_file, state):
+    tmp_file = f"{state_file}.tmp.npz"
+    np.savez(tmp_file, **state)
+    os.replace(tmp_file, state_file)
+
+# Function to build the state from scratch
+def full_state(df, fingerprints, layout):
+    participants = []
+    registry = {}
+    rows = np.arange(len(df), dtype=np.int64)
+    payer_ids, amounts, entry_rows, entry_people, entry_shares = row_contributions(df, rows, registry, participants)
+    size = len(participants)
+    return {
+        'version': np.array(STATE_VERSION),
+        'layout': np.array(layout),
+        'fingerprints': fingerprints,
+        'participants': np.array(participants, dtype=str),
+        'paid': np.bincount(payer_ids, weights=amounts, minlength=size),
+        'paid_count': np.bincount(payer_ids, minlength=size),
+        'shares': np.bincount(entry_people, weights=entry_shares, minlength=size),
+        'share_count': np.bincount(entry_people, minlength=size),
+        'row_payer': payer_ids,
+        'row_amount': amounts,
+        'entry_offsets': np.concatenate([[0], np.cumsum(np.bincount(entry_rows, minlength=len(df)))]).astype(np.int64),
+        'entry_person': entry_people,
+        'entry_share': entry_shares,
+    }
+
+# Function to apply only the changed, appended and removed rows to the previous state
+def apply_deltas(df, state, fingerprints, dirty_old, dirty_new):
+    participants = [str(name) for name in state['participants']]
+    registry = {name: i for i, name in enumerate(participants)}
+    n_old = len(state['fingerprints'])
+    n_new = len(fingerprints)
+    offsets = state['entry_offsets']
+
+    new_payers, new_amounts, new_entry_rows, new_entry_people, new_entry_shares = row_contributions(df, dirty_new, registry, participants)
+    size = len(participants)
+
+    def grow(values):
+        return np.concatenate([values, np.zeros(size - len(values), dtype=values.dtype)])
+
+    paid, paid_count = grow(state['paid']), grow(state['paid_count'])
+    shares, share_count = grow(state['shares']), grow(state['share_count'])
+
+    # Take the old contributions of dirty rows out of the accumulators
+    old_payers = state['row_payer'][dirty_old]
+    np.subtract.at(paid, old_payers, state['row_amount'][dirty_old])
+    np.subtract.at(paid_count, old_payers, 1)
+    old_entries = entry_indices(offsets, dirty_old)
+    np.subtract.at(shares, state['entry_person'][old_entries], state['entry_share'][old_entries])
+    np.subtract.at(share_count, state['entry_person'][old_entries], 1)
+
+    # And put the new ones in
+    np.add.at(paid, new_payers, new_amounts)
+    np.add.at(paid_count, new_payers, 1)
+    np.add.at(shares, new_entry_people, new_entry_shares)
+    np.add.at(share_count, new_entry_people, 1)
+
+    # Rebuild the per-row arrays with the dirty rows replaced
+    row_payer = np.concatenate([state['row_payer'], np.zeros(max(n_new - n_old, 0), dtype=np.int32)])[:n_new]
+    row_amount = np.concatenate([state['row_amount'], np.zeros(max(n_new - n_old, 0))])[:n_new]
+    row_payer[dirty_new] = new_payers
+    row_amount[dirty_new] = new_amounts
+
+    old_entry_rows = np.repeat(np.arange(n_old, dtype=np.int64), np.diff(offsets))
+    dirty_mask = np.zeros(max(n_old, n_new), dtype=bool)
+    dirty_mask[dirty_old] = True
+    dirty_mask[dirty_new] = True
+    keep = ~dirty_mask[old_entry_rows]
+    entry_rows = np.concatenate([old_entry_rows[keep], new_entry_rows])
+    order = np.argsort(entry_rows, kind='stable')
+    entry_rows = entry_rows[order]
+
+    state.update({
+        'fingerprints': fingerprints,
+        'participants': np.array(participants, dtype=str),
+        'paid': paid,
+        'paid_count': paid_count,
+        'shares': shares,
+        'share_count': share_count,
+        'row_payer': row_payer,
+        'row_amount': row_amount,
+        'entry_offsets': np.concatenate([[0], np.cumsum(np.bincount(entry_rows, minlength=n_new))]).astype(np.int64),
+        'entry_person': np.concatenate([state['entry_person'][keep], new_entry_people])[order],
+        'entry_share': np.concatenate([state['entry_share'][keep], new_entry_shares])[order],
+    })
+    return state
+
+# Function to bring the saved state up to date with the ledger, returning the state and the number of rows processed
+def update_state(df, state_file):
+    layout = layout_fingerprint(df)
+    return refresh_state(df, load_state(state_file, layout), layout)
+
+# Function to bring a state held in memory (or None) up to date with the ledger
+def refresh_state(df, state, layout=None):
+    if layout is None:
+        layout = layout_fingerprint(df)
+    fingerprints = row_fingerprints(df)
+    if state is None or str(state['layout']) != layout:
+        return full_state(df, fingerprints, layout), len(df)
+
+    old_fingerprints = state['fingerprints']
+    common = min(len(old_fingerprints), len(fingerprints))
+    changed = np.flatnonzero(old_fingerprints[:common] != fingerprints[:common])
+    dirty_old = np.concatenate([changed, np.arange(common, len(old_fingerprints))]).astype(np.int64)
+    dirty_new = np.concatenate([changed, np.arange(common, len(fingerprints))]).astype(np.int64)
+
+    if len(dirty_new) + len(dirty_old) > FULL_RECOMPUTE_FRACTION * max(len(fingerprints), 1):
+        return full_state(df, fingerprints, layout), len(df)
+    if len(dirty_old) == 0 and len(dirty_new) == 0:
+        return state, 0
+    return apply_deltas(df, state, fingerprints, dirty_old, dirty_new), len(dirty_new) + len(dirty_old)
+
+# Function to read the paid and share totals out of a state
+def state_totals(state):
+    participants = [str(name) for name in state['participants']]
+    individual_expenses = {person: round(float(amount), 2) for person, amount, count in zip(participants, state['paid'], state['paid_count']) if count > 0}
+    total_shares = {person: float(share) for person, share, count in zip(participants, state['shares'], state['share_count']) if count > 0}
+    return individual_expenses, total_shares
+
+# Function to read the applied share entries out of a state, in ledger order
+def state_share_entries(state):
+    participants = state['participants'].astype(object)
+    rows = np.repeat(np.arange(len(state['fingerprints']), dtype=np.int64), np.diff(state['entry_offsets']))
+    return pd.DataFrame({'row': rows, 'person': participants[state['entry_person']] if len(participants) else [], 'share': state['entry_share']})
+
+# Function to update balances incrementally from the previous run's state
+def update_balances(df, state_file):
+    state, processed_rows = update_state(df, state_file)
+    save_state(state_file, state)
+    individual_expenses, total_shares = state_totals(state)
+    return individual_expenses, total_shares, state_share_entries(state), processed_rows
@@ -0,0 +1,106 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Optional capture mode: 'cprofile' or 'tracemalloc'
+PROFILE_ENV = 'EXPENSE_SPLITTER_PROFILE'
+CAPTURE_MODES = ('cprofile', 'tracemalloc')
+
+# Number of functions or allocation sites kept in the trace per capture
+TOP_ENTRIES = 15
+
+# Function to read the current resident set size of this process in MB, or None if unavailable
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+# Function to start a new trace for one run on a workbook
+def new_trace(file_name, capture=None):
+    if capture is None:
+        capture = os.environ.get(PROFILE_ENV, '').strip().lower() or None
+    if capture is not None and capture not in CAPTURE_MODES:
+        print(f"Unknown profile mode '{capture}', expected one of {', '.join(CAPTURE_MODES)}. Profiling disabled.")
+        capture = None
+    return {
+        'file': file_name,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'capture': capture,
+        'stages': [],
+    }
+
+# Context manager that records wall time, memory delta and (when set) row count of one stage
+@contextmanager
+def stage(trace, name):
+    record = {'name': name, 'rows': None}
+    profiler = None
+    if trace['capture'] == 'cprofile':
+        profiler = cProfile.Profile()
+    elif trace['capture'] == 'tracemalloc':
+        tracemalloc.start()
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+        record['seconds'] = time.perf_counter() - start
+        rss_after = current_rss_mb()
+        record['rss_delta_mb'] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+
+        if profiler:
+            record['profile'] = top_functions(profiler)
+        elif trace['capture'] == 'tracemalloc':
+            record['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            record['top_allocations'] = [
+                {'site': str(stat.traceback), 'size_kb': stat.size / 1024, 'count': stat.count}
+                for stat in tracemalloc.take_snapshot().statistics('lineno')[:TOP_ENTRIES]
+            ]
+            tracemalloc.stop()
+        trace['stages'].append(record)
+
+# Function to summarise a cProfile run as its most expensive functions by cumulative time
+def top_functions(profiler):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    entries = []
+    for (file_name, line, function), (_, calls, _, cumulative, _) in stats.stats.items():
+        entries.append({'function': f"{os.path.basename(file_name)}:{line}({function})", 'calls': calls, 'cumulative_seconds': cumulative})
+    entries.sort(key=lambda entry: entry['cumulative_seconds'], reverse=True)
+    return entries[:TOP_ENTRIES]
+
+# Function to write the trace as machine-readable JSON next to the report
+def write_trace(trace, file_name, output_dir=None):
+    file_base = os.path.splitext(os.path.basename(file_name))[0]
+    trace_file = f"{file_base}_trace.json"
+    if output_dir:
+        trace_file = os.path.join(output_dir, trace_file)
+    trace['total_seconds'] = sum(record['seconds'] for record in trace['stages'])
+    with open(trace_file, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=2)
+    return trace_file
+
+# Function to append a human-readable performance summary to the report, returning the summary text
+def append_summary(report_file, trace):
+    lines = ["\n===== PERFORMANCE =====\n"]
+    for record in trace['stages']:
+        rows = f", {record['rows']} rows" if record['rows'] is not None else ""
+        memory = f", {record['rss_delta_mb']:+.1f} MB" if record['rss_delta_mb'] is not None else ""
+        lines.append(f"{record['name']}: {record['seconds'] * 1000:.1f} ms{rows}{memory}\n")
+    lines.append(f"Total: {sum(record['seconds'] for record in trace['stages']) * 1000:.1f} ms\n")
+    summary = ''.join(lines)
+    with open(report_file, 'a', encoding='utf-8') as f:
+        f.write(summary)
+    return summary
@@ -0,0 +1,121 @@
+import os
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# Optional limits on the itemized breakdown: show at most this many items per person,
+# and/or keep the item arrays memory-mapped from files in this directory
+MAX_ITEMS_ENV = 'EXPENSE_SPLITTER_MAX_ITEMS'
+SPILL_DIR_ENV = 'EXPENSE_SPLITTER_SPILL_DIR'
+
+UNNAMED_ITEM = 'Unnamed item'
+
+# Function to read the breakdown options from the environment: (max items per person or None, spill directory or None)
+def breakdown_options():
+    max_items = os.environ.get(MAX_ITEMS_ENV, '').strip()
+    spill_dir = os.environ.get(SPILL_DIR_ENV, '').strip()
+    return (int(max_items) if max_items else None), (spill_dir or None)
+
+# Function to intern the descriptions of a ledger: every distinct description is stored once
+def intern_descriptions(df):
+    if 'Description' not in df.columns:
+        return np.zeros(len(df), dtype=np.int32), np.array([UNNAMED_ITEM], dtype=object)
+    codes, descriptions = pd.factorize(df['Description'], use_na_sentinel=False)
+    return codes.astype(np.int32), np.asarray(descriptions, dtype=object)
+
+# Itemized breakdown per person, stored as row indices and numeric arrays grouped by person.
+# It behaves like the old {person: [(description, amount)]} or {person: [(description, share, amount)]} dicts,
+# but each person's list is only built when it is looked up.
+class ItemBreakdown(Mapping):
+
+    def __init__(self, people, rows, description_codes, descriptions, row_amounts, shares=None, max_items=None, spill_dir=None):
+        codes, names = pd.factorize(pd.Series(people, dtype=object))
+        order = np.argsort(codes, kind='stable')
+        row_dtype = np.int32 if len(row_amounts) < np.iinfo(np.int32).max else np.int64
+
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self.names)))]).astype(np.int64)
+        self.descriptions = descriptions
+        self.max_items = max_items
+        self.with_shares = shares is not None
+        self.spill = None
+
+        arrays = {
+            'rows': np.asarray(rows, dtype=row_dtype)[order],
+            'description_codes': description_codes,
+            'row_amounts': np.asarray(row_amounts, dtype=float),
+        }
+        if self.with_shares:
+            arrays['shares'] = np.asarray(shares)[order]
+        if spill_dir:
+            arrays = self.spill_arrays(arrays, spill_dir)
+        self.arrays = arrays
+
+    # Write the arrays to a temporary directory and keep them memory-mapped from there
+    def spill_arrays(self, arrays, spill_dir):
+        os.makedirs(spill_dir, exist_ok=True)
+        self.spill = tempfile.TemporaryDirectory(prefix='items-', dir=spill_dir, ignore_cleanup_errors=True)
+        mapped = {}
+        for name, values in arrays.items():
+            path = os.path.join(self.spill.name, f"{name}.npy")
+            np.save(path, values)
+            mapped[name] = np.load(path, mmap_mode='r')
+        return mapped
+
+    def __getitem__(self, person):
+        i = self.index[person]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        rows = np.asarray(self.arrays['rows'][start:end])
+        amounts = np.asarray(self.arrays['row_amounts'])[rows]
+        descriptions = self.descriptions[np.asarray(self.arrays['description_codes'])[rows]]
+        values = np.asarray(self.arrays['shares'][start:end]) if self.with_shares else amounts
+
+        rest = None
+        if self.max_items is not None and len(rows) > self.max_items:
+            # Keep the largest items, in ledger order, and fold the others into one line
+            top = np.zeros(len(rows), dtype=bool)
+            top[np.argsort(-values, kind='stable')[:self.max_items]] = True
+            rest = (f"({int((~top).sum())} more items)", values[~top].sum(), amounts[~top].sum())
+            descriptions, values, amounts = descriptions[top], values[top], amounts[top]
+
+        if self.with_shares:
+            items = list(zip(descriptions, values, amounts))
+            if rest:
+                items.append(rest)
+        else:
+            items = list(zip(descriptions, values))
+            if rest:
+                items.append(rest[:2])
+        return items
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, person):
+        return person in self.index
+
+    # Remove the spilled files, if any; the breakdown cannot be used afterwards
+    def close(self):
+        self.arrays = {}
+        if self.spill is not None:
+            self.spill.cleanup()
+            self.spill = None
+
+# Function to build the breakdown of the expenses paid by each person
+def payments_breakdown(df, max_items=None, spill_dir=None):
+    description_codes, descriptions = intern_descriptions(df)
+    return ItemBreakdown(df['Paying person'].to_numpy(dtype=object), np.arange(len(df)), description_codes, descriptions,
+                         df['Amount'].to_numpy(dtype=float), max_items=max_items, spill_dir=spill_dir)
+
+# Function to build the breakdown of each person's shares from the applied share entries (row, person, share)
+def shares_breakdown(df, share_entries, max_items=None, spill_dir=None):
+    description_codes, descriptions = intern_descriptions(df)
+    return ItemBreakdown(share_entries['person'].to_numpy(dtype=object), share_entries['row'].to_numpy(dtype=np.int64),
+                         description_codes, descriptions, df['Amount'].to_numpy(dtype=float),
+                         shares=share_entries['share'].to_numpy(dtype=float), max_items=max_items, spill_dir=spill_dir)
@@ -0,0 +1,264 @@
+import math
+import os
+from functools import cached_property
+
+import rate_provider
+import report_writer
+import settlement
+import shared_with
+
+# The consolidation pipeline shared by every front end (consolidate.py, consolidate_report.py, the batch,
+# group and server tools). pandas, numpy and the modules built on them are imported inside the functions
+# that need them, so small ledgers are processed without paying for those imports.
+
+# Function to load and preprocess data from an Excel file
+def load_and_preprocess_data(file_name, rate_source=None, use_cache=True, exchange_rates=None):
+    import pandas as pd
+    import ledger_cache
+
+    # Get the exchange rates once, from the local cache when it is fresh, unless the caller already has them
+    if exchange_rates is None:
+        exchange_rates = rate_provider.get_exchange_rates(rate_source)
+
+    # Reuse the preprocessed ledger if neither the workbook nor the rates changed
+    if use_cache:
+        df = ledger_cache.load_ledger(file_name, exchange_rates)
+        if df is not None:
+            return df
+
+    df = pd.read_excel(file_name)
+
+    # Drop rows with NaN in 'Paying person' or where it's an empty string
+    df = df.dropna(subset=['Paying person'])
+    df = df[df['Paying person'].str.strip() != '']
+
+    # Ensure 'Paying person' is properly formatted as string
+    df['Paying person'] = df['Paying person'].astype(str).str.strip()
+
+    # Split the 'Shared with' column, each distinct value only once
+    df['Shared with'] = shared_with.split_column(df['Shared with'])
+
+    # Set default currency to the base currency if missing
+    base = rate_provider.base_currency()
+    df['Currency'] = df['Currency'].fillna(base)
+
+    # Convert 'Amount' column to float to avoid dtype issues
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0).astype(float)
+
+    if not exchange_rates:
+        print(f"No exchange rates available: using only {base} values, other currencies are not converted.")
+    else:
+        # Convert other currencies to the base currency for all relevant columns in one pass
+        df = rate_provider.convert_columns(df, exchange_rates, base)
+
+    if use_cache:
+        ledger_cache.store_ledger(file_name, exchange_rates, df)
+    return df
+
+# Function to calculate the net balance for each individual
+def calculate_net_balances(individual_expenses, total_shares):
+    net_balances = {}
+    for person in set(individual_expenses.keys()).union(set(total_shares.keys())):
+        if not person or (isinstance(person, float) and math.isnan(person)):  # Skip empty or NaN persons
+            continue
+        paid_amount = individual_expenses.get(person, 0)
+        share_amount = total_shares.get(person, 0)
+        net_balances[person] = round(paid_amount - share_amount, 2)
+    return net_balances
+
+# Function to simplify debts between individuals
+def simplify_debts(net_balances, strategy='auto'):
+    return settlement.simplify_debts(net_balances, strategy)
+
+# Function to create a comprehensive report in the requested formats (text by default, see report_writer)
+def create_report(file_name, net_balances, simplified_debts, person_payments, personal_item_costs, output_dir=None,
+                  formats=None, echo=False, paid_totals=None, share_totals=None, unconverted_currencies=None):
+    report_file, outputs = report_writer.write_reports(file_name, net_balances, simplified_debts, person_payments,
+                                                       personal_item_costs, output_dir, formats, echo,
+                                                       paid_totals=paid_totals, share_totals=share_totals,
+                                                       unconverted_currencies=unconverted_currencies)
+    for output in outputs:
+        print(f"Report created: {output}")
+    return report_file
+
+# Function to select an Excel file for processing
+def select_file():
+    files = [f for f in os.listdir() if f.endswith('.xlsx')]
+    if not files:
+        print("No .xlsx files found in the current directory.")
+        return None
+    for i, file in enumerate(files, start=1):
+        print(f"{i}. {file}")
+    file_number = int(input("Please enter the number of the file you want to select: ")) - 1
+    if file_number < 0 or file_number >= len(files):
+        print("Invalid selection")
+        return None
+    return files[file_number]
+
+# A preprocessed ledger and everything derived from it. Each aggregate is computed the first time it is
+# needed and then kept, so the balances, the settlement and the report all reuse the same encoded ledger
+# and share entries instead of scanning the DataFrame again. An aggregate computed elsewhere (e.g. by an
+# incremental run) can be handed in by assigning it, e.g. ledger.paid_totals = totals.
+class Ledger:
+
+    def __init__(self, df=None, exact=False, file_name=None, workers=None):
+        self.df = df
+        self.exact = exact
+        self.file_name = file_name
+        self.workers = workers
+        self.settlements = {}
+
+    # Load and preprocess a workbook with pandas
+    @classmethod
+    def load(cls, file_name, exchange_rates=None, rate_source=None, use_cache=True, exact=False, workers=None):
+        return cls(load_and_preprocess_data(file_name, rate_source, use_cache, exchange_rates), exact, file_name, workers)
+
+    # Wrap totals computed without a DataFrame (e.g. on the small-ledger path)
+    @classmethod
+    def from_totals(cls, individual_expenses, total_shares, person_payments=None, personal_item_costs=None, row_count=0,
+                    file_name=None, unconverted_currencies=None):
+        ledger = cls(file_name=file_name)
+        ledger.paid_totals = individual_expenses
+        ledger.share_totals = total_shares
+        ledger.person_payments = person_payments
+        ledger.personal_item_costs = personal_item_costs
+        ledger.row_count = row_count
+        ledger.unconverted_currencies = unconverted_currencies or []
+        return ledger
+
+    @cached_property
+    def row_count(self):
+        return len(self.df)
+
+    @property
+    def empty(self):
+        return self.row_count == 0
+
+    # The ledger encoded as compact arrays keyed by participant IDs (see balance_engine.encode_ledger)
+    @cached_property
+    def encoded(self):
+        import balance_engine
+
+        return balance_engine.encode_ledger(self.df)
+
+    # Large ledgers with several workers configured are computed in chunks across a process pool
+    # (see parallel_shares); returns None when the ledger is computed in this process
+    @cached_property
+    def partitioned(self):
+        import parallel_shares
+
+        if not parallel_shares.use_parallel(self.row_count, self.workers):
+            return None
+        entries, *totals = parallel_shares.compute_partitioned(self.encoded, self.exact, self.workers)
+        return entries, parallel_shares.totals_by_person(self.encoded, *totals, exact=self.exact)
+
+    # The share of every 'Shared with' entry, in øre when exact
+    @cached_property
+    def share_entries(self):
+        import balance_engine
+
+        if self.partitioned is not None:
+            return self.partitioned[0]
+        return balance_engine.compute_shares(self.encoded, self.exact)
+
+    # The applied share entries as a long (row, person, share) DataFrame, for the itemized breakdown
+    @cached_property
+    def applied_shares(self):
+        import balance_engine
+
+        frame = balance_engine.entries_to_frame(self.encoded, self.share_entries)
+        return frame[frame['applied'].to_numpy(dtype=bool)]
+
+    # Total paid by each person
+    @cached_property
+    def paid_totals(self):
+        import balance_engine
+
+        if self.partitioned is not None:
+            return self.partitioned[1][0]
+        return balance_engine.calculate_paid_totals(self.df, self.encoded, self.exact)
+
+    # Total share owed by each person
+    @cached_property
+    def share_totals(self):
+        import balance_engine
+
+        if self.partitioned is not None:
+            return self.partitioned[1][1]
+        return balance_engine.calculate_share_totals(self.df, self.encoded, self.share_entries)
+
+    @cached_property
+    def net_balances(self):
+        return calculate_net_balances(self.paid_totals, self.share_totals)
+
+    # Payments made by each person, as a compact breakdown built lazily per person
+    @cached_property
+    def person_payments(self):
+        import item_store
+
+        max_items, spill_dir = item_store.breakdown_options()
+        return item_store.payments_breakdown(self.df, max_items, spill_dir)
+
+    # Costs by person and item, in ledger order, from the applied share entries
+    @cached_property
+    def personal_item_costs(self):
+        import item_store
+
+        max_items, spill_dir = item_store.breakdown_options()
+        return item_store.shares_breakdown(self.df, self.applied_shares, max_items, spill_dir)
+
+    # Paid and share totals by date range and category, answered from prefix sums (see rollups.Rollups)
+    @cached_property
+    def rollups(self):
+        import rollups
+
+        return rollups.Rollups(self)
+
+    # Currencies left unconverted for lack of a rate; their amounts are counted as if in the base currency
+    @cached_property
+    def unconverted_currencies(self):
+        if self.df is None:
+            return []
+        currencies = self.df['Currency']
+        return sorted(str(currency) for currency in currencies[currencies != rate_provider.base_currency()].unique())
+
+    # Problems in the 'Shared with' column (see shared_with.validate)
+    @cached_property
+    def validation(self):
+        return shared_with.validate(self.df)
+
+    # The transfers that settle all debts with the given strategy, computed once per strategy
+    def settlement(self, strategy='auto'):
+        transfers = self.settlements.get(strategy)
+        if transfers is None:
+            transfers = simplify_debts(self.net_balances, strategy)
+            self.settlements[strategy] = transfers
+        return transfers
+
+    # A what-if simulator starting from this ledger's balances and settlement (see what_if.WhatIf)
+    def what_if(self, strategy='auto'):
+        import what_if
+
+        return what_if.WhatIf.from_ledger(self, strategy)
+
+    # Compute the paid and share totals now rather than on first use; returns them as (paid, share)
+    def compute_totals(self):
+        return self.paid_totals, self.share_totals
+
+    # Compute the per-person payments and item costs now rather than on first use; returns them as (payments, costs)
+    def compute_breakdowns(self):
+        return self.person_payments, self.personal_item_costs
+
+    # Update the paid and share totals from the previous run's state, recomputing only the changed rows.
+    # Returns the number of rows recomputed.
+    def update_incremental(self, state_file):
+        import incremental_state
+
+        self.paid_totals, self.share_totals, self.applied_shares, processed_rows = incremental_state.update_balances(self.df, state_file)
+        return processed_rows
+
+    # Write the report in the requested formats (see report_writer); returns the text report's path
+    def write_reports(self, file_name=None, output_dir=None, formats=None, echo=False, strategy='auto'):
+        return create_report(file_name or self.file_name, self.net_balances, self.settlement(strategy), self.person_payments,
+                             self.personal_item_costs, output_dir, formats, echo, self.paid_totals, self.share_totals,
+                             self.unconverted_currencies)
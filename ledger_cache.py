@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import balance_engine
+import rate_provider
+import rate_table
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'expense-splitter', 'ledgers')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+# Bump when the preprocessing or the on-disk layout changes so stale entries are never reused
+# (4: streamed chunks were stored with an index restarting at 0 in every chunk;
+#  5: rows without a known rate keep their currency instead of being marked as the base currency)
+CACHE_VERSION = 5
+
+CACHE_DIR_ENV = 'EXPENSE_SPLITTER_LEDGER_CACHE'
+
+# Function to hash the content of a workbook
+def workbook_hash(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to fingerprint an exchange-rate snapshot
+def rates_fingerprint(exchange_rates):
+    if exchange_rates is None:
+        return 'no-rates'
+    return hashlib.sha256(json.dumps(exchange_rates, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Function to get the cache entry directory for a workbook, rate snapshot, base currency and historical rates
+def cache_entry_path(file_name, exchange_rates, cache_dir=None):
+    cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+    base = rate_provider.base_currency()
+    key = f"{CACHE_VERSION}:{workbook_hash(file_name)}:{rates_fingerprint(exchange_rates)}:{base}:{rate_table.history_fingerprint(base)}"
+    return os.path.join(cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+# Function to encode a preprocessed ledger chunk as columnar arrays with interned participant IDs
+def chunk_to_arrays(df):
+    ledger = balance_engine.encode_ledger(df)
+    descriptions = df['Description'] if 'Description' in df.columns else pd.Series([np.nan] * len(df), index=df.index)
+    categories = df['Category'] if 'Category' in df.columns else pd.Series([np.nan] * len(df), index=df.index)
+    share_columns = rate_provider.share_columns(df)
+    return {
+        'index': df.index.to_numpy(dtype=np.int64),
+        'participants': np.array(list(ledger['participants']), dtype=str),
+        'payer_ids': ledger['payer_ids'],
+        'shared_offsets': ledger['shared_offsets'],
+        'shared_members': ledger['shared_members'],
+        'description': descriptions.fillna('').astype(str).to_numpy(dtype=str),
+        'description_missing': descriptions.isna().to_numpy(dtype=bool),
+        'has_description': np.array('Description' in df.columns),
+        'amount': df['Amount'].to_numpy(dtype=np.float64),
+        'currency': df['Currency'].astype(str).to_numpy(dtype=str),
+        'days': rate_table.days_from_series(df['Date']) if 'Date' in df.columns else np.zeros(0, dtype=np.int64),
+        'has_date': np.array('Date' in df.columns),
+        'category': categories.fillna('').astype(str).to_numpy(dtype=str),
+        'category_missing': categories.isna().to_numpy(dtype=bool),
+        'has_category': np.array('Category' in df.columns),
+        'share_columns': np.array(share_columns, dtype=str),
+        'shares': df[share_columns].to_numpy(dtype=np.float64) if share_columns else np.zeros((len(df), 0)),
+    }
+
+# Function to decode columnar arrays back into a preprocessed ledger chunk
+def arrays_to_chunk(arrays):
+    participants = arrays['participants'].astype(object)
+    offsets = arrays['shared_offsets']
+    members = participants[arrays['shared_members']] if len(arrays['shared_members']) else np.zeros(0, dtype=object)
+    shared_with = [list(members[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+    data = {'Paying person': participants[arrays['payer_ids']] if len(participants) else np.zeros(0, dtype=object)}
+    if bool(arrays['has_description']):
+        descriptions = arrays['description'].astype(object)
+        descriptions[arrays['description_missing']] = np.nan
+        data['Description'] = descriptions
+    data['Amount'] = arrays['amount']
+    data['Currency'] = arrays['currency'].astype(object)
+    data['Shared with'] = shared_with
+    if bool(arrays['has_date']):
+        # NO_DATE is the datetime64 NaT, so rows without a date stay empty
+        data['Date'] = arrays['days'].astype('datetime64[D]').astype('datetime64[ns]')
+    if bool(arrays['has_category']):
+        categories = arrays['category'].astype(object)
+        categories[arrays['category_missing']] = np.nan
+        data['Category'] = categories
+    df = pd.DataFrame(data, index=pd.Index(arrays['index']))
+    for i, column in enumerate(arrays['share_columns']):
+        df[str(column)] = arrays['shares'][:, i]
+    return df
+
+# Function to yield the cached ledger chunks of a cache entry
+def iter_cached_chunks(entry):
+    part = 0
+    while True:
+        path = os.path.join(entry, f"part-{part:05d}.npz")
+        if not os.path.exists(path):
+            return
+        with np.load(path, allow_pickle=False) as arrays:
+            yield arrays_to_chunk(arrays)
+        part += 1
+
+# Function to pass ledger chunks through while writing them into a new cache entry
+def write_cached_chunks(entry, chunks):
+    tmp_entry = f"{entry}.tmp-{os.getpid()}"
+    # The entry's key was computed before these chunks were converted; if historical rates failed meanwhile,
+    # the chunks do not match the key
+    failed_dates = rate_provider.failed_date_count()
+    complete = False
+    try:
+        os.makedirs(tmp_entry, exist_ok=True)
+        for part, chunk in enumerate(chunks):
+            np.savez(os.path.join(tmp_entry, f"part-{part:05d}.npz"), **chunk_to_arrays(chunk))
+            yield chunk
+        complete = True
+    finally:
+        # Only publish entries that hold the whole ledger
+        if complete and rate_provider.failed_date_count() == failed_dates and not os.path.exists(entry):
+            try:
+                os.replace(tmp_entry, entry)
+            except OSError:
+                pass  # Another process published the entry first; keep theirs
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+# Function to yield the preprocessed ledger chunks, from the cache when the workbook and rates are unchanged
+def cached_chunks(file_name, exchange_rates, produce_chunks, cache_dir=None):
+    entry = cache_entry_path(file_name, exchange_rates, cache_dir)
+    if os.path.isdir(entry):
+        os.utime(entry)  # Mark as recently used for eviction
+        yield from iter_cached_chunks(entry)
+        return
+    yield from write_cached_chunks(entry, produce_chunks())
+    evict_cache(os.path.dirname(entry))
+
+# Function to load a whole preprocessed ledger from the cache, or None on a miss
+def load_ledger(file_name, exchange_rates, cache_dir=None):
+    entry = cache_entry_path(file_name, exchange_rates, cache_dir)
+    if not os.path.isdir(entry):
+        return None
+    os.utime(entry)
+    chunks = list(iter_cached_chunks(entry))
+    if not chunks:
+        return None
+    return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+# Function to store a whole preprocessed ledger in the cache
+def store_ledger(file_name, exchange_rates, df, cache_dir=None):
+    entry = cache_entry_path(file_name, exchange_rates, cache_dir)
+    try:
+        for _ in write_cached_chunks(entry, [df]):
+            pass
+        evict_cache(os.path.dirname(entry))
+    except OSError as e:
+        print(f"Could not write ledger cache: {e}")
+
+# Function to get the total size in bytes of a cache entry
+def entry_size(entry):
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+# Function to evict cache entries older than max_age, then the least recently used ones above max_bytes
+def evict_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE_SECONDS):
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if not os.path.isdir(entry) or '.tmp-' in name:
+            continue
+        used_at = os.path.getmtime(entry)
+        if now - used_at > max_age:
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entries.append((used_at, entry_size(entry), entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
@@ -0,0 +1,388 @@
+import argparse
+import math
+import os
+import sqlite3
+import time
+from collections.abc import Mapping
+
+import ledger
+import money
+import rate_provider
+import report_writer
+
+# A local SQLite copy of one or more workbooks: normalized expenses, participants and shares, plus per-person
+# balances that triggers keep up to date. Once a workbook is synced, balance and breakdown questions are
+# answered from the indexes instead of parsing the workbook again. pandas is only needed to sync.
+
+STORE_ENV = 'EXPENSE_SPLITTER_STORE'
+DEFAULT_STORE = os.path.join(os.path.expanduser('~'), '.local', 'share', 'expense-splitter', 'ledgers.sqlite3')
+
+# Stored as the description of every expense of a workbook without a Description column, as in item_store
+UNNAMED_ITEM = 'Unnamed item'
+
+# Bump when the schema changes; a store with another version is rebuilt (it can always be synced again)
+# (2: empty description cells read back as NaN and a missing Description column is stored as UNNAMED_ITEM,
+#  so the report matches the one written from the workbook;
+#  3: expenses keep their currency, so rows without a rate are reported as not converted)
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    content_hash TEXT,
+    rates_hash TEXT,
+    exact INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id),
+    row INTEGER NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    payer_id INTEGER NOT NULL REFERENCES participants(id),
+    description TEXT,
+    amount REAL NOT NULL,
+    currency TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shares (
+    expense_id INTEGER NOT NULL REFERENCES expenses(id),
+    participant_id INTEGER NOT NULL REFERENCES participants(id),
+    share REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS balances (
+    workbook_id INTEGER NOT NULL,
+    participant_id INTEGER NOT NULL,
+    paid REAL NOT NULL DEFAULT 0,
+    paid_count INTEGER NOT NULL DEFAULT 0,
+    owed REAL NOT NULL DEFAULT 0,
+    owed_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (workbook_id, participant_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS expenses_by_workbook ON expenses (workbook_id, row);
+CREATE INDEX IF NOT EXISTS expenses_by_payer ON expenses (payer_id, workbook_id);
+CREATE INDEX IF NOT EXISTS shares_by_expense ON shares (expense_id);
+CREATE INDEX IF NOT EXISTS shares_by_participant ON shares (participant_id);
+
+-- Paid amounts
+CREATE TRIGGER IF NOT EXISTS expense_inserted AFTER INSERT ON expenses BEGIN
+    INSERT INTO balances (workbook_id, participant_id, paid, paid_count) VALUES (NEW.workbook_id, NEW.payer_id, NEW.amount, 1)
+    ON CONFLICT (workbook_id, participant_id) DO UPDATE SET paid = paid + excluded.paid, paid_count = paid_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS expense_deleted BEFORE DELETE ON expenses BEGIN
+    DELETE FROM shares WHERE expense_id = OLD.id;
+    UPDATE balances SET paid = paid - OLD.amount, paid_count = paid_count - 1
+    WHERE workbook_id = OLD.workbook_id AND participant_id = OLD.payer_id;
+END;
+CREATE TRIGGER IF NOT EXISTS expense_updated AFTER UPDATE OF amount, payer_id ON expenses BEGIN
+    UPDATE balances SET paid = paid - OLD.amount, paid_count = paid_count - 1
+    WHERE workbook_id = OLD.workbook_id AND participant_id = OLD.payer_id;
+    INSERT INTO balances (workbook_id, participant_id, paid, paid_count) VALUES (NEW.workbook_id, NEW.payer_id, NEW.amount, 1)
+    ON CONFLICT (workbook_id, participant_id) DO UPDATE SET paid = paid + excluded.paid, paid_count = paid_count + 1;
+END;
+
+-- Owed shares; the expense row is still there when its shares are deleted (expense_deleted runs before the delete)
+CREATE TRIGGER IF NOT EXISTS share_inserted AFTER INSERT ON shares BEGIN
+    INSERT INTO balances (workbook_id, participant_id, owed, owed_count)
+    VALUES ((SELECT workbook_id FROM expenses WHERE id = NEW.expense_id), NEW.participant_id, NEW.share, 1)
+    ON CONFLICT (workbook_id, participant_id) DO UPDATE SET owed = owed + excluded.owed, owed_count = owed_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS share_deleted AFTER DELETE ON shares BEGIN
+    UPDATE balances SET owed = owed - OLD.share, owed_count = owed_count - 1
+    WHERE workbook_id = (SELECT workbook_id FROM expenses WHERE id = OLD.expense_id) AND participant_id = OLD.participant_id;
+END;
+CREATE TRIGGER IF NOT EXISTS share_updated AFTER UPDATE OF share, participant_id ON shares BEGIN
+    UPDATE balances SET owed = owed - OLD.share, owed_count = owed_count - 1
+    WHERE workbook_id = (SELECT workbook_id FROM expenses WHERE id = OLD.expense_id) AND participant_id = OLD.participant_id;
+    INSERT INTO balances (workbook_id, participant_id, owed, owed_count)
+    VALUES ((SELECT workbook_id FROM expenses WHERE id = NEW.expense_id), NEW.participant_id, NEW.share, 1)
+    ON CONFLICT (workbook_id, participant_id) DO UPDATE SET owed = owed + excluded.owed, owed_count = owed_count + 1;
+END;
+
+-- Somebody with no expenses and no shares left drops out of the balances (and takes any rounding residue along)
+CREATE TRIGGER IF NOT EXISTS balance_emptied AFTER UPDATE ON balances WHEN NEW.paid_count = 0 AND NEW.owed_count = 0 BEGIN
+    DELETE FROM balances WHERE workbook_id = NEW.workbook_id AND participant_id = NEW.participant_id;
+END;
+"""
+
+# Function to get the path of the store, from EXPENSE_SPLITTER_STORE or the default location
+def store_path(path=None):
+    return path or os.environ.get(STORE_ENV) or DEFAULT_STORE
+
+# Function to open (and if needed create) the store
+def open_store(path=None):
+    path = store_path(path)
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        with connection:
+            for table in ('balances', 'shares', 'expenses', 'participants', 'workbooks'):
+                connection.execute(f'DROP TABLE IF EXISTS {table}')
+    with connection:
+        connection.executescript(SCHEMA)
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return connection
+
+# Function to get the store's ID of a workbook, or None if it was never synced
+def workbook_id(connection, file_name):
+    row = connection.execute('SELECT id FROM workbooks WHERE path = ?', (os.path.abspath(file_name),)).fetchone()
+    return row[0] if row else None
+
+# Function to fingerprint every preprocessed row, including the columns only the breakdown shows
+def row_fingerprints(df):
+    import numpy as np
+    import pandas as pd
+    import incremental_state
+
+    fingerprints = incremental_state.row_fingerprints(df)
+    if 'Description' in df.columns:
+        frame = pd.DataFrame({'balance': fingerprints, 'description': df['Description'].astype(str).to_numpy(dtype=object)})
+        fingerprints = pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+    # SQLite integers are signed
+    return fingerprints.view(np.int64)
+
+# Function to turn a description cell into text, None when it is empty
+def description_text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value if isinstance(value, str) else str(value)
+
+# Function to give every name an ID in the participants table, returning {name: ID}
+def participant_ids(connection, names):
+    connection.executemany('INSERT OR IGNORE INTO participants (name) VALUES (?)', [(name,) for name in names])
+    ids = {}
+    for name, participant_id in connection.execute('SELECT name, id FROM participants'):
+        ids[name] = participant_id
+    return ids
+
+# Function to sync a workbook into the store. Only rows that were added or edited since the last sync are
+# written, and rows that were edited or removed are deleted; the triggers adjust the balances as they go.
+# Returns (rows written, rows deleted), or None when the workbook and rates did not change.
+def sync_workbook(connection, file_name, exchange_rates=None, exact=False, force=False):
+    import numpy as np
+    import ledger_cache
+
+    path = os.path.abspath(file_name)
+    if exchange_rates is None:
+        exchange_rates = rate_provider.get_exchange_rates() or {}
+    content_hash = ledger_cache.workbook_hash(file_name)
+    rates_hash = ledger_cache.rates_fingerprint(exchange_rates)
+    known = connection.execute('SELECT id, content_hash, rates_hash, exact FROM workbooks WHERE path = ?', (path,)).fetchone()
+    if known and not force and known[1:] == (content_hash, rates_hash, int(exact)):
+        return None
+
+    expenses = ledger.Ledger.load(file_name, exchange_rates=exchange_rates, exact=exact)
+    df = expenses.df
+    fingerprints = row_fingerprints(df)
+    rows = df.index.to_numpy(dtype=np.int64) + 2  # Numbered as in the workbook, the header is row 1
+
+    with connection:
+        if known is None:
+            book_id = connection.execute('INSERT INTO workbooks (path) VALUES (?)', (path,)).lastrowid
+        else:
+            book_id = known[0]
+        cleared = 0
+        if known is not None and known[3] != int(exact):
+            cleared = connection.execute('DELETE FROM expenses WHERE workbook_id = ?', (book_id,)).rowcount  # Every share changes
+
+        # Match the stored rows to the workbook by content, so a row inserted or removed above others does not
+        # rewrite them; matched rows only get their new row number, and unmatched stored rows are deleted
+        stored = {}
+        for expense_id, row, fingerprint in connection.execute('SELECT id, row, fingerprint FROM expenses WHERE workbook_id = ? ORDER BY row', (book_id,)):
+            stored.setdefault(fingerprint, []).append((row, expense_id))
+        new_rows, moved = [], []
+        for i, (row, fingerprint) in enumerate(zip(rows.tolist(), fingerprints.tolist())):
+            matches = stored.get(fingerprint)
+            if not matches:
+                new_rows.append(i)
+                continue
+            old_row, expense_id = matches.pop(0)
+            if old_row != row:
+                moved.append((row, expense_id))
+        stale = [(expense_id,) for matches in stored.values() for _, expense_id in matches]
+        connection.executemany('DELETE FROM expenses WHERE id = ?', stale)
+        connection.executemany('UPDATE expenses SET row = ? WHERE id = ?', moved)
+        new_rows = np.array(new_rows, dtype=np.int64)
+
+        if len(new_rows):
+            ids = participant_ids(connection, expenses.encoded['participants'])
+            first_id = (connection.execute('SELECT MAX(id) FROM expenses').fetchone()[0] or 0) + 1
+            expense_ids = np.full(len(df), -1, dtype=np.int64)
+            expense_ids[new_rows] = np.arange(first_id, first_id + len(new_rows))
+
+            payers = df['Paying person'].to_numpy(dtype=object)
+            amounts = df['Amount'].to_numpy(dtype=float)
+            descriptions = df['Description'].to_numpy(dtype=object) if 'Description' in df.columns else np.full(len(df), UNNAMED_ITEM, dtype=object)
+            # Converted rows are in the base currency; the others kept theirs for lack of a rate
+            currencies = df['Currency'].astype(str).to_numpy(dtype=object)
+            connection.executemany(
+                'INSERT INTO expenses (id, workbook_id, row, fingerprint, payer_id, description, amount, currency) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(int(expense_ids[i]), book_id, int(rows[i]), int(fingerprints[i]), ids[payers[i]], description_text(descriptions[i]),
+                  float(amounts[i]), currencies[i]) for i in new_rows.tolist()])
+
+            shares = expenses.applied_shares
+            entry_rows = shares['row'].to_numpy(dtype=np.int64)
+            wanted = expense_ids[entry_rows] >= 0
+            connection.executemany('INSERT INTO shares (expense_id, participant_id, share) VALUES (?, ?, ?)',
+                                   zip(expense_ids[entry_rows[wanted]].tolist(),
+                                       [ids[person] for person in shares['person'].to_numpy(dtype=object)[wanted]],
+                                       shares['share'].to_numpy(dtype=float)[wanted].tolist()))
+
+        connection.execute('UPDATE workbooks SET content_hash = ?, rates_hash = ?, exact = ?, synced_at = ? WHERE id = ?',
+                           (content_hash, rates_hash, int(exact), time.time(), book_id))
+    return len(new_rows), len(stale) + cleared
+
+# Function to look up a synced workbook's ID, raising a clear error when it was never synced
+def require_workbook(connection, file_name):
+    book_id = workbook_id(connection, file_name)
+    if book_id is None:
+        raise KeyError(f"{file_name} is not in the store; sync it first.")
+    return book_id
+
+# Function to read the paid and owed totals of a workbook from the materialized balances, rounded as the pipeline does
+def store_totals(connection, file_name):
+    book_id = require_workbook(connection, file_name)
+    individual_expenses, total_shares = {}, {}
+    query = ('SELECT p.name, b.paid, b.paid_count, b.owed, b.owed_count FROM balances b '
+             'JOIN participants p ON p.id = b.participant_id WHERE b.workbook_id = ?')
+    for name, paid, paid_count, owed, owed_count in connection.execute(query, (book_id,)):
+        if paid_count > 0:
+            individual_expenses[name] = round(paid, 2)
+        if owed_count > 0:
+            total_shares[name] = owed
+    return individual_expenses, total_shares
+
+# Function to get one person's paid amount, share and net balance in a workbook, or None if they are not in it
+def person_balance(connection, file_name, person):
+    query = ('SELECT b.paid, b.owed FROM balances b JOIN participants p ON p.id = b.participant_id '
+             'WHERE b.workbook_id = ? AND p.name = ?')
+    row = connection.execute(query, (require_workbook(connection, file_name), person)).fetchone()
+    if row is None:
+        return None
+    paid = round(row[0], 2)
+    return {'paid': paid, 'share': round(row[1], 2), 'balance': round(paid - row[1], 2)}
+
+# Itemized breakdown per person read from the store, in ledger order. Like item_store.ItemBreakdown it behaves
+# like a {person: [(description, amount)]} or {person: [(description, share, amount)]} dict and each person's
+# list is only queried when it is looked up, through the payer or participant index.
+class StoreBreakdown(Mapping):
+
+    def __init__(self, connection, book_id, with_shares=False):
+        self.connection = connection
+        self.book_id = book_id
+        self.with_shares = with_shares
+        column = 'owed_count' if with_shares else 'paid_count'
+        self.names = [name for name, in connection.execute(
+            f'SELECT p.name FROM balances b JOIN participants p ON p.id = b.participant_id WHERE b.workbook_id = ? AND b.{column} > 0',
+            (book_id,))]
+        self.index = set(self.names)
+
+    def __getitem__(self, person):
+        if person not in self.index:
+            raise KeyError(person)
+        if self.with_shares:
+            query = ('SELECT e.description, s.share, e.amount FROM shares s JOIN expenses e ON e.id = s.expense_id '
+                     'WHERE s.participant_id = (SELECT id FROM participants WHERE name = ?) AND e.workbook_id = ? ORDER BY e.row, s.rowid')
+        else:
+            query = ('SELECT description, amount FROM expenses '
+                     'WHERE payer_id = (SELECT id FROM participants WHERE name = ?) AND workbook_id = ? ORDER BY row')
+        # An empty description cell is NULL in the store and NaN in the DataFrame; give it back as NaN
+        return [(math.nan if item[0] is None else item[0],) + tuple(item[1:])
+                for item in self.connection.execute(query, (person, self.book_id))]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, person):
+        return person in self.index
+
+# Function to build a Ledger from a synced workbook without opening it: the balances, the settlement and the
+# report all read their aggregates from the store
+def store_ledger(connection, file_name):
+    book_id = require_workbook(connection, file_name)
+    individual_expenses, total_shares = store_totals(connection, file_name)
+    row_count = connection.execute('SELECT COUNT(*) FROM expenses WHERE workbook_id = ?', (book_id,)).fetchone()[0]
+    unconverted_currencies = [currency for currency, in connection.execute(
+        'SELECT DISTINCT currency FROM expenses WHERE workbook_id = ? AND currency != ? ORDER BY currency',
+        (book_id, rate_provider.base_currency()))]
+    return ledger.Ledger.from_totals(individual_expenses, total_shares, StoreBreakdown(connection, book_id),
+                                     StoreBreakdown(connection, book_id, with_shares=True), row_count, file_name,
+                                     unconverted_currencies)
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep workbooks in a local SQLite store and query their balances.")
+    parser.add_argument('--store', default=None, help=f"Store file (default: ${STORE_ENV} or {DEFAULT_STORE})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync = commands.add_parser('sync', help="Load the added or edited rows of workbooks into the store")
+    sync.add_argument('files', nargs='+')
+    sync.add_argument('--force', action='store_true', help="Compare every row even if the workbook looks unchanged")
+    sync.add_argument('--exact-money', action='store_true', default=money.exact_money_enabled(),
+                      help="Compute in integer øre so every expense splits exactly")
+    balances = commands.add_parser('balances', help="Print the net balances and the settlement of a synced workbook")
+    balances.add_argument('file')
+    balances.add_argument('--strategy', default='auto', help="Settlement strategy: auto, greedy or exact")
+    person = commands.add_parser('person', help="Print what one person paid for and owes in a synced workbook")
+    person.add_argument('file')
+    person.add_argument('name')
+    report = commands.add_parser('report', help="Write the report of a synced workbook from the store")
+    report.add_argument('file')
+    report.add_argument('-o', '--output-dir', default=None, help="Directory for the report (default: the current directory)")
+    args = parser.parse_args(argv)
+
+    connection = open_store(args.store)
+    currency = rate_provider.base_currency()
+    try:
+        if args.command == 'sync':
+            exchange_rates = rate_provider.get_exchange_rates() or {}
+            for file_name in args.files:
+                start = time.perf_counter()
+                changes = sync_workbook(connection, file_name, exchange_rates, args.exact_money, args.force)
+                if changes is None:
+                    print(f"{file_name} is up to date.")
+                else:
+                    print(f"{file_name}: {changes[0]} rows written, {changes[1]} rows removed in {time.perf_counter() - start:.2f} s")
+            return 0
+
+        try:
+            expenses = store_ledger(connection, args.file)
+        except KeyError as e:
+            print(e.args[0])
+            return 1
+        if args.command == 'balances':
+            if expenses.unconverted_currencies:
+                print(report_writer.unconverted_warning(expenses.unconverted_currencies, currency))
+            for person_name, balance in sorted(expenses.net_balances.items()):
+                print(f"{person_name}: {balance:.2f} {currency}")
+            print("\nSimplified Debts:")
+            for debtor, creditor, amount in expenses.settlement(args.strategy):
+                print(f"{debtor} owes {creditor} {amount:.2f} {currency}")
+        elif args.command == 'person':
+            totals = person_balance(connection, args.file, args.name)
+            if totals is None:
+                print(f"{args.name} does not appear in {args.file}.")
+                return 1
+            for description, amount in expenses.person_payments.get(args.name, []):
+                print(f"Paid {amount:.2f} {currency} for {description}")
+            for description, share, amount in expenses.personal_item_costs.get(args.name, []):
+                print(f"Owes {share:.2f} {currency} of {amount:.2f} {currency} for {description}")
+            print(f"Paid {totals['paid']:.2f}, share {totals['share']:.2f}, balance {totals['balance']:.2f} {currency}")
+        else:
+            expenses.write_reports(output_dir=args.output_dir)
+        return 0
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,42 @@
+import os
+
+# Setting this environment variable to 1 switches the pipeline to integer minor units (øre)
+EXACT_MONEY_ENV = 'EXPENSE_SPLITTER_EXACT_MONEY'
+
+MINOR_UNITS_PER_DKK = 100
+
+# Function to check whether exact integer money arithmetic was requested
+def exact_money_enabled():
+    return os.environ.get(EXACT_MONEY_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Function to convert DKK amounts to int64 minor units, rounding half away from zero like round(..., 2) on typed input
+def to_minor_units(values):
+    import numpy as np
+
+    values = np.asarray(values, dtype=float) * MINOR_UNITS_PER_DKK
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+# Function to convert int64 minor units back to DKK amounts
+def from_minor_units(values):
+    import numpy as np
+
+    return np.asarray(values, dtype=np.int64) / MINOR_UNITS_PER_DKK
+
+# Function to split integer totals evenly between count recipients with the largest-remainder method.
+# Every recipient gets total // count; the leftover units go to the first recipients by position,
+# so the parts always add up to the total exactly and the result does not depend on float rounding.
+def allocate_evenly(totals, counts, positions):
+    import numpy as np
+
+    counts = np.maximum(counts, 1)
+    base = np.floor_divide(totals, counts)
+    leftover = totals - base * counts
+    return base + (positions < leftover)
+
+# Function to sum int64 values per group without going through floats
+def sum_by_group(groups, values, size):
+    import numpy as np
+
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, groups, values)
+    return totals
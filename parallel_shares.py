@@ -0,0 +1,156 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import balance_engine
+import money
+
+# Setting this environment variable to a number of processes enables the partitioned share computation
+WORKERS_ENV = 'EXPENSE_SPLITTER_WORKERS'
+
+# Ledgers with fewer rows than this are always computed in one process; below it the pool costs more than it saves
+PARALLEL_MIN_ROWS = 200_000
+
+# Each worker gets several chunks so an unlucky slow chunk does not hold up the whole pool
+CHUNKS_PER_WORKER = 4
+
+# Encoded ledger arrays the workers read, and the per-entry results they write
+INPUT_ARRAYS = ['amounts', 'payer_ids', 'shared_offsets', 'shared_members', 'explicit_rows', 'explicit_people', 'explicit_values']
+OUTPUT_ARRAYS = ['explicit', 'shares', 'applied']
+
+# Function to get the configured number of worker processes, 1 when the partitioned mode is off
+def configured_workers(workers=None):
+    if workers is None:
+        try:
+            workers = int(os.environ.get(WORKERS_ENV, '1') or 1)
+        except ValueError:
+            workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+# Function to check whether a ledger of this size should be computed in partitions
+def use_parallel(row_count, workers=None):
+    return configured_workers(workers) > 1 and row_count >= PARALLEL_MIN_ROWS
+
+# Function to copy arrays into new shared-memory blocks, returning the blocks and a picklable description of them
+def share_arrays(arrays):
+    blocks, spec = {}, {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks[name] = block
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+# Function to map shared-memory blocks described by share_arrays into a worker, as NumPy views
+def attach_arrays(spec):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+# Function to compute one chunk of rows [start, end): writes the per-entry results into the shared output
+# arrays and returns the chunk's paid and share partial sums (and counts) per participant
+def compute_chunk(spec, participant_count, start, end, exact):
+    blocks, arrays = attach_arrays(spec)
+    try:
+        offsets = arrays['shared_offsets']
+        first_entry, last_entry = int(offsets[start]), int(offsets[end])
+        explicit_rows = arrays['explicit_rows']  # Sorted by row, so the chunk's explicit shares are contiguous
+        lo, hi = np.searchsorted(explicit_rows, [start, end])
+
+        # A ledger of just this chunk, with row numbers relative to its first row
+        chunk = {
+            'participants': np.empty(participant_count, dtype=object),
+            'payer_ids': arrays['payer_ids'][start:end],
+            'amounts': arrays['amounts'][start:end],
+            'shared_offsets': offsets[start:end + 1] - first_entry,
+            'shared_members': arrays['shared_members'][first_entry:last_entry],
+            'explicit_rows': explicit_rows[lo:hi] - start,
+            'explicit_people': arrays['explicit_people'][lo:hi],
+            'explicit_values': arrays['explicit_values'][lo:hi],
+        }
+        entries = balance_engine.compute_shares(chunk, exact)
+        for name in OUTPUT_ARRAYS:
+            arrays[name][first_entry:last_entry] = entries[name]
+
+        paid, paid_counts = balance_engine.paid_totals(chunk, exact)
+        shares, share_counts = balance_engine.share_totals(chunk, entries)
+        return paid, paid_counts, shares, share_counts
+    finally:
+        arrays = None
+        for block in blocks:
+            block.close()
+
+# Function to split the rows into contiguous chunks of about equal numbers of 'Shared with' entries
+def chunk_bounds(offsets, chunks):
+    n_rows = len(offsets) - 1
+    targets = np.linspace(0, offsets[-1], chunks + 1)[1:-1]
+    cuts = np.searchsorted(offsets, targets)
+    return [int(bound) for bound in np.unique(np.concatenate([[0], np.clip(cuts, 0, n_rows), [n_rows]]))]
+
+# Function to compute the share entries and the paid and share totals of an encoded ledger across a process pool.
+# The encoded arrays go to the workers through shared memory and every share is computed within its own row,
+# so the entries equal those of balance_engine.compute_shares exactly. The partial sums are added up in chunk
+# order, so the totals are the same on every run. Returns (entries, paid totals, paid counts, share totals,
+# share counts), in øre when exact.
+def compute_partitioned(ledger, exact=False, workers=None):
+    workers = configured_workers(workers)
+    participant_count = len(ledger['participants'])
+    n_entries = len(ledger['shared_members'])
+
+    # Sort the explicit shares by row once, so each chunk finds its own with a binary search
+    order = np.argsort(ledger['explicit_rows'], kind='stable')
+    inputs = {name: ledger[name] for name in INPUT_ARRAYS}
+    for name in ('explicit_rows', 'explicit_people', 'explicit_values'):
+        inputs[name] = inputs[name][order]
+    outputs = {
+        'explicit': np.zeros(n_entries),
+        'shares': np.zeros(n_entries, dtype=np.int64 if exact else float),
+        'applied': np.zeros(n_entries, dtype=bool),
+    }
+
+    blocks, spec = share_arrays({**inputs, **outputs})
+    try:
+        bounds = chunk_bounds(ledger['shared_offsets'], workers * CHUNKS_PER_WORKER)
+        starts, ends = bounds[:-1], bounds[1:]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map returns the partial sums in chunk order, whatever order the chunks finish in
+            partials = list(pool.map(compute_chunk, [spec] * len(starts), [participant_count] * len(starts), starts, ends,
+                                     [exact] * len(starts)))
+
+        dtype = np.int64 if exact else float
+        paid, paid_counts = np.zeros(participant_count, dtype=dtype), np.zeros(participant_count, dtype=np.int64)
+        shares, share_counts = np.zeros(participant_count, dtype=dtype), np.zeros(participant_count, dtype=np.int64)
+        for chunk_paid, chunk_paid_counts, chunk_shares, chunk_share_counts in partials:
+            paid += chunk_paid
+            paid_counts += chunk_paid_counts
+            shares += chunk_shares
+            share_counts += chunk_share_counts
+
+        entries = {name: np.ndarray(array.shape, dtype=array.dtype, buffer=blocks[name].buf).copy() for name, array in outputs.items()}
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    offsets = ledger['shared_offsets']
+    entries['rows'] = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+    entries['people'] = ledger['shared_members']
+    entries['exact'] = exact
+    return entries, paid, paid_counts, shares, share_counts
+
+# Function to turn per-participant totals into the {person: amount} mappings balance_engine returns
+def totals_by_person(ledger, paid, paid_counts, shares, share_counts, exact=False):
+    if exact:
+        paid, shares = money.from_minor_units(paid), money.from_minor_units(shares)
+    participants = ledger['participants']
+    individual_expenses = {person: round(float(amount), 2) for person, amount, count in zip(participants, paid, paid_counts) if count > 0}
+    total_shares = {person: float(share) for person, share, count in zip(participants, shares, share_counts) if count > 0}
+    return individual_expenses, total_shares
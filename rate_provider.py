@@ -0,0 +1,322 @@
+import asyncio
+import csv
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_BASE_CURRENCY = 'DKK'
+DEFAULT_RATES_URL = "https://open.er-api.com/v6/latest/{base}"
+DEFAULT_HISTORICAL_RATES_URL = "https://api.frankfurter.app/{date}?from={base}"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'expense-splitter')
+DEFAULT_TTL_SECONDS = 12 * 60 * 60
+DEFAULT_TIMEOUT_SECONDS = 3
+DEFAULT_RETRIES = 2
+
+# Most requests in flight at once when many historical dates are fetched
+MAX_CONCURRENT_REQUESTS = 8
+
+# Dates whose historical rates could not be fetched during this run, per source list and base currency,
+# so a run asks for each of them only once
+failed_dates = {}
+
+# Environment variables that override where rates come from, where they are cached and the base currency.
+# EXPENSE_SPLITTER_RATES may list several sources separated by commas; earlier sources take priority.
+RATES_SOURCE_ENV = 'EXPENSE_SPLITTER_RATES'
+HISTORICAL_RATES_SOURCE_ENV = 'EXPENSE_SPLITTER_HISTORICAL_RATES'
+RATES_CACHE_ENV = 'EXPENSE_SPLITTER_RATES_CACHE'
+BASE_CURRENCY_ENV = 'EXPENSE_SPLITTER_BASE_CURRENCY'
+
+# Function to get the currency every amount is converted to
+def base_currency(base=None):
+    return (base or os.environ.get(BASE_CURRENCY_ENV) or DEFAULT_BASE_CURRENCY).strip().upper()
+
+# Function to get the rate cache file for a base currency and the sources the rates come from,
+# so rates from different sources never share a cache file
+def default_cache_file(base=DEFAULT_BASE_CURRENCY, historical=False, sources=None):
+    suffix = '_history' if historical else ''
+    if sources:
+        suffix += '_' + hashlib.sha256(','.join(sources).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(DEFAULT_CACHE_DIR, f"rates_{base}{suffix}.json")
+
+# Function to split a source setting into a list of sources, filling in the base currency
+def source_list(source, default, base):
+    if not source:
+        source = [default]
+    elif isinstance(source, str):
+        source = source.split(',')
+    return [item.strip().replace('{base}', base) for item in source if item.strip()]
+
+# Function to check whether a source is fetched over the network
+def is_remote(source):
+    return source.startswith('http://') or source.startswith('https://')
+
+# Function to list the sources of the rates on past dates for the ledgers. EXPENSE_SPLITTER_HISTORICAL_RATES
+# wins; without it the history follows the latest rates, so when those only come from local files nothing
+# is fetched and dated rows use the local rates too.
+def historical_sources(base=None):
+    base = base_currency(base)
+    configured = os.environ.get(HISTORICAL_RATES_SOURCE_ENV)
+    if not configured:
+        latest = source_list(os.environ.get(RATES_SOURCE_ENV), DEFAULT_RATES_URL, base)
+        if not any(is_remote(source) for source in latest):
+            return []
+    return source_list(configured, DEFAULT_HISTORICAL_RATES_URL, base)
+
+# Function to count the dates whose historical rates could not be fetched during this run
+def failed_date_count():
+    return sum(len(dates) for dates in failed_dates.values())
+
+# Function to fetch the latest rates from the exchange-rate API
+def fetch_rates_from_api(url=DEFAULT_RATES_URL.format(base=DEFAULT_BASE_CURRENCY), timeout=DEFAULT_TIMEOUT_SECONDS, session=None):
+    import requests  # Only needed when the network is actually used
+
+    response = (session or requests).get(url, timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"Exchange rate service returned status {response.status_code}")
+    return {currency: float(rate) for currency, rate in response.json()['rates'].items()}
+
+# Function to load rates from a local JSON or CSV file
+def load_rates_from_file(path):
+    if path.lower().endswith('.csv'):
+        rates = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or not row[0].strip():
+                    continue
+                try:
+                    rates[row[0].strip().upper()] = float(row[1])
+                except ValueError:
+                    continue  # Skip the header and malformed lines
+        return rates
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Accept both the API response format and a flat currency -> rate mapping
+    rates = data.get('rates', data) if isinstance(data, dict) else {}
+    return {currency: float(rate) for currency, rate in rates.items()}
+
+# Function to load the rates for one date from a local JSON file mapping dates to rates, or None if the date is missing
+def load_historical_rates_from_file(path, date):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Accept both a time-series response ({"rates": {date: rates}}) and a flat date -> rates mapping
+    rates = data.get('rates', data) if isinstance(data, dict) else {}
+    day = rates.get(date)
+    return {currency: float(rate) for currency, rate in day.items()} if day else None
+
+# Function to load rates from a source, which may be a URL or a local file
+def load_rates_from_source(source, timeout=DEFAULT_TIMEOUT_SECONDS, session=None):
+    if is_remote(source):
+        return fetch_rates_from_api(source, timeout, session)
+    return load_rates_from_file(source)
+
+# One requests session per worker thread, since a session must not be shared between threads
+class ThreadSessions:
+
+    def __init__(self):
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    # The calling thread's session, opened on its first request
+    def get(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            import requests
+
+            session = self.local.session = requests.Session()
+            with self.lock:
+                self.sessions.append(session)
+        return session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for session in self.sessions:
+            session.close()
+
+# Function to fetch rates in a worker thread, over that thread's own session
+def fetch_in_thread(url, timeout, sessions):
+    return fetch_rates_from_api(url, timeout, sessions.get() if sessions is not None else None)
+
+# Function to load rates from one source without blocking the event loop, retrying transient failures
+async def load_source_async(sessions, source, timeout=DEFAULT_TIMEOUT_SECONDS, retries=DEFAULT_RETRIES, date=None, base=None):
+    if not is_remote(source):
+        if date is not None:
+            return load_historical_rates_from_file(source, date)
+        return load_rates_from_file(source)
+
+    url = source.replace('{date}', date) if date is not None else source
+    for attempt in range(retries + 1):
+        try:
+            # The request runs in a worker thread; wait_for bounds it even if the connection hangs
+            rates = await asyncio.wait_for(asyncio.to_thread(fetch_in_thread, url, timeout, sessions), timeout + 1)
+            if base is not None:
+                rates.setdefault(base, 1.0)
+            return rates
+        except Exception:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(0.2 * 2 ** attempt)
+
+# Function to open the connection pools for the remote sources, one per worker thread; local files need none
+def open_sessions(sources):
+    if not any(is_remote(source) for source in sources):
+        return contextlib.nullcontext()
+    return ThreadSessions()
+
+# Function to query several sources at once, reusing connections within each worker thread, returning their
+# results in source order
+async def fetch_sources_async(sources, timeout=DEFAULT_TIMEOUT_SECONDS, retries=DEFAULT_RETRIES, dates=None, base=None):
+    limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    with open_sessions(sources) as sessions:
+        async def load(source, date):
+            async with limit:
+                return await load_source_async(sessions, source, timeout, retries, date, base)
+
+        if dates is None:
+            return await asyncio.gather(*(load(source, None) for source in sources), return_exceptions=True)
+        return await asyncio.gather(*(load(source, date) for date in dates for source in sources), return_exceptions=True)
+
+# Function to merge the results of several sources: earlier sources win, later ones fill in missing currencies.
+# Errors are printed, or collected in the errors list when one is given.
+def merge_rates(results, sources, errors=None):
+    merged = None
+    for source, result in zip(sources, results):
+        if isinstance(result, BaseException):
+            message = f"An error occurred while reading exchange rates from {source}: {result}"
+            if errors is None:
+                print(message)
+            else:
+                errors.append(message)
+            continue
+        if not result:
+            continue
+        merged = dict(result) if merged is None else {**result, **merged}
+    return merged
+
+# Function to read the cached rates snapshot, returning (rates, age in seconds); snapshots for another base
+# currency or from other sources are ignored
+def read_rate_cache(cache_file, base=None, source=None):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if base is not None and snapshot.get('base', DEFAULT_BASE_CURRENCY) != base:
+            return None, None
+        if source is not None and snapshot.get('source') != source:
+            return None, None
+        return snapshot['rates'], time.time() - snapshot['fetched_at']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+# Function to write a rates snapshot to the cache
+def write_rate_cache(cache_file, rates, source, base=DEFAULT_BASE_CURRENCY):
+    try:
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': time.time(), 'source': source, 'base': base, 'rates': rates}, f)
+        os.replace(tmp_file, cache_file)  # Atomic so concurrent runs never see a half-written file
+    except OSError as e:
+        print(f"Could not write exchange rate cache: {e}")
+
+# Function to get exchange rates, preferring a fresh cache and falling back to a stale one when offline.
+# Returns a mapping of currency to units per one unit of the base currency, or None if no rates are available.
+def get_exchange_rates(source=None, cache_file=None, ttl=DEFAULT_TTL_SECONDS, timeout=DEFAULT_TIMEOUT_SECONDS, base=None,
+                       retries=DEFAULT_RETRIES):
+    base = base_currency(base)
+    sources = source_list(source or os.environ.get(RATES_SOURCE_ENV), DEFAULT_RATES_URL, base)
+    cache_file = cache_file or os.environ.get(RATES_CACHE_ENV) or default_cache_file(base, sources=sources)
+
+    # Local files are cheap to read, so only remote sources go through the cache
+    remote = any(is_remote(item) for item in sources)
+    cached_rates, age = read_rate_cache(cache_file, base, ','.join(sources)) if remote else (None, None)
+    if cached_rates is not None and age < ttl:
+        return cached_rates
+
+    rates = merge_rates(asyncio.run(fetch_sources_async(sources, timeout, retries, base=base)), sources)
+    if rates is None:
+        if cached_rates is not None:
+            print(f"Using cached exchange rates from {age / 3600:.1f} hours ago.")
+        return cached_rates
+
+    if remote:
+        write_rate_cache(cache_file, rates, ','.join(sources), base)
+    return rates
+
+# Function to get the rates on each of the given dates (YYYY-MM-DD), fetching the missing dates concurrently.
+# Past rates never change, so fetched dates are cached for good; dates that fail are not asked for again
+# during this run. Returns {date: rates or None}.
+def get_historical_rates(dates, source=None, cache_file=None, timeout=DEFAULT_TIMEOUT_SECONDS, base=None,
+                         retries=DEFAULT_RETRIES):
+    base = base_currency(base)
+    sources = source_list(source or os.environ.get(HISTORICAL_RATES_SOURCE_ENV), DEFAULT_HISTORICAL_RATES_URL, base)
+    cache_file = cache_file or default_cache_file(base, historical=True, sources=sources)
+    remote = any(is_remote(item) for item in sources)
+
+    cached, _ = read_rate_cache(cache_file, base, ','.join(sources)) if remote else (None, None)
+    cached = cached or {}
+    failed_before = failed_dates.setdefault((','.join(sources), base), set())
+    dates = sorted(set(dates))
+    missing = [date for date in dates if date not in cached and date not in failed_before]
+    if missing:
+        results = asyncio.run(fetch_sources_async(sources, timeout, retries, dates=missing, base=base))
+        errors, failed = [], []
+        for i, date in enumerate(missing):
+            rates = merge_rates(results[i * len(sources):(i + 1) * len(sources)], sources, errors)
+            if rates is None:
+                failed.append(date)
+            else:
+                cached[date] = rates
+        # A ledger can span hundreds of dates, so failures are reported once rather than per date
+        if failed:
+            failed_before.update(failed)
+            print(f"Could not get the exchange rates of {len(failed)} date(s), from {failed[0]} to {failed[-1]}.")
+            if errors:
+                print(errors[0])
+        if remote and len(failed) < len(missing):
+            write_rate_cache(cache_file, cached, ','.join(sources), base)
+    return {date: cached.get(date) for date in dates}
+
+# Function to list the explicit share columns of a ledger
+def share_columns(df):
+    return [column for column in df.columns if isinstance(column, str) and column.endswith("'s share")]
+
+# Function to convert 'Amount' and all share columns to the base currency in one vectorized pass.
+# Rows with a date are converted at the rate of that day when it is known, the other rows at the latest rates.
+def convert_columns(df, exchange_rates, base=None):
+    import numpy as np
+    import pandas as pd
+
+    base = base_currency(base)
+    currencies = df['Currency']
+    foreign = (currencies != base).to_numpy(dtype=bool)
+    if not foreign.any():
+        return df
+
+    rates = currencies.map(exchange_rates).to_numpy(dtype=float)
+    if 'Date' in df.columns:
+        import rate_table
+
+        row_rates = rate_table.historical_row_rates(currencies.to_numpy(dtype=object), rate_table.days_from_series(df['Date']), base)
+        if row_rates is not None:
+            rates = np.where(np.isnan(row_rates), rates, row_rates)
+    missing = foreign & np.isnan(rates)
+    for currency in pd.unique(currencies[missing]):
+        print(f"Exchange rate for {currency} not found.")
+    # Keep the original amount and currency when no rate is known, so the reports can say it was not converted
+    divisor = np.where(foreign & ~missing, rates, 1.0)
+
+    df = df.copy()
+    df['Amount'] = np.where(foreign, np.round(df['Amount'].to_numpy(dtype=float) / divisor, 2), df['Amount'])
+    columns = share_columns(df)
+    if columns:
+        values = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        converted = np.where(foreign[:, None], np.round(values / divisor[:, None], 2), values)
+        df[columns] = converted
+    df.loc[foreign & ~missing, 'Currency'] = base
+    return df
@@ -0,0 +1,210 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+import rate_provider
+
+# Day number used for rows without a usable date
+NO_DATE = np.iinfo(np.int64).min
+
+# Date-indexed exchange rates: for every currency, the days with a known rate (sorted, as day numbers)
+# and the rates on those days. Lookups are as-of: the rate of the latest day on or before the date.
+class RateTable:
+
+    def __init__(self, columns=None):
+        self.columns = columns or {}
+
+    # Build a table from {date: {currency: rate}}, as returned by rate_provider.get_historical_rates
+    @classmethod
+    def from_history(cls, history):
+        days, currencies, rates = [], [], []
+        for day, day_rates in history.items():
+            for currency, rate in (day_rates or {}).items():
+                days.append(day)
+                currencies.append(currency)
+                rates.append(rate)
+        return cls.from_records(days, currencies, rates)
+
+    # Build a table from a CSV file with date,currency,rate lines
+    @classmethod
+    def from_csv(cls, path):
+        days, currencies, rates = [], [], []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                try:
+                    rates.append(float(row[2]))
+                except ValueError:
+                    continue  # Skip the header and malformed lines
+                days.append(row[0].strip())
+                currencies.append(row[1].strip().upper())
+        return cls.from_records(days, currencies, rates)
+
+    # Build a table from parallel lists of ISO dates, currencies and rates; later records win on the same day
+    @classmethod
+    def from_records(cls, days, currencies, rates):
+        if not days:
+            return cls()
+        day_numbers = np.array(days, dtype='datetime64[D]').astype(np.int64)
+        currencies = np.array(currencies, dtype=object)
+        rates = np.array(rates, dtype=float)
+        columns = {}
+        for currency in dict.fromkeys(currencies):
+            rows = np.flatnonzero(currencies == currency)
+            # Reverse before the stable unique so the last record of a day is the one kept
+            rows = rows[::-1]
+            unique_days, first = np.unique(day_numbers[rows], return_index=True)
+            columns[currency] = (unique_days, rates[rows][first])
+        return cls(columns)
+
+    # Combine two tables; where both have a rate for the same currency and day, this table's rate wins
+    def merge(self, other):
+        columns = dict(other.columns)
+        for currency, (days, rates) in self.columns.items():
+            if currency not in columns:
+                columns[currency] = (days, rates)
+                continue
+            other_days, other_rates = columns[currency]
+            keep = ~np.isin(other_days, days)
+            merged_days = np.concatenate([days, other_days[keep]])
+            merged_rates = np.concatenate([rates, other_rates[keep]])
+            order = np.argsort(merged_days, kind='stable')
+            columns[currency] = (merged_days[order], merged_rates[order])
+        return RateTable(columns)
+
+    # As-of lookup of many (currency, day) pairs at once, NaN where the table has no rate on or before the day
+    def lookup(self, currencies, days):
+        currencies = np.asarray(currencies, dtype=object)
+        days = np.asarray(days, dtype=np.int64)
+        result = np.full(len(days), np.nan)
+        for currency, (table_days, table_rates) in self.columns.items():
+            rows = np.flatnonzero((currencies == currency) & (days != NO_DATE))
+            if len(rows) == 0:
+                continue
+            positions = np.searchsorted(table_days, days[rows], side='right') - 1
+            found = positions >= 0
+            result[rows[found]] = table_rates[positions[found]]
+        return result
+
+# Function to turn a pandas column of dates into day numbers, NO_DATE where there is no valid date
+def days_from_series(values):
+    import pandas as pd
+
+    parsed = pd.to_datetime(values, errors='coerce')
+    days = parsed.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    days[parsed.isna().to_numpy()] = NO_DATE
+    return days
+
+# Function to turn plain cell values (datetime, date or ISO string) into day numbers, for ledgers read without pandas
+def days_from_values(values):
+    days = np.full(len(values), NO_DATE, dtype=np.int64)
+    for i, value in enumerate(values):
+        if isinstance(value, datetime):
+            value = value.date()
+        try:
+            days[i] = np.datetime64(value if isinstance(value, date) else str(value).strip()[:10], 'D').astype(np.int64)
+        except (TypeError, ValueError):
+            continue
+    return days
+
+# Function to load a whole local history file: JSON mapping dates to rates, or CSV with date,currency,rate lines
+def load_table_file(path):
+    if path.lower().endswith('.csv'):
+        return RateTable.from_csv(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Accept both a time-series response ({"rates": {date: rates}}) and a flat date -> rates mapping
+    history = data.get('rates', data) if isinstance(data, dict) else {}
+    return RateTable.from_history({day: rates for day, rates in history.items() if isinstance(rates, dict)})
+
+# Tables loaded from local history files during this run, per version of the file
+local_tables = {}
+
+# Tables fetched from remote services during this run, per source list and base currency, with every day
+# already asked for, so a ledger read in chunks asks for each day once
+remote_tables = {}
+
+# Function to forget the remote days asked for and the dates that failed, so a long-running process asks again
+def forget_remote_history():
+    remote_tables.clear()
+    rate_provider.failed_dates.clear()
+
+# Function to load a local history file whole, once per version of the file
+def local_table(path):
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+    except OSError as e:
+        key = (path, str(e))
+        if key not in local_tables:
+            print(f"An error occurred while reading exchange rates from {path}: {e}")
+            local_tables[key] = RateTable()
+        return local_tables[key]
+    if key not in local_tables:
+        try:
+            local_tables[key] = load_table_file(path)
+        except (OSError, ValueError) as e:
+            print(f"An error occurred while reading exchange rates from {path}: {e}")
+            local_tables[key] = RateTable()
+    return local_tables[key]
+
+# Function to build the rate table covering the given days. Local history files are loaded whole, so as-of
+# lookups also cover days they do not list; remote services are only asked for the days still missing,
+# and only once per run.
+def rate_table_for_days(days, base=None):
+    base = rate_provider.base_currency(base)
+    sources = rate_provider.historical_sources(base)
+    table = RateTable()
+    for source in sources:
+        if not rate_provider.is_remote(source):
+            table = table.merge(local_table(source))  # Earlier sources win
+
+    remote = [source for source in sources if rate_provider.is_remote(source)]
+    if not remote:
+        return table
+    fetched = remote_tables.setdefault((tuple(remote), base), {'table': RateTable(), 'asked': set()})
+    wanted = np.unique(days[days != NO_DATE])
+    covered = np.unique(np.concatenate([column_days for column_days, _ in table.columns.values()])) if table.columns else wanted[:0]
+    missing = [day for day in wanted[~np.isin(wanted, covered)].tolist() if day not in fetched['asked']]
+    if missing:
+        iso_days = [str(day) for day in np.array(missing).astype('datetime64[D]')]
+        history = rate_provider.get_historical_rates(iso_days, remote, base=base)
+        fetched['table'] = fetched['table'].merge(RateTable.from_history(history))
+        fetched['asked'].update(missing)
+    return table.merge(fetched['table'])
+
+# Function to fingerprint the historical rates a conversion uses: the base currency, the sources, the
+# version of every local file and the dates that could not be fetched during this run
+def history_fingerprint(base=None):
+    base = rate_provider.base_currency(base)
+    sources = rate_provider.historical_sources(base)
+    parts = [base]
+    for source in sources:
+        parts.append(source)
+        if not rate_provider.is_remote(source):
+            try:
+                stat = os.stat(source)
+                parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+            except OSError:
+                parts.append('missing')
+    remote = [source for source in sources if rate_provider.is_remote(source)]
+    parts.extend(sorted(rate_provider.failed_dates.get((','.join(remote), base), ())))
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+# Function to look up the historical rate of every foreign-currency row that has a date, NaN for the other rows.
+# Returns None when no row needs a historical rate.
+def historical_row_rates(currencies, days, base=None):
+    base = rate_provider.base_currency(base)
+    currencies = np.asarray(currencies, dtype=object)
+    dated = (currencies != base) & (days != NO_DATE)
+    if not dated.any():
+        return None
+    table = rate_table_for_days(days[dated], base)
+    rates = np.full(len(days), np.nan)
+    rates[dated] = table.lookup(currencies[dated], days[dated])
+    return rates
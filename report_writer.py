@@ -0,0 +1,297 @@
+import csv
+import json
+import math
+import os
+import sys
+from datetime import datetime
+
+import rate_provider
+
+REPORT_FORMATS_ENV = 'EXPENSE_SPLITTER_REPORT_FORMATS'
+REPORT_FORMATS = ('txt', 'csv', 'json', 'xlsx')
+
+# Rendered text is collected in memory and written out in chunks of about this many characters
+BUFFER_SIZE = 1 << 16
+
+# Buffered text stream that writes the same output to several targets (e.g. the report file and stdout)
+class TeeStream:
+
+    def __init__(self, *targets, buffer_size=BUFFER_SIZE):
+        self.targets = targets
+        self.buffer_size = buffer_size
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, text):
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            chunk = ''.join(self.pending)
+            for target in self.targets:
+                target.write(chunk)
+            self.pending = []
+            self.pending_size = 0
+        for target in self.targets:
+            target.flush()
+
+# Function to get the report formats to write, from the given list or EXPENSE_SPLITTER_REPORT_FORMATS
+def report_formats(formats=None):
+    if formats is None:
+        formats = os.environ.get(REPORT_FORMATS_ENV, 'txt')
+    if isinstance(formats, str):
+        formats = formats.split(',')
+    formats = [fmt.strip().lower() for fmt in formats if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in REPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown report format(s) {', '.join(unknown)}, expected some of {', '.join(REPORT_FORMATS)}")
+    return formats or ['txt']
+
+# Function to build the path of one report output next to the workbook or in output_dir
+def output_path(file_name, suffix, output_dir=None):
+    file_base = os.path.splitext(os.path.basename(file_name))[0]
+    path = f"{file_base}{suffix}"
+    if output_dir:
+        path = os.path.join(output_dir, path)
+    return path
+
+# Function to group the simplified debts by debtor in one pass, with each debtor's total
+def group_debts(simplified_debts):
+    debtor_to_creditors = {}
+    for debtor, creditor, amount in simplified_debts:
+        debtor_to_creditors.setdefault(debtor, []).append((creditor, amount))
+    return {debtor: (sum(amount for _, amount in creditors), creditors) for debtor, creditors in debtor_to_creditors.items()}
+
+# Function to describe a balance the way every report section does
+def balance_line(person, balance, currency):
+    if balance > 0:
+        return f"{person} is owed {balance:.2f} {currency}\n"
+    if balance < 0:
+        return f"{person} owes {abs(balance):.2f} {currency}\n"
+    return f"{person} is settled up\n"
+
+# Function to warn that amounts in some currencies were counted as if they were in the base currency
+def unconverted_warning(unconverted_currencies, currency):
+    return (f"Warning: no exchange rate for {', '.join(unconverted_currencies)}; "
+            f"those amounts are not converted and are counted as {currency}.")
+
+# Function to get a person's total from the ledger's totals, or by adding up their items when no totals are given
+def person_total(totals, person, values):
+    if totals is not None and person in totals:
+        return totals[person]
+    return sum(values)
+
+# Function to render the text report into a stream, writing each section or person as one chunk.
+# The paid and share totals come from the ledger when given, since the item lists may be cut short.
+def render_text(stream, file_base, net_balances, debts_by_debtor, person_payments, personal_item_costs, generated_on,
+                currency='DKK', paid_totals=None, share_totals=None, unconverted_currencies=None):
+    write = stream.write
+    write(f"Expense Report for {file_base}\n")
+    write(f"Generated on {generated_on.strftime('%Y-%m-%d %H:%M:%S')}\n")
+    if unconverted_currencies:
+        write(f"{unconverted_warning(unconverted_currencies, currency)}\n")
+    write("\n")
+
+    # Net balances section
+    write("===== NET BALANCES =====\n")
+    write(''.join([balance_line(person, balance, currency) for person, balance in sorted(net_balances.items())]))
+
+    # Who owes what to whom section
+    write("\n===== WHO OWES WHAT TO WHOM =====\n")
+    for debtor in sorted(debts_by_debtor):
+        total_debt, creditors = debts_by_debtor[debtor]
+        lines = [f"\n{debtor} owes a total of {total_debt:.2f} {currency}:\n"]
+        lines.extend([f"  → {amount:.2f} {currency} to {creditor}\n" for creditor, amount in creditors])
+        write(''.join(lines))
+
+    # Person summaries section
+    write("\n===== PERSON SUMMARIES =====\n")
+    person_payments = person_payments or {}
+    personal_item_costs = personal_item_costs or {}
+    for person in sorted(set(person_payments) | set(personal_item_costs)):
+        lines = [f"\n{person}'s Summary\n", "------------------------\n"]
+
+        # Payments made by the person
+        payments = person_payments.get(person)
+        if payments:
+            lines.append("Expenses Paid:\n")
+            lines.extend([f"- {desc}: {amount:.2f} {currency}\n" for desc, amount in payments])
+            lines.append(f"Total Paid: {person_total(paid_totals, person, (amount for _, amount in payments)):.2f} {currency}\n")
+        else:
+            lines.append("Expenses Paid: None\n")
+
+        # Shares/items the person owes
+        items = personal_item_costs.get(person)
+        if items:
+            lines.append("\nShares:\n")
+            lines.extend([f"- {desc}: {share:.2f} {currency} of {total:.2f} {currency}\n" for desc, share, total in items])
+            lines.append(f"Total Share: {person_total(share_totals, person, (share for _, share, _ in items)):.2f} {currency}\n")
+        else:
+            lines.append("\nShares: None\n")
+
+        if person in net_balances:
+            balance = net_balances[person]
+            lines.append(f"\nNet Balance: {balance:.2f} {currency}\n")
+            lines.append(balance_line(person, balance, currency))
+        lines.append("------------------------\n")
+        write(''.join(lines))
+
+# Function to make a description safe for CSV and JSON output
+def plain_description(desc):
+    if desc is None or (isinstance(desc, float) and math.isnan(desc)):
+        return None
+    return desc if isinstance(desc, str) else str(desc)
+
+# Function to total what everybody paid and owes, for the machine-readable outputs
+def person_totals(net_balances, person_payments, personal_item_costs, paid_totals=None, share_totals=None):
+    people = sorted(set(net_balances) | set(person_payments or ()) | set(personal_item_costs or ()))
+    rows = []
+    for person in people:
+        total_paid = person_total(paid_totals, person, (amount for _, amount in (person_payments or {}).get(person, ())))
+        total_share = person_total(share_totals, person, (share for _, share, _ in (personal_item_costs or {}).get(person, ())))
+        rows.append((person, round(float(total_paid), 2), round(float(total_share), 2), net_balances.get(person)))
+    return rows
+
+# Function to write the per-person totals and the transfers as two CSV files. The last balances column lists
+# the currencies whose amounts could not be converted, and is empty when everything was converted.
+def write_csv(file_name, totals, simplified_debts, output_dir=None, unconverted_currencies=None):
+    balances_file = output_path(file_name, '_balances.csv', output_dir)
+    unconverted = ' '.join(unconverted_currencies or ())
+    with open(balances_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['person', 'total_paid', 'total_share', 'net_balance', 'unconverted_currencies'])
+        writer.writerows(row + (unconverted,) for row in totals)
+
+    transfers_file = output_path(file_name, '_transfers.csv', output_dir)
+    with open(transfers_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['debtor', 'creditor', 'amount'])
+        writer.writerows((debtor, creditor, round(float(amount), 2)) for debtor, creditor, amount in simplified_debts)
+    return [balances_file, transfers_file]
+
+# Function to write the whole report, including every item, as JSON
+def write_json(file_name, totals, simplified_debts, person_payments, personal_item_costs, generated_on, output_dir=None,
+               currency='DKK', unconverted_currencies=None):
+    json_file = output_path(file_name, '_report.json', output_dir)
+    report = {
+        'file': os.path.splitext(os.path.basename(file_name))[0],
+        'generated_on': generated_on.isoformat(timespec='seconds'),
+        'currency': currency,
+        'unconverted_currencies': list(unconverted_currencies or ()),
+        'people': {
+            person: {
+                'total_paid': total_paid,
+                'total_share': total_share,
+                'net_balance': net_balance,
+                'paid': [{'description': plain_description(desc), 'amount': float(amount)}
+                         for desc, amount in (person_payments or {}).get(person, ())],
+                'shares': [{'description': plain_description(desc), 'share': float(share), 'total': float(total)}
+                           for desc, share, total in (personal_item_costs or {}).get(person, ())],
+            }
+            for person, total_paid, total_share, net_balance in totals
+        },
+        'transfers': [{'debtor': debtor, 'creditor': creditor, 'amount': round(float(amount), 2)}
+                      for debtor, creditor, amount in simplified_debts],
+    }
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    return [json_file]
+
+# Function to write a summary workbook with one sheet of balances and one of transfers, and a sheet with the
+# warning when some currencies could not be converted
+def write_xlsx(file_name, totals, simplified_debts, output_dir=None, currency='DKK', unconverted_currencies=None):
+    from openpyxl import Workbook
+
+    xlsx_file = output_path(file_name, '_summary.xlsx', output_dir)
+    book = Workbook(write_only=True)
+    summary_sheet = book.create_sheet('Summary')
+    summary_sheet.append(['Person', f'Total paid ({currency})', f'Total share ({currency})', f'Net balance ({currency})'])
+    for row in totals:
+        summary_sheet.append(list(row))
+    transfers_sheet = book.create_sheet('Transfers')
+    transfers_sheet.append(['Debtor', 'Creditor', f'Amount ({currency})'])
+    for debtor, creditor, amount in simplified_debts:
+        transfers_sheet.append([debtor, creditor, round(float(amount), 2)])
+    if unconverted_currencies:
+        warnings_sheet = book.create_sheet('Warnings')
+        warnings_sheet.append([unconverted_warning(unconverted_currencies, currency)])
+    book.save(xlsx_file)
+    return [xlsx_file]
+
+# Function to write the report in every requested format, optionally echoing the text report to stdout.
+# Returns the path of the text report (or of the first output when no text report is written) and all outputs.
+def write_reports(file_name, net_balances, simplified_debts, person_payments, personal_item_costs,
+                  output_dir=None, formats=None, echo=False, currency=None, paid_totals=None, share_totals=None,
+                  unconverted_currencies=None):
+    formats = report_formats(formats)
+    currency = rate_provider.base_currency(currency)
+    generated_on = datetime.now()
+    outputs = []
+
+    if 'txt' in formats:
+        report_file = output_path(file_name, '_report.txt', output_dir)
+        file_base = os.path.splitext(os.path.basename(file_name))[0]
+        with open(report_file, 'w', encoding='utf-8') as f:
+            stream = TeeStream(f, sys.stdout) if echo else TeeStream(f)
+            render_text(stream, file_base, net_balances, group_debts(simplified_debts),
+                        person_payments, personal_item_costs, generated_on, currency, paid_totals, share_totals,
+                        unconverted_currencies)
+            stream.flush()
+        outputs.append(report_file)
+
+    if any(fmt in formats for fmt in ('csv', 'json', 'xlsx')):
+        totals = person_totals(net_balances, person_payments, personal_item_costs, paid_totals, share_totals)
+        if 'csv' in formats:
+            outputs.extend(write_csv(file_name, totals, simplified_debts, output_dir, unconverted_currencies))
+        if 'json' in formats:
+            outputs.extend(write_json(file_name, totals, simplified_debts, person_payments, personal_item_costs,
+                                      generated_on, output_dir, currency, unconverted_currencies))
+        if 'xlsx' in formats:
+            outputs.extend(write_xlsx(file_name, totals, simplified_debts, output_dir, currency, unconverted_currencies))
+
+    return outputs[0], outputs
+
+# Function to write the cross-group view of a multi-sheet workbook: every group's status, everybody's balance
+# per group and in total, and the transfers that settle the combined balances
+def write_group_summary(file_name, results, by_person, combined, simplified_debts, elapsed, output_dir=None, currency=None):
+    currency = rate_provider.base_currency(currency)
+    groups = [result['group'] for result in results]
+    summary_file = output_path(file_name, '_groups.txt', output_dir or os.path.dirname(os.path.abspath(file_name)))
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        f.write(f"Group Consolidation Summary for {os.path.splitext(os.path.basename(file_name))[0]}\n")
+        f.write(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Groups: {len(results)}, total time {elapsed:.2f} s\n\n")
+
+        f.write("===== GROUPS =====\n")
+        for result in results:
+            f.write(f"{result['group']}: {result['status']}")
+            if 'rows' in result:
+                f.write(f", {result['rows']} rows")
+            if result['status'] == 'ok':
+                f.write(f", {result['transfers']} transfers, report {result['report']}")
+            if result['status'] == 'error':
+                f.write(f", {result['error']}")
+            f.write("\n")
+
+        f.write(f"\n===== BALANCES PER GROUP ({currency}) =====\n")
+        width = max([len(str(person)) for person in combined] + [6])
+        f.write(f"{'Person':<{width}}" + ''.join(f"  {group:>12}" for group in groups) + f"  {'Total':>12}\n")
+        for person in sorted(combined, key=str):
+            cells = ''.join(f"  {by_person[person].get(group, 0):>12.2f}" for group in groups)
+            f.write(f"{person:<{width}}{cells}  {combined[person]:>12.2f}\n")
+
+        f.write("\n===== COMBINED NET BALANCES =====\n")
+        for person, balance in sorted(combined.items()):
+            f.write(balance_line(person, balance, currency))
+
+        f.write("\n===== WHO OWES WHAT TO WHOM OVER ALL GROUPS =====\n")
+        debts_by_debtor = group_debts(simplified_debts)
+        for debtor in sorted(debts_by_debtor):
+            total, creditors = debts_by_debtor[debtor]
+            f.write(f"\n{debtor} owes a total of {total:.2f} {currency}:\n")
+            for creditor, amount in creditors:
+                f.write(f"  → {amount:.2f} {currency} to {creditor}\n")
+    return summary_file
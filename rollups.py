@@ -0,0 +1,199 @@
+import argparse
+
+import ledger
+import money
+import rate_provider
+
+# Rollups by period and category. Every payment and applied share of a ledger becomes an event
+# (person, category, day, paid, share). The events are sorted by person and day, and by category, person and
+# day, with running totals next to them, so the totals of any date range are two binary searches and a
+# subtraction per person instead of filtering the ledger and running the pipeline again.
+
+# Category of the rows that have none
+UNCATEGORIZED = 'Uncategorized'
+
+# Function to turn a date (text, date or datetime) into a day number
+def day_number(value):
+    import rate_table
+
+    day = rate_table.days_from_values([value])[0]
+    if day == rate_table.NO_DATE:
+        raise ValueError(f"Not a date: {value!r}")
+    return int(day)
+
+# Function to get the first and last day of a period such as '2024', '2024-03' or '2024-03-15'
+def period_bounds(period):
+    import pandas as pd
+
+    period = pd.Period(str(period))
+    return period.start_time.date(), period.end_time.date()
+
+# Events sorted by group and day, with running totals; a group is a person, or a (category, person) pair
+class PrefixIndex:
+
+    def __init__(self, groups, day_positions, paid, shares, paid_flags, share_flags, span):
+        import numpy as np
+
+        keys = groups * span + day_positions
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.span = span
+        # One leading zero, so the total of events [lo, hi) is prefix[hi] - prefix[lo]
+        self.paid = np.concatenate([[0], np.cumsum(paid[order])])
+        self.shares = np.concatenate([[0], np.cumsum(shares[order])])
+        self.paid_counts = np.concatenate([[0], np.cumsum(paid_flags[order])])
+        self.share_counts = np.concatenate([[0], np.cumsum(share_flags[order])])
+
+    # Totals and event counts of each group between two day positions (both included)
+    def totals(self, groups, first, last):
+        import numpy as np
+
+        lo = np.searchsorted(self.keys, groups * self.span + first, side='left')
+        hi = np.searchsorted(self.keys, groups * self.span + last, side='right')
+        return (self.paid[hi] - self.paid[lo], self.paid_counts[hi] - self.paid_counts[lo],
+                self.shares[hi] - self.shares[lo], self.share_counts[hi] - self.share_counts[lo])
+
+# Prefix aggregates of one ledger, built once; every query is answered from them
+class Rollups:
+
+    def __init__(self, expenses):
+        import numpy as np
+        import pandas as pd
+        import rate_table
+
+        df = expenses.df
+        encoded = expenses.encoded
+        entries = expenses.share_entries
+        self.exact = expenses.exact
+        self.participants = encoded['participants']
+        self.people = np.arange(len(self.participants), dtype=np.int64)
+
+        # Day positions: 0 for rows without a date, 1 for the first day in the ledger, and so on
+        days = rate_table.days_from_series(df['Date']) if 'Date' in df.columns else np.full(len(df), rate_table.NO_DATE)
+        dated = days != rate_table.NO_DATE
+        self.first_day = int(days[dated].min()) if dated.any() else 0
+        day_positions = np.where(dated, days - self.first_day + 1, 0)
+        span = int(day_positions.max()) + 2
+
+        if 'Category' in df.columns:
+            labels = df['Category'].astype(object).where(df['Category'].notna(), '').astype(str).str.strip()
+            labels = labels.mask(labels == '', UNCATEGORIZED)
+        else:
+            labels = pd.Series(UNCATEGORIZED, index=df.index)
+        category_codes, categories = pd.factorize(labels)
+        self.categories = {category: code for code, category in enumerate(categories)}
+
+        # One event per payment and one per applied share
+        known = encoded['payer_ids'] >= 0
+        amounts = money.to_minor_units(encoded['amounts']) if self.exact else encoded['amounts']
+        applied = entries['applied']
+        rows = np.concatenate([np.flatnonzero(known), entries['rows'][applied]])
+        people = np.concatenate([encoded['payer_ids'][known], entries['people'][applied]]).astype(np.int64)
+        n_paid = int(known.sum())
+        paid = np.concatenate([amounts[known], np.zeros(int(applied.sum()), dtype=amounts.dtype)])
+        shares = np.concatenate([np.zeros(n_paid, dtype=entries['shares'].dtype), entries['shares'][applied]])
+        paid_flags = np.arange(len(rows)) < n_paid
+
+        self.by_person = PrefixIndex(people, day_positions[rows], paid, shares, paid_flags, ~paid_flags, span)
+        category_people = category_codes[rows].astype(np.int64) * len(self.participants) + people
+        self.by_category = PrefixIndex(category_people, day_positions[rows], paid, shares, paid_flags, ~paid_flags, span)
+        self.span = span
+
+    # The first and last day positions to include for optional start and end dates.
+    # Rows without a date are only included when no dates are given.
+    def day_range(self, start=None, end=None):
+        if start is None and end is None:
+            return 0, self.span - 1
+        first = max(day_number(start) - self.first_day + 1, 1) if start is not None else 1
+        last = min(day_number(end) - self.first_day + 1, self.span - 1) if end is not None else self.span - 1
+        return first, last
+
+    # Paid and share totals per person for a date range and/or categories, as ({person: paid}, {person: share})
+    # like balance_engine returns them. category may be one category or a list of them.
+    def totals(self, start=None, end=None, category=None):
+        import numpy as np
+
+        first, last = self.day_range(start, end)
+        size = len(self.participants)
+        dtype = np.int64 if self.exact else float
+        paid, paid_counts = np.zeros(size, dtype=dtype), np.zeros(size, dtype=np.int64)
+        shares, share_counts = np.zeros(size, dtype=dtype), np.zeros(size, dtype=np.int64)
+        if first <= last:
+            if category is None:
+                parts = [self.by_person.totals(self.people, first, last)]
+            else:
+                codes = [self.categories[name] for name in ([category] if isinstance(category, str) else category) if name in self.categories]
+                parts = [self.by_category.totals(code * size + self.people, first, last) for code in codes]
+            for part_paid, part_paid_counts, part_shares, part_share_counts in parts:
+                paid += part_paid
+                paid_counts += part_paid_counts
+                shares += part_shares
+                share_counts += part_share_counts
+
+        if self.exact:
+            paid, shares = money.from_minor_units(paid), money.from_minor_units(shares)
+        individual_expenses = {person: round(float(amount), 2) for person, amount, count in zip(self.participants, paid, paid_counts) if count > 0}
+        total_shares = {person: float(share) for person, share, count in zip(self.participants, shares, share_counts) if count > 0}
+        return individual_expenses, total_shares
+
+    # A Ledger of just the expenses in a date range and/or categories, for its balances and settlement
+    def view(self, start=None, end=None, category=None):
+        individual_expenses, total_shares = self.totals(start, end, category)
+        return ledger.Ledger.from_totals(individual_expenses, total_shares)
+
+    # The months with dated expenses, as 'YYYY-MM'
+    def months(self):
+        import numpy as np
+
+        days = np.unique(self.by_person.keys % self.span)
+        days = days[days > 0] + self.first_day - 1
+        return sorted({str(day)[:7] for day in days.astype('datetime64[D]')})
+
+# Function to describe a view for the printed output
+def view_title(start=None, end=None, category=None):
+    parts = []
+    if start is not None or end is not None:
+        parts.append(f"{start or '...'} to {end or '...'}")
+    if category:
+        parts.append(', '.join([category] if isinstance(category, str) else category))
+    return ' / '.join(parts) or 'All expenses'
+
+# Main function to execute the script
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Balances of a workbook for one period or category, or per month or category.")
+    parser.add_argument('file')
+    parser.add_argument('--from', dest='start', default=None, help="First day to include (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', default=None, help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument('--period', default=None, help="A year, month or day instead of --from/--to, e.g. 2024-03")
+    parser.add_argument('--category', action='append', default=None, help="Only this category (can be repeated)")
+    parser.add_argument('--by', choices=['month', 'category'], default=None, help="Print the balances of every month or category")
+    parser.add_argument('--exact-money', action='store_true', default=money.exact_money_enabled(),
+                        help="Compute in integer øre so every expense splits exactly")
+    args = parser.parse_args(argv)
+
+    expenses = ledger.Ledger.load(args.file, exact=args.exact_money)
+    if expenses.empty:
+        print("No valid data found in the file after preprocessing.")
+        return 1
+    rollups = expenses.rollups
+    start, end = period_bounds(args.period) if args.period else (args.start, args.end)
+    currency = rate_provider.base_currency()
+
+    if args.by == 'month':
+        views = [period_bounds(month) + (args.category,) for month in rollups.months()]
+    elif args.by == 'category':
+        views = [(start, end, category) for category in sorted(rollups.categories)]
+    else:
+        views = [(start, end, args.category)]
+
+    for view_start, view_end, view_category in views:
+        view = rollups.view(view_start, view_end, view_category)
+        print(f"\n===== {view_title(view_start, view_end, view_category)} =====")
+        for person, balance in sorted(view.net_balances.items()):
+            print(f"{person}: {balance:.2f} {currency}")
+        for debtor, creditor, amount in view.settlement():
+            print(f"  {debtor} owes {creditor} {amount:.2f} {currency}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+import heapq
+
+# Largest number of open balances the exact solver handles; its table has 2**n entries
+EXACT_SOLVER_LIMIT = 20
+
+STRATEGIES = ('auto', 'greedy', 'exact')
+
+# Function to convert balances in DKK to integer minor units (øre)
+def to_minor_units(net_balances):
+    return {person: int(round(balance * 100)) for person, balance in net_balances.items()}
+
+# Function to convert transfers in minor units back to DKK amounts
+def to_major_units(transfers):
+    return [(debtor, creditor, amount / 100) for debtor, creditor, amount in transfers]
+
+# Function to settle balances by repeatedly matching the largest debtor with the largest creditor, O(n log n)
+def settle_greedy(balances):
+    transfers = []
+    # Heaps keyed on the negated open amount so the largest is popped first; the order index breaks ties
+    debtors = [(amount, i, person) for i, (person, amount) in enumerate(balances.items()) if amount < 0]
+    creditors = [(-amount, i, person) for i, (person, amount) in enumerate(balances.items()) if amount > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+
+    while debtors and creditors:
+        debt, debtor_order, debtor = heapq.heappop(debtors)
+        credit, creditor_order, creditor = heapq.heappop(creditors)
+        amount = min(-debt, -credit)
+        transfers.append((debtor, creditor, amount))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor_order, debtor))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor_order, creditor))
+
+    return transfers
+
+# Function to split balances into the largest possible number of zero-sum groups with bitmask DP
+def zero_sum_groups(amounts):
+    import numpy as np  # Only the exact solver needs numpy
+
+    n = len(amounts)
+    size = 1 << n
+    masks = np.arange(size, dtype=np.int64)
+
+    # Sum of the balances in every subset, built one bit at a time
+    subset_sums = np.zeros(size, dtype=np.int64)
+    for i, amount in enumerate(amounts):
+        bit = 1 << i
+        subset_sums[bit:2 * bit] = subset_sums[:bit] + amount
+    is_zero = (subset_sums == 0).astype(np.int16)
+
+    # best[mask] is the number of zero-sum groups mask can be partitioned into.
+    # Masks only depend on masks with one bit fewer, so each popcount layer is computed at once.
+    popcount = np.zeros(size, dtype=np.int8)
+    for i in range(n):
+        popcount += ((masks >> i) & 1).astype(np.int8)
+    best = np.zeros(size, dtype=np.int16)
+    for layer in range(1, n + 1):
+        layer_masks = masks[popcount == layer]
+        layer_best = np.zeros(len(layer_masks), dtype=np.int16)
+        for i in range(n):
+            bit = 1 << i
+            has_bit = (layer_masks & bit) != 0
+            layer_best = np.where(has_bit, np.maximum(layer_best, best[layer_masks ^ bit]), layer_best)
+        best[layer_masks] = layer_best + is_zero[layer_masks]
+
+    # Walk back from the full set, cutting a group each time the remaining subset sums to zero.
+    # If the balances do not sum to zero, the first group holds the unsettleable difference.
+    groups = []
+    current_group = []
+    mask = size - 1
+    while mask:
+        for i in range(n):
+            bit = 1 << i
+            if mask & bit and best[mask ^ bit] + is_zero[mask] == best[mask]:
+                break
+        current_group.append(i)
+        mask ^= bit
+        if is_zero[mask] and mask:
+            groups.append(current_group)
+            current_group = []
+    groups.append(current_group)
+    return groups
+
+# Function to settle balances with the minimum possible number of transfers
+def settle_exact(balances):
+    open_balances = {person: amount for person, amount in balances.items() if amount != 0}
+
+    # Debtors and creditors with exactly opposite balances always settle with one transfer
+    transfers = []
+    creditors_by_amount = {}
+    for person, amount in open_balances.items():
+        if amount > 0:
+            creditors_by_amount.setdefault(amount, []).append(person)
+    matched = set()
+    for person, amount in open_balances.items():
+        if amount < 0 and creditors_by_amount.get(-amount):
+            creditor = creditors_by_amount[-amount].pop(0)
+            transfers.append((person, creditor, -amount))
+            matched.update((person, creditor))
+    remaining = {person: amount for person, amount in open_balances.items() if person not in matched}
+
+    if len(remaining) > EXACT_SOLVER_LIMIT:
+        return transfers + settle_greedy(remaining)
+
+    people = list(remaining)
+    for group in zero_sum_groups([remaining[person] for person in people]):
+        transfers.extend(settle_greedy({people[i]: remaining[people[i]] for i in group}))
+    return transfers
+
+# Function to simplify debts in minor units with the selected strategy
+def settle(balances, strategy='auto'):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown settlement strategy '{strategy}', expected one of {', '.join(STRATEGIES)}")
+    # Balances that do not sum to zero leave the difference unsettled, like the greedy loop always did
+    open_balances = {person: amount for person, amount in balances.items() if amount != 0}
+    if strategy == 'auto':
+        strategy = 'exact' if len(open_balances) <= EXACT_SOLVER_LIMIT else 'greedy'
+    if strategy == 'exact':
+        return settle_exact(open_balances)
+    return settle_greedy(open_balances)
+
+# Function to simplify debts between individuals given net balances in DKK
+def simplify_debts(net_balances, strategy='auto'):
+    return to_major_units(settle(to_minor_units(net_balances), strategy))
@@ -0,0 +1,129 @@
+import re
+
+# Names in 'Shared with' may be separated by commas or semicolons (or line breaks), with or without spaces
+SEPARATOR = re.compile(r'\s*[,;\n]\s*')
+
+SHARE_SUFFIX = "'s share"
+
+# Explicit shares may exceed the amount by this much before it counts as an error (rounding to øre)
+TOLERANCE = 0.005
+
+# Most issues of each kind listed in the printed report
+MAX_LISTED = 10
+
+# pandas and numpy are imported inside the functions that need them, so the small-ledger path can use split_names
+
+# Function to split one 'Shared with' value into names, dropping empty names
+def split_names(text):
+    if not isinstance(text, str):
+        return []
+    return [name for name in SEPARATOR.split(text.strip()) if name]
+
+# Function to split a whole 'Shared with' column into lists of names.
+# The column is factorized first, so each distinct value is split only once; templates pre-fill the same
+# value on every row, so a large sheet usually has only a handful of distinct values. Rows with the same
+# value share one (read-only) list.
+def split_column(column):
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    names = np.empty(len(uniques) + 1, dtype=object)
+    for i, value in enumerate(uniques):
+        names[i] = split_names(value)
+    names[-1] = []  # Code -1: missing values
+    return pd.Series(names[codes], index=column.index, name=column.name, dtype=object)
+
+# Function to turn the 'Shared with' lists into long format: the row position and the name of every entry
+def explode_shared_with(df):
+    import itertools
+    import numpy as np
+
+    lists = [names if isinstance(names, list) else [] for names in df['Shared with']]
+    lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+    rows = np.repeat(np.arange(len(lists), dtype=np.int64), lengths)
+    names = np.fromiter(itertools.chain.from_iterable(lists), dtype=object, count=int(lengths.sum()))
+    return rows, names
+
+# Function to check the 'Shared with' column of a preprocessed ledger. Returns a report with
+# - unknown: (row, name) for names that are neither a payer nor have a share column (only checked when the
+#   ledger has share columns, or when the participants are given)
+# - duplicates: (row, name) for names listed more than once in the same row
+# - over_allocated: (row, explicit total, amount) for rows whose explicit shares add up to more than the amount
+# Rows are numbered as in the workbook (the header is row 1).
+def validate(df, participants=None):
+    import numpy as np
+    import pandas as pd
+
+    rows, names = explode_shared_with(df)
+    labels = df.index.to_numpy()
+    share_columns = [column for column in df.columns if isinstance(column, str) and column.endswith(SHARE_SUFFIX)]
+
+    # Intern the names once; everything after this works on integer (row, name) keys
+    codes, uniques = pd.factorize(names)
+    n_names = max(len(uniques), 1)
+    keys = rows * n_names + codes
+
+    # Map the distinct names to participant IDs with a single join; names without an ID are unknown
+    check_names = participants is not None or bool(share_columns)
+    if participants is None:
+        share_names = [column[:-len(SHARE_SUFFIX)] for column in share_columns]
+        participants = pd.unique(np.concatenate([df['Paying person'].dropna().astype(str).to_numpy(dtype=object),
+                                                 np.array(share_names, dtype=object)]))
+    participant_ids = pd.Index(participants).get_indexer(uniques)
+    unknown = np.flatnonzero(participant_ids[codes] < 0) if check_names else np.zeros(0, dtype=np.int64)
+
+    # A name listed twice in a row gives two entries with the same key
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    repeated = np.zeros(len(keys), dtype=bool)
+    repeated[order[1:]] = sorted_keys[1:] == sorted_keys[:-1]
+    duplicates = np.flatnonzero(repeated)
+
+    # Only the shares of people listed in 'Shared with' are applied, so only those count towards the total
+    unique_keys = sorted_keys[np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])] if len(keys) else sorted_keys
+    explicit_total = np.zeros(len(df))
+    code_of = {name: code for code, name in enumerate(uniques)}
+    for column in share_columns:
+        code = code_of.get(column[:-len(SHARE_SUFFIX)])
+        if code is None:
+            continue  # Nobody lists this person, so the column never applies
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+        filled = np.flatnonzero(~np.isnan(values))
+        wanted = filled * n_names + code
+        positions = np.minimum(np.searchsorted(unique_keys, wanted), max(len(unique_keys) - 1, 0))
+        applied = filled[unique_keys[positions] == wanted] if len(unique_keys) else filled[:0]
+        explicit_total[applied] += values[applied]
+    amounts = df['Amount'].to_numpy(dtype=float)
+    over = np.flatnonzero(explicit_total > amounts + TOLERANCE)
+
+    return {
+        'checked_names': check_names,
+        'unknown': [(int(labels[rows[i]]) + 2, names[i]) for i in unknown],
+        'duplicates': [(int(labels[rows[i]]) + 2, names[i]) for i in duplicates],
+        'over_allocated': [(int(labels[row]) + 2, round(float(explicit_total[row]), 2), round(float(amounts[row]), 2)) for row in over],
+    }
+
+# Function to check whether a validation report found anything
+def has_issues(report):
+    return bool(report['unknown'] or report['duplicates'] or report['over_allocated'])
+
+# Function to format a validation report as text lines, listing at most max_listed issues of each kind
+def format_report(report, max_listed=MAX_LISTED):
+    lines = []
+
+    def section(title, items, describe):
+        if not items:
+            return
+        lines.append(f"{title}: {len(items)}")
+        lines.extend(f"  {describe(item)}" for item in items[:max_listed])
+        if len(items) > max_listed:
+            lines.append(f"  ... and {len(items) - max_listed} more")
+
+    section("Unknown names in 'Shared with'", report['unknown'], lambda item: f"row {item[0]}: {item[1]}")
+    section("Names listed twice in 'Shared with'", report['duplicates'], lambda item: f"row {item[0]}: {item[1]}")
+    section("Explicit shares exceeding the amount", report['over_allocated'],
+            lambda item: f"row {item[0]}: shares add up to {item[1]:.2f} of {item[2]:.2f}")
+    if not report['checked_names']:
+        lines.append("Names were not checked against the participants: the ledger has no share columns.")
+    return lines
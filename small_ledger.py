@@ -0,0 +1,198 @@
+import itertools
+import math
+
+import rate_provider
+import shared_with
+
+# Ledgers with at most this many rows are computed in plain Python, without importing pandas or numpy
+SMALL_LEDGER_ROWS = 2000
+
+SHARE_SUFFIX = "'s share"
+
+# Function to check whether a workbook is small enough for the pure-Python path
+def is_small_ledger(file_name, limit=SMALL_LEDGER_ROWS):
+    from openpyxl import load_workbook
+
+    book = load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        sheet = book.worksheets[0]
+        max_row = sheet.max_row
+        if max_row is None:
+            # Sheets written in write-only mode record no dimensions; count rows, stopping just past the limit
+            max_row = sum(1 for _ in itertools.islice(sheet.iter_rows(values_only=True), limit + 2))
+    finally:
+        book.close()
+    return max_row - 1 <= limit
+
+# Function to coerce a cell to a float the way pd.to_numeric(errors='coerce') does, NaN when it is not a number
+def to_number(value):
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+# Function to round to whole øre the same way numpy does (half to even)
+def round_to_ore(value):
+    return round(value * 100) / 100
+
+# Function to safely split the 'Shared with' values, accepting ',' or ';' with or without spaces
+def split_shared_with(x):
+    return shared_with.split_names(x)
+
+# Function to read and clean the expense rows of a workbook, like load_and_preprocess_data does
+def read_expense_rows(file_name, base='DKK'):
+    from openpyxl import load_workbook
+
+    book = load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        rows = book.worksheets[0].iter_rows(values_only=True)  # Same sheet pd.read_excel reads by default
+        header = next(rows, None)
+        if header is None:
+            return [], []
+        header = [str(name).strip() if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        columns = {name: i for i, name in enumerate(header)}
+        share_columns = [name for name in header if name.endswith(SHARE_SUFFIX)]
+
+        def cell(row, name):
+            i = columns.get(name)
+            return row[i] if i is not None and i < len(row) else None
+
+        expenses = []
+        for row_number, row in enumerate(rows, start=2):
+            # Drop rows without a paying person or where it's an empty string
+            payer = cell(row, 'Paying person')
+            if payer is None or (isinstance(payer, float) and math.isnan(payer)):
+                continue
+            payer = payer.strip() if isinstance(payer, str) else str(payer)
+            if payer == '':
+                continue
+
+            amount = to_number(cell(row, 'Amount'))
+            description = cell(row, 'Description') if 'Description' in columns else 'Unnamed item'
+            currency = cell(row, 'Currency')
+            expenses.append({
+                'row': row_number,
+                'date': cell(row, 'Date'),
+                'payer': payer,
+                'description': math.nan if description is None else description,
+                'amount': 0.0 if math.isnan(amount) else amount,
+                'currency': base if currency is None else currency,
+                'shared_with': split_shared_with(cell(row, 'Shared with')),
+                'shares': {name[:-len(SHARE_SUFFIX)]: to_number(cell(row, name)) for name in share_columns},
+            })
+        return expenses, share_columns
+    finally:
+        book.close()
+
+# Function to look up the rate on its own date of every dated foreign-currency row, None for the other rows
+def dated_rates(expenses, base):
+    if not any(expense['date'] is not None and expense['currency'] != base for expense in expenses):
+        return [None] * len(expenses)
+    import rate_table
+
+    rates = rate_table.historical_row_rates([expense['currency'] for expense in expenses],
+                                            rate_table.days_from_values([expense['date'] for expense in expenses]), base)
+    if rates is None:
+        return [None] * len(expenses)
+    return [None if math.isnan(rate) else float(rate) for rate in rates]
+
+# Function to convert the amounts and explicit shares of every foreign-currency row to the base currency.
+# Rows with a date are converted at the rate of that day when it is known, the other rows at the latest rates.
+def convert_rows(expenses, exchange_rates, base='DKK'):
+    missing = []
+    for expense, dated_rate in zip(expenses, dated_rates(expenses, base)):
+        currency = expense['currency']
+        if currency == base:
+            continue
+        rate = dated_rate if dated_rate is not None else exchange_rates.get(currency)
+        if rate is None:
+            if currency not in missing:
+                missing.append(currency)
+                print(f"Exchange rate for {currency} not found.")
+            continue  # Keep the original amount when no rate is known
+        expense['amount'] = round_to_ore(expense['amount'] / rate)
+        expense['shares'] = {person: value if math.isnan(value) else round_to_ore(value / rate)
+                             for person, value in expense['shares'].items()}
+        expense['currency'] = base
+    return expenses
+
+# Function to compute the share of every 'Shared with' entry of one expense, as (person, share) pairs.
+# Same rules as balance_engine.compute_shares: explicit shares first, then an equal split, or the
+# remainder split between the people without an explicit share.
+def expense_shares(expense):
+    members = expense['shared_with']
+    amount = expense['amount']
+    explicit = [expense['shares'].get(person, math.nan) for person in members]
+    with_share = [value for value in explicit if not math.isnan(value)]
+    if not with_share:
+        return [(person, amount / len(members)) for person in members]
+
+    explicit_total = 0.0
+    for value in with_share:
+        explicit_total += value
+    without_shares = len(members) - len(with_share)
+    shares = []
+    for person, value in zip(members, explicit):
+        if not math.isnan(value):
+            shares.append((person, value))
+        elif explicit_total < amount:
+            shares.append((person, (amount - explicit_total) / max(without_shares, 1)))
+    return shares
+
+# Function to check the 'Shared with' names of a small ledger, producing the same report as shared_with.validate
+def validate_expenses(expenses):
+    share_names = {person for expense in expenses for person in expense['shares']}
+    known = share_names | {expense['payer'] for expense in expenses}
+    report = {'checked_names': bool(share_names), 'unknown': [], 'duplicates': [], 'over_allocated': []}
+    for expense in expenses:
+        seen = set()
+        for name in expense['shared_with']:
+            if share_names and name not in known:
+                report['unknown'].append((expense['row'], name))
+            if name in seen:
+                report['duplicates'].append((expense['row'], name))
+            seen.add(name)
+        explicit = [expense['shares'].get(name, math.nan) for name in seen]
+        explicit = [value for value in explicit if not math.isnan(value)]
+        if explicit and sum(explicit) > expense['amount'] + shared_with.TOLERANCE:
+            report['over_allocated'].append((expense['row'], round(sum(explicit), 2), round(expense['amount'], 2)))
+    return report
+
+# Function to calculate paid totals, share totals and the itemized breakdown of a small ledger
+def summarize(expenses):
+    paid = {}
+    shares = {}
+    person_payments = {}
+    personal_item_costs = {}
+    for expense in expenses:
+        payer = expense['payer']
+        paid[payer] = paid.get(payer, 0.0) + expense['amount']
+        person_payments.setdefault(payer, []).append((expense['description'], expense['amount']))
+        for person, share in expense_shares(expense):
+            shares[person] = shares.get(person, 0.0) + share
+            personal_item_costs.setdefault(person, []).append((expense['description'], share, expense['amount']))
+
+    individual_expenses = {person: round(amount, 2) for person, amount in paid.items()}
+    return individual_expenses, shares, person_payments, personal_item_costs
+
+# Function to load the expense rows of a small ledger, converted to the base currency when rates are available
+def load_expenses(file_name, exchange_rates, base=None):
+    base = rate_provider.base_currency(base)
+    expenses, _ = read_expense_rows(file_name, base)
+    if not exchange_rates:
+        print(f"No exchange rates available: using only {base} values, other currencies are not converted.")
+        return expenses
+    return convert_rows(expenses, exchange_rates, base)
+
+# Function to list the currencies left unconverted for lack of a rate
+def unconverted_currencies(expenses, base=None):
+    base = rate_provider.base_currency(base)
+    return sorted({str(expense['currency']) for expense in expenses if expense['currency'] != base})
+
+# Function to load a small ledger and calculate everything the reports need, without pandas
+def small_ledger_balances(file_name, exchange_rates):
+    expenses = load_expenses(file_name, exchange_rates)
+    individual_expenses, total_shares, person_payments, personal_item_costs = summarize(expenses)
+    return individual_expenses, total_shares, person_payments, personal_item_costs, len(expenses)
@@ -0,0 +1,85 @@
+import pandas as pd
+from openpyxl import load_workbook
+
+import balance_engine
+import ledger_cache
+import rate_provider
+import shared_with
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Function to validate and clean one chunk of raw expense rows, like load_and_preprocess_data does.
+# start is the position of the chunk's first row among the data rows, so the index matches pd.read_excel's.
+def clean_chunk(rows, header, start=0):
+    df = pd.DataFrame(rows, columns=header, index=pd.RangeIndex(start, start + len(rows)))
+
+    # Drop rows without a paying person or where it's an empty string
+    df = df.dropna(subset=['Paying person'])
+    payers = df['Paying person'].astype(str).str.strip()
+    df = df[payers != ''].copy()
+    df['Paying person'] = payers[payers != '']
+
+    df['Shared with'] = shared_with.split_column(df['Shared with'])
+    df['Currency'] = df['Currency'].fillna(rate_provider.base_currency())
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0).astype(float)
+    for column in rate_provider.share_columns(df):
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+# Function to stream validated expense rows from a workbook in chunks of at most chunk_size rows
+def iter_expense_chunks(file_name, chunk_size=DEFAULT_CHUNK_SIZE, exchange_rates=None):
+    # Read-only mode keeps only the current row in memory instead of the whole sheet
+    book = load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        sheet = book.worksheets[0]  # Same sheet pd.read_excel reads by default
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(name).strip() if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        buffer = []
+        start = 0
+        for row in rows:
+            buffer.append(row[:len(header)])
+            if len(buffer) >= chunk_size:
+                yield convert_chunk(clean_chunk(buffer, header, start), exchange_rates)
+                start += len(buffer)
+                buffer = []
+        if buffer:
+            yield convert_chunk(clean_chunk(buffer, header, start), exchange_rates)
+    finally:
+        book.close()
+
+# Function to convert a cleaned chunk to the base currency if exchange rates are available
+def convert_chunk(df, exchange_rates):
+    if exchange_rates is None or df.empty:
+        return df
+    return rate_provider.convert_columns(df, exchange_rates)
+
+# Function to fold a stream of chunks into running paid and share totals
+def accumulate_balances(chunks, exact=False):
+    individual_expenses = {}
+    total_shares = {}
+    row_count = 0
+    for chunk in chunks:
+        row_count += len(chunk)
+        for person, amount in balance_engine.calculate_paid_totals(chunk, exact=exact).items():
+            individual_expenses[person] = round(individual_expenses.get(person, 0) + amount, 2)
+        for person, share in balance_engine.calculate_share_totals(chunk, exact=exact).items():
+            # Exact shares are whole øre, so rounding only strips float noise from the running sum
+            total_shares[person] = total_shares.get(person, 0) + share
+            if exact:
+                total_shares[person] = round(total_shares[person], 2)
+    return individual_expenses, total_shares, row_count
+
+# Function to calculate paid and share totals for a workbook without loading it into memory
+def stream_balances(file_name, chunk_size=DEFAULT_CHUNK_SIZE, rate_source=None, use_cache=True, exact=False):
+    exchange_rates = rate_provider.get_exchange_rates(rate_source)
+    if exchange_rates is None:
+        print(f"No exchange rates available: using only {rate_provider.base_currency()} values, other currencies are not converted.")
+    if not use_cache:
+        return accumulate_balances(iter_expense_chunks(file_name, chunk_size, exchange_rates), exact)
+    # Repeat runs read the columnar cache chunk by chunk instead of parsing the workbook
+    chunks = ledger_cache.cached_chunks(file_name, exchange_rates, lambda: iter_expense_chunks(file_name, chunk_size, exchange_rates))
+    return accumulate_balances(chunks, exact)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+# The modules live at the repository root, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+import pytest
+
+import rate_provider
+import rate_table
+
+# Fixed rates in units per DKK, so no test reaches the network
+TEST_RATES = {'DKK': 1.0, 'EUR': 0.134, 'USD': 0.146}
+
+# Offline settings for one test: rates from a local file, and every cache in the test's own directory
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    rates_file = tmp_path / 'rates.json'
+    rates_file.write_text(json.dumps(TEST_RATES))
+    monkeypatch.setenv('EXPENSE_SPLITTER_RATES', str(rates_file))
+    monkeypatch.setenv('EXPENSE_SPLITTER_RATES_CACHE', str(tmp_path / 'rates_cache.json'))
+    monkeypatch.setenv('EXPENSE_SPLITTER_LEDGER_CACHE', str(tmp_path / 'ledgers'))
+    for name in ('EXPENSE_SPLITTER_HISTORICAL_RATES', 'EXPENSE_SPLITTER_BASE_CURRENCY', 'EXPENSE_SPLITTER_EXACT_MONEY',
+                 'EXPENSE_SPLITTER_MAX_ITEMS', 'EXPENSE_SPLITTER_SPILL_DIR', 'EXPENSE_SPLITTER_WORKERS'):
+        monkeypatch.delenv(name, raising=False)
+    # Nothing fetched or failed in an earlier test carries over, and no rate cache is written outside tmp_path
+    monkeypatch.setattr(rate_provider, 'DEFAULT_CACHE_DIR', str(tmp_path / 'rates'))
+    monkeypatch.setattr(rate_provider, 'failed_dates', {})
+    monkeypatch.setattr(rate_table, 'local_tables', {})
+    monkeypatch.setattr(rate_table, 'remote_tables', {})
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# Function to write a workbook with the given header and rows, returning its path
+def write_workbook(path, header, rows):
+    from openpyxl import Workbook
+
+    book = Workbook()
+    sheet = book.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(list(row))
+    book.save(path)
+    return str(path)
@@ -0,0 +1,96 @@
+import json
+import os
+from datetime import datetime
+
+from conftest import write_workbook
+
+import ledger
+import ledger_cache
+import rate_provider
+import rate_table
+import streaming
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with', 'Date']
+
+# Function to build rows in euros spread over four dates
+def dated_rows(count):
+    return [['Anna' if i % 2 else 'Bo', f"item {i}", 100, 'EUR', 'Anna, Bo', datetime(2024, 3, 1 + i % 4)] for i in range(count)]
+
+# Function to record every request made to a rate service, failing each of them
+def failing_requests(monkeypatch):
+    urls = []
+
+    def fetch(url, timeout=None, session=None):
+        urls.append(url)
+        raise RuntimeError("offline")
+
+    monkeypatch.setattr(rate_provider, 'fetch_rates_from_api', fetch)
+    return urls
+
+def test_local_rates_do_not_fetch_history(offline, monkeypatch):
+    urls = failing_requests(monkeypatch)
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, dated_rows(8))
+    expenses = ledger.Ledger.load(file_name, use_cache=False)
+    assert urls == []
+    assert list(expenses.df['Amount']) == [round(100 / 0.134, 2)] * 8
+
+def test_failed_dates_are_asked_for_once_per_run(offline, monkeypatch):
+    monkeypatch.setenv('EXPENSE_SPLITTER_HISTORICAL_RATES', 'https://rates.invalid/{date}')
+    urls = failing_requests(monkeypatch)
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, dated_rows(20))
+
+    streaming.stream_balances(file_name, chunk_size=5)
+    attempts = (rate_provider.DEFAULT_RETRIES + 1) * 4
+    assert len(urls) == attempts
+    # The streamed chunks were converted without their dates' rates, so they are not cached as if they had them
+    assert not os.path.isdir(offline / 'ledgers') or os.listdir(offline / 'ledgers') == []
+
+    expenses = ledger.Ledger.load(file_name)
+    assert len(urls) == attempts
+    assert list(expenses.df['Amount']) == [round(100 / 0.134, 2)] * 20
+
+def test_local_history_is_loaded_once_for_all_chunks(offline, monkeypatch):
+    history = offline / 'history.json'
+    history.write_text(json.dumps({'2024-03-01': {'EUR': 0.125}}))
+    monkeypatch.setenv('EXPENSE_SPLITTER_HISTORICAL_RATES', str(history))
+    loads = []
+    load_table_file = rate_table.load_table_file
+    monkeypatch.setattr(rate_table, 'load_table_file', lambda path: loads.append(path) or load_table_file(path))
+
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, dated_rows(20))
+    chunks = list(streaming.iter_expense_chunks(file_name, chunk_size=5, exchange_rates=rate_provider.get_exchange_rates()))
+    assert loads == [str(history)]
+    # Every date is on or after 2024-03-01, so every row uses that day's rate
+    assert {amount for chunk in chunks for amount in chunk['Amount']} == {800.0}
+
+def test_cache_key_includes_the_history_and_the_base_currency(offline, monkeypatch):
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, dated_rows(4))
+    rates = rate_provider.get_exchange_rates()
+    history = offline / 'history.json'
+    history.write_text(json.dumps({'2024-03-01': {'EUR': 0.125}}))
+    plain = ledger_cache.cache_entry_path(file_name, rates)
+
+    monkeypatch.setenv('EXPENSE_SPLITTER_HISTORICAL_RATES', str(history))
+    with_history = ledger_cache.cache_entry_path(file_name, rates)
+    history.write_text(json.dumps({'2024-03-01': {'EUR': 0.125}, '2024-03-02': {'EUR': 0.126}}))
+    with_more_history = ledger_cache.cache_entry_path(file_name, rates)
+
+    monkeypatch.setenv('EXPENSE_SPLITTER_BASE_CURRENCY', 'EUR')
+    in_euros = ledger_cache.cache_entry_path(file_name, rates)
+    assert len({plain, with_history, with_more_history, in_euros}) == 4
+
+def test_server_reload_asks_for_failed_dates_again(offline, monkeypatch):
+    import consolidation_server
+
+    monkeypatch.setenv('EXPENSE_SPLITTER_HISTORICAL_RATES', 'https://rates.invalid/{date}')
+    urls = failing_requests(monkeypatch)
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, dated_rows(4))
+    service = consolidation_server.LedgerService(file_name)
+    assert len(urls) == (rate_provider.DEFAULT_RETRIES + 1) * 4
+    assert service.snapshot['paid']['Bo'] == round(2 * 100 / 0.134, 2)
+
+    # The service is back online: the next reload gets the rates of every date
+    monkeypatch.setattr(rate_provider, 'fetch_rates_from_api', lambda url, timeout=None, session=None: {'EUR': 0.125})
+    snapshot = service.reload()
+    assert snapshot['paid']['Bo'] == 1600.0
+    assert rate_provider.failed_date_count() == 0
@@ -0,0 +1,80 @@
+import pytest
+
+from conftest import write_workbook
+
+import ledger
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+
+# Function to build rows of expenses shared between three to four people
+def sample_rows(count):
+    rows = []
+    for i in range(count):
+        payer = ['Anna', 'Bo', 'Carl', 'Dina'][i % 4]
+        shared = 'Anna, Bo, Carl, Dina' if i % 3 else 'Anna, Bo, Carl'
+        rows.append([payer, f"item {i}", 10 + i % 7 * 3.5, 'EUR' if i % 5 == 0 else None, shared])
+    return rows
+
+# Function to run an incremental update on a workbook and check it against a full recompute.
+# Returns the number of rows the update recomputed.
+def update_and_compare(directory, header, rows):
+    file_name = write_workbook(directory / 'expenses.xlsx', header, rows)
+    expenses = ledger.Ledger.load(file_name, use_cache=False)
+    processed_rows = expenses.update_incremental(str(directory / 'expenses_state.npz'))
+
+    expected = ledger.Ledger.load(file_name, use_cache=False)
+    assert expenses.paid_totals == pytest.approx(expected.paid_totals)
+    assert expenses.share_totals == pytest.approx(expected.share_totals)
+    assert expenses.net_balances == expected.net_balances
+    applied = expenses.applied_shares
+    assert list(applied['row']) == list(expected.applied_shares['row'])
+    assert list(applied['person']) == list(expected.applied_shares['person'])
+    assert list(applied['share']) == pytest.approx(list(expected.applied_shares['share']))
+    return processed_rows
+
+def test_first_run_computes_every_row(offline):
+    assert update_and_compare(offline, HEADER, sample_rows(40)) == 40
+
+def test_unchanged_workbook_recomputes_nothing(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    assert update_and_compare(offline, HEADER, rows) == 0
+
+def test_appended_rows_are_the_only_ones_recomputed(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    rows += [['Eva', 'late item', 80, None, 'Anna, Eva'], ['Bo', 'taxi', 12, 'USD', 'Bo, Eva']]
+    assert update_and_compare(offline, HEADER, rows) == 2
+
+def test_edited_row_is_replaced(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    rows[10] = ['Carl', 'item 10', 250, 'USD', 'Carl, Dina']
+    # The old and the new version of the row
+    assert update_and_compare(offline, HEADER, rows) == 2
+
+def test_removed_last_rows_are_taken_out(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    assert update_and_compare(offline, HEADER, rows[:37]) == 3
+
+def test_row_deleted_mid_sheet(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    # Every row below the deleted one moves up, so those rows and the last old row count as changed
+    del rows[34]
+    assert update_and_compare(offline, HEADER, rows) == 5 + 6
+
+def test_deleting_many_rows_falls_back_to_a_full_recompute(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    del rows[5]
+    assert update_and_compare(offline, HEADER, rows) == 39
+
+def test_new_share_column_falls_back_to_a_full_recompute(offline):
+    rows = sample_rows(40)
+    update_and_compare(offline, HEADER, rows)
+    header = HEADER + ["Anna's share"]
+    rows = [row + [None] for row in rows]
+    rows[3][5] = 20
+    assert update_and_compare(offline, header, rows) == 40
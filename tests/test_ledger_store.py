@@ -0,0 +1,71 @@
+import pytest
+
+from conftest import write_workbook
+
+import consolidate_report
+import instrumentation
+import ledger_store
+import rate_provider
+
+# Function to build rows with a few empty descriptions and foreign currencies
+def sample_rows(count, with_description=True):
+    rows = []
+    for i in range(count):
+        row = [['Anna', 'Bo', 'Carl'][i % 3], 20 + i % 5, 'EUR' if i % 4 == 0 else None, 'Anna, Bo, Carl' if i % 2 else 'Bo, Carl']
+        if with_description:
+            row.insert(1, None if i % 6 == 0 else f"item {i}")
+        rows.append(row)
+    return rows
+
+# Function to read a text report without the line that holds the time it was written
+def report_text(path):
+    return [line for line in path.read_text(encoding='utf-8').splitlines() if not line.startswith('Generated on')]
+
+@pytest.mark.parametrize('with_description', [True, False])
+@pytest.mark.parametrize('stages', ['small', 'pandas'])
+def test_store_report_matches_the_workbook_report(offline, with_description, stages):
+    header = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+    if not with_description:
+        header.remove('Description')
+    file_name = write_workbook(offline / 'expenses.xlsx', header, sample_rows(30, with_description))
+    store = str(offline / 'ledgers.sqlite3')
+    (offline / 'store').mkdir()
+    (offline / 'workbook').mkdir()
+
+    assert ledger_store.main(['--store', store, 'sync', file_name]) == 0
+    assert ledger_store.main(['--store', store, 'report', file_name, '-o', str(offline / 'store')]) == 0
+
+    # The stages consolidate_report runs for small ledgers and for the others
+    exchange_rates = rate_provider.get_exchange_rates()
+    trace = instrumentation.new_trace(file_name)
+    if stages == 'small':
+        expenses = consolidate_report.small_ledger_stages(file_name, exchange_rates, trace)
+    else:
+        expenses = consolidate_report.ledger_stages(file_name, exchange_rates, trace, incremental=False)
+    expenses.write_reports(output_dir=str(offline / 'workbook'))
+
+    store_report = report_text(offline / 'store' / 'expenses_report.txt')
+    assert store_report == report_text(offline / 'workbook' / 'expenses_report.txt')
+    assert any(line.startswith('- nan:') for line in store_report) == with_description
+    assert any(line.startswith('- Unnamed item:') for line in store_report) != with_description
+
+def test_store_report_marks_unconverted_currencies(offline):
+    # A rates source without USD, so the USD rows stay in dollars
+    (offline / 'rates.json').write_text('{"DKK": 1.0, "EUR": 0.134}')
+    header = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+    rows = sample_rows(12)
+    rows[3][3] = 'USD'
+    file_name = write_workbook(offline / 'expenses.xlsx', header, rows)
+    store = str(offline / 'ledgers.sqlite3')
+    (offline / 'store').mkdir()
+    (offline / 'workbook').mkdir()
+
+    assert ledger_store.main(['--store', store, 'sync', file_name]) == 0
+    assert ledger_store.main(['--store', store, 'report', file_name, '-o', str(offline / 'store')]) == 0
+    expenses = consolidate_report.ledger_stages(file_name, rate_provider.get_exchange_rates(),
+                                                instrumentation.new_trace(file_name), incremental=False)
+    expenses.write_reports(output_dir=str(offline / 'workbook'))
+
+    store_report = report_text(offline / 'store' / 'expenses_report.txt')
+    assert store_report == report_text(offline / 'workbook' / 'expenses_report.txt')
+    assert any(line.startswith('Warning: no exchange rate for USD') for line in store_report)
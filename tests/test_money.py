@@ -0,0 +1,90 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+import balance_engine
+import money
+
+def test_allocate_evenly_adds_up_and_gives_leftovers_in_order():
+    totals = np.array([100, 100, 7, 0, 5])
+    counts = np.array([3, 3, 7, 4, 2])
+    positions = np.array([0, 2, 6, 1, 1])
+    parts = money.allocate_evenly(totals, counts, positions)
+    # 100 øre over three people: the first gets the extra øre
+    assert parts.tolist() == [34, 33, 1, 0, 2]
+
+    for total, count in [(100, 3), (1001, 7), (5, 9), (123457, 13)]:
+        parts = money.allocate_evenly(np.full(count, total), np.full(count, count), np.arange(count))
+        assert parts.sum() == total
+        assert parts.max() - parts.min() <= 1
+        # The larger parts come first, so the same split always gives the same people the extra øre
+        assert parts.tolist() == sorted(parts.tolist(), reverse=True)
+        assert np.array_equal(parts, money.allocate_evenly(np.full(count, total), np.full(count, count), np.arange(count)))
+
+def test_minor_units_round_half_away_from_zero():
+    assert money.to_minor_units([0.125, -0.125, 10.005, 1e-9, 33.33]).tolist() == [13, -13, 1001, 0, 3333]
+    assert money.from_minor_units([3333, -5]).tolist() == [33.33, -0.05]
+
+# Function to build a preprocessed ledger from rows of (payer, amount, people, {person: explicit share})
+def ledger_frame(rows):
+    people = sorted({person for _, _, members, _ in rows for person in members})
+    frame = pd.DataFrame({
+        'Paying person': [payer for payer, _, _, _ in rows],
+        'Amount': [float(amount) for _, amount, _, _ in rows],
+        'Currency': 'DKK',
+        'Shared with': [list(members) for _, _, members, _ in rows],
+    })
+    for person in people:
+        frame[f"{person}'s share"] = [shares.get(person, np.nan) for _, _, _, shares in rows]
+    return frame
+
+# Function to add up the applied exact shares of every row
+def row_sums(entries, n_rows):
+    applied = entries['applied']
+    return np.bincount(entries['rows'][applied], weights=entries['shares'][applied], minlength=n_rows).astype(np.int64)
+
+def test_exact_shares_add_up_to_each_amount():
+    rng = random.Random(5)
+    people = ['Anna', 'Bo', 'Carl', 'Dina', 'Eva', 'Fred', 'Gus']
+    rows = []
+    for _ in range(500):
+        members = rng.sample(people, rng.randint(1, len(people)))
+        amount = rng.randint(1, 100000) / 100
+        shares = {}
+        if rng.random() < 0.4 and len(members) > 1:
+            # Explicit shares for some members that leave a remainder for the others
+            for person in rng.sample(members, rng.randint(1, len(members) - 1)):
+                shares[person] = rng.randint(0, int(amount * 100) // len(members)) / 100
+        rows.append((rng.choice(people), amount, members, shares))
+
+    ledger = balance_engine.encode_ledger(ledger_frame(rows))
+    entries = balance_engine.compute_shares(ledger, exact=True)
+    assert entries['shares'].dtype == np.int64
+    assert np.array_equal(row_sums(entries, len(rows)), money.to_minor_units([amount for _, amount, _, _ in rows]))
+
+    # Explicit shares are kept to the øre
+    for row, (_, _, members, shares) in enumerate(rows):
+        start = ledger['shared_offsets'][row]
+        for i, person in enumerate(members):
+            if person in shares:
+                assert entries['shares'][start + i] == money.to_minor_units([shares[person]])[0]
+
+def test_exact_split_is_deterministic_and_follows_ledger_order():
+    rows = [('Anna', 100, ['Anna', 'Bo', 'Carl'], {}),
+            ('Bo', 100, ['Carl', 'Bo', 'Anna'], {}),
+            ('Carl', 10, ['Anna', 'Bo', 'Carl', 'Dina'], {'Anna': 4.99}),
+            ('Dina', 0.05, ['Anna', 'Bo', 'Carl', 'Dina', 'Eva', 'Fred'], {})]
+    ledger = balance_engine.encode_ledger(ledger_frame(rows))
+    entries = balance_engine.compute_shares(ledger, exact=True)
+    assert entries['shares'].tolist() == [3334, 3333, 3333,
+                                          3334, 3333, 3333,
+                                          499, 167, 167, 167,
+                                          1, 1, 1, 1, 1, 0]
+    again = balance_engine.compute_shares(balance_engine.encode_ledger(ledger_frame(rows)), exact=True)
+    assert np.array_equal(entries['shares'], again['shares'])
+
+    # The ledger's totals add up to exactly what was paid
+    paid, _ = balance_engine.paid_totals(ledger, exact=True)
+    shares, _ = balance_engine.share_totals(ledger, entries)
+    assert paid.sum() == shares.sum() == 21005
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from conftest import write_workbook
+
+import balance_engine
+import ledger
+import parallel_shares
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with', "Anna's share", "Bo's share"]
+
+# Function to build rows with equal splits, explicit shares, remainder splits and amounts that do not split evenly
+def sample_rows(count):
+    people = ['Anna', 'Bo', 'Carl', 'Dina', 'Eva']
+    rows = []
+    for i in range(count):
+        shared = ', '.join(people[:2 + i % 4])
+        anna_share = 10.5 if i % 7 == 0 else None
+        bo_share = 3.33 if i % 11 == 0 else None
+        rows.append([people[i % 5], f"item {i}", 10 + i * 0.37, 'EUR' if i % 9 == 0 else None, shared, anna_share, bo_share])
+    return rows
+
+@pytest.mark.parametrize('exact', [False, True])
+def test_partitioned_shares_match_one_process(offline, monkeypatch, exact):
+    monkeypatch.setattr(parallel_shares, 'PARALLEL_MIN_ROWS', 10)
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, sample_rows(400))
+
+    single = ledger.Ledger.load(file_name, exact=exact, workers=1)
+    partitioned = ledger.Ledger.load(file_name, exact=exact, workers=2)
+    assert single.partitioned is None
+    assert partitioned.partitioned is not None
+
+    # Every share is computed within its own row, so the entries are identical
+    expected = balance_engine.compute_shares(single.encoded, exact)
+    entries = partitioned.share_entries
+    for name in ('shares', 'applied', 'rows', 'people'):
+        assert np.array_equal(entries[name], expected[name])
+
+    # The totals are summed per chunk, so they may only differ by float noise, never by an øre
+    assert partitioned.paid_totals.keys() == single.paid_totals.keys()
+    assert partitioned.share_totals.keys() == single.share_totals.keys()
+    for person in single.share_totals:
+        assert round(partitioned.paid_totals.get(person, 0), 2) == round(single.paid_totals.get(person, 0), 2)
+        assert round(partitioned.share_totals[person], 2) == round(single.share_totals[person], 2)
+        if exact:
+            assert partitioned.share_totals[person] == single.share_totals[person]
+    assert partitioned.net_balances == single.net_balances
+
+def test_chunk_bounds_cover_every_row():
+    offsets = np.array([0, 3, 3, 5, 9, 10, 14])
+    bounds = parallel_shares.chunk_bounds(offsets, 4)
+    assert bounds[0] == 0 and bounds[-1] == 6
+    assert bounds == sorted(set(bounds))
@@ -0,0 +1,28 @@
+import threading
+
+import rate_provider
+
+def test_cache_file_depends_on_the_sources():
+    first = rate_provider.default_cache_file('DKK', sources=['https://example.org/a'])
+    second = rate_provider.default_cache_file('DKK', sources=['https://example.org/b'])
+    assert first != second
+    assert first == rate_provider.default_cache_file('DKK', sources=['https://example.org/a'])
+    assert first != rate_provider.default_cache_file('DKK', historical=True, sources=['https://example.org/a'])
+
+def test_cached_rates_from_another_source_are_ignored(tmp_path):
+    cache_file = str(tmp_path / 'rates.json')
+    rate_provider.write_rate_cache(cache_file, {'EUR': 0.134}, 'https://example.org/a', 'DKK')
+    assert rate_provider.read_rate_cache(cache_file, 'DKK', 'https://example.org/a')[0] == {'EUR': 0.134}
+    assert rate_provider.read_rate_cache(cache_file, 'DKK', 'https://example.org/b') == (None, None)
+
+def test_every_thread_gets_its_own_session():
+    sessions = rate_provider.ThreadSessions()
+    seen = []
+    with sessions:
+        seen.append(sessions.get())
+        assert sessions.get() is seen[0]
+        thread = threading.Thread(target=lambda: seen.append(sessions.get()))
+        thread.start()
+        thread.join()
+    assert seen[0] is not seen[1]
+    assert len(sessions.sessions) == 2
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from conftest import write_workbook
+
+import ledger
+import report_writer
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+
+def test_totals_come_from_the_ledger_not_the_listed_items():
+    stream = io.StringIO()
+    # Only one of Anna's two payments is listed
+    report_writer.render_text(stream, 'expenses', {'Anna': 20.0, 'Bo': -20.0}, {}, {'Anna': [('dinner', 30.0)]},
+                              {'Anna': [('dinner', 20.0, 30.0)], 'Bo': [('dinner', 20.0, 30.0)]}, datetime.now(),
+                              paid_totals={'Anna': 60.0}, share_totals={'Anna': 40.0, 'Bo': 20.0})
+    assert "Total Paid: 60.00 DKK" in stream.getvalue()
+    assert "Total Share: 40.00 DKK" in stream.getvalue()
+
+def test_reports_keep_the_totals_with_max_items(offline, monkeypatch):
+    monkeypatch.setenv('EXPENSE_SPLITTER_MAX_ITEMS', '1')
+    rows = [['Anna', f"item {i}", 10.01 + i, 'EUR' if i % 2 else None, 'Anna, Bo, Carl'] for i in range(9)]
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, rows)
+    expenses = ledger.Ledger.load(file_name)
+    expenses.write_reports(formats=['txt', 'csv'])
+
+    with open(offline / 'expenses_balances.csv', encoding='utf-8', newline='') as f:
+        totals = {row['person']: row for row in csv.DictReader(f)}
+    for person, share in expenses.share_totals.items():
+        assert totals[person]['total_share'] == str(round(share, 2))
+    assert totals['Anna']['total_paid'] == str(expenses.paid_totals['Anna'])
+    text = (offline / 'expenses_report.txt').read_text(encoding='utf-8')
+    assert f"Total Paid: {expenses.paid_totals['Anna']:.2f} DKK" in text
+
+def test_reports_mark_amounts_that_were_not_converted(offline, monkeypatch):
+    # A rates source without USD, so the USD rows stay in dollars
+    (offline / 'rates.json').write_text('{"DKK": 1.0, "EUR": 0.134}')
+    rows = [['Anna', 'hotel', 100, 'USD', 'Anna, Bo'], ['Bo', 'dinner', 50, 'EUR', 'Anna, Bo'], ['Bo', 'taxi', 30, None, 'Anna, Bo']]
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, rows)
+    expenses = ledger.Ledger.load(file_name)
+    assert expenses.unconverted_currencies == ['USD']
+    expenses.write_reports(formats=['txt', 'csv', 'json'])
+
+    text = (offline / 'expenses_report.txt').read_text(encoding='utf-8')
+    assert "Warning: no exchange rate for USD" in text
+    with open(offline / 'expenses_balances.csv', encoding='utf-8', newline='') as f:
+        assert {row['unconverted_currencies'] for row in csv.DictReader(f)} == {'USD'}
+    report = json.loads((offline / 'expenses_report.json').read_text(encoding='utf-8'))
+    assert report['unconverted_currencies'] == ['USD']
+
+def test_converted_reports_have_no_warning(offline):
+    rows = [['Anna', 'hotel', 100, 'USD', 'Anna, Bo'], ['Bo', 'dinner', 50, 'EUR', 'Anna, Bo']]
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, rows)
+    expenses = ledger.Ledger.load(file_name)
+    expenses.write_reports(formats=['txt', 'json'])
+    assert "Warning" not in (offline / 'expenses_report.txt').read_text(encoding='utf-8')
+    assert json.loads((offline / 'expenses_report.json').read_text(encoding='utf-8'))['unconverted_currencies'] == []
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import write_workbook
+
+import ledger
+import rollups
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with', 'Date', 'Category']
+
+# Function to build rows over two months and three categories, some without a date or a category
+def sample_rows():
+    rows = []
+    for i in range(40):
+        date = None if i % 9 == 4 else datetime(2024, 3 + i % 2, 1 + i % 28)
+        category = [None, 'Food', 'Travel', 'Food'][i % 4]
+        shared = 'Anna, Bo, Carl' if i % 3 else 'Anna, Bo, Carl, Dina'
+        rows.append([['Anna', 'Bo', 'Carl', 'Dina'][i % 4], f"item {i}", 10 + i * 1.37, 'EUR' if i % 5 == 0 else None, shared, date, category])
+    return rows
+
+# Function to keep the rows in a date range (both days included) and/or categories, as a filter on the workbook would
+def select(rows, start=None, end=None, categories=None):
+    selected = []
+    for row in rows:
+        date, category = row[5], row[6] or rollups.UNCATEGORIZED
+        if start is not None or end is not None:
+            if date is None or (start is not None and date.date() < start) or (end is not None and date.date() > end):
+                continue
+        if categories is not None and category not in categories:
+            continue
+        selected.append(row)
+    return selected
+
+# Function to compute the totals of some rows with a full Ledger run on a workbook holding only those rows
+def ledger_totals(directory, rows, exact):
+    if not rows:
+        return {}, {}
+    expenses = ledger.Ledger.load(write_workbook(directory / 'selected.xlsx', HEADER, rows), use_cache=False, exact=exact)
+    return expenses.paid_totals, expenses.share_totals
+
+day = lambda text: datetime.strptime(text, '%Y-%m-%d').date()
+
+CASES = [
+    (None, None, None),
+    ('2024-03-05', '2024-03-20', None),
+    ('2024-03-15', None, None),
+    (None, '2024-03-31', None),
+    ('2023-01-01', '2025-12-31', None),  # Both ends outside the data
+    ('2024-02-01', '2024-03-10', ['Food']),
+    (None, None, ['Travel', rollups.UNCATEGORIZED]),
+    (None, None, 'Food'),
+    ('2024-06-01', '2024-07-01', None),  # After the data: empty
+    ('2024-03-20', '2024-03-10', None),  # End before start: empty
+    (None, None, ['Rent']),  # Unknown category: empty
+]
+
+@pytest.mark.parametrize('exact', [False, True])
+def test_rollup_totals_match_a_ledger_of_the_filtered_rows(offline, exact):
+    rows = sample_rows()
+    expenses = ledger.Ledger.load(write_workbook(offline / 'expenses.xlsx', HEADER, rows), use_cache=False, exact=exact)
+    for start, end, category in CASES:
+        categories = [category] if isinstance(category, str) else category
+        selected = select(rows, start and day(start), end and day(end), categories)
+        paid, shares = expenses.rollups.totals(start, end, category)
+        expected_paid, expected_shares = ledger_totals(offline, selected, exact)
+        if exact:
+            # Exact mode is whole øre on both sides
+            assert paid == expected_paid
+            assert shares == expected_shares
+        else:
+            assert paid == pytest.approx(expected_paid, abs=0.005)
+            assert shares == pytest.approx(expected_shares, abs=1e-6)
+
+def test_rows_without_a_date_only_count_without_a_range(offline):
+    rows = sample_rows()
+    expenses = ledger.Ledger.load(write_workbook(offline / 'expenses.xlsx', HEADER, rows), use_cache=False)
+    everything, _ = expenses.rollups.totals()
+    all_dates, _ = expenses.rollups.totals('2000-01-01', '2100-01-01')
+    undated = sum(row[2] for row in rows if row[5] is None and row[0] == 'Bo' and row[3] is None)
+    assert everything['Bo'] - all_dates['Bo'] == pytest.approx(undated)
+
+def test_views_and_months(offline):
+    rows = sample_rows()
+    expenses = ledger.Ledger.load(write_workbook(offline / 'expenses.xlsx', HEADER, rows), use_cache=False)
+    assert expenses.rollups.months() == ['2024-03', '2024-04']
+    assert rollups.period_bounds('2024-03') == (day('2024-03-01'), day('2024-03-31'))
+    view = expenses.rollups.view(*rollups.period_bounds('2024-04'))
+    expected = ledger.Ledger.from_totals(*ledger_totals(offline, select(rows, day('2024-04-01'), day('2024-04-30')), False))
+    assert view.net_balances == pytest.approx(expected.net_balances, abs=0.011)
+    with pytest.raises(ValueError):
+        rollups.day_number('not a date')
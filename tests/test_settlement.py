@@ -0,0 +1,98 @@
+import itertools
+import random
+
+import pytest
+
+import settlement
+
+# Function to apply transfers to balances in øre, returning what is left open per person
+def remaining(balances, transfers):
+    left = dict(balances)
+    for debtor, creditor, amount in transfers:
+        left[debtor] += amount
+        left[creditor] -= amount
+    return left
+
+# Function to find the fewest transfers that settle balances by trying every partition into zero-sum groups
+def brute_force_transfer_count(balances):
+    amounts = [amount for amount in balances.values() if amount != 0]
+
+    def most_groups(items):
+        if not items:
+            return 0
+        first, rest = items[0], items[1:]
+        best = 0
+        # The group holding the first item: try every subset of the others that makes it sum to zero
+        for size in range(len(rest) + 1):
+            for chosen in itertools.combinations(range(len(rest)), size):
+                if first + sum(rest[i] for i in chosen) == 0:
+                    others = [rest[i] for i in range(len(rest)) if i not in chosen]
+                    best = max(best, 1 + most_groups(others))
+        return best
+
+    return len(amounts) - most_groups(amounts)
+
+def test_exact_settles_every_balance():
+    balances = {'Anna': -4500, 'Bo': -1500, 'Carl': 2500, 'Dina': 3500}
+    transfers = settlement.settle(balances, 'exact')
+    assert all(amount > 0 for _, _, amount in transfers)
+    assert all(left == 0 for left in remaining(balances, transfers).values())
+
+def test_exact_finds_the_minimum_number_of_transfers():
+    # {F, C, A} and {D, E, B} both sum to zero, so 4 transfers do; greedy splits B's credit and needs 5
+    balances = {'A': 500, 'B': 300, 'C': 600, 'D': -700, 'E': 400, 'F': -1100}
+    transfers = settlement.settle(balances, 'exact')
+    assert len(transfers) == brute_force_transfer_count(balances) == 4
+    assert len(settlement.settle(balances, 'greedy')) == 5
+
+def test_exact_matches_brute_force_on_random_balances():
+    rng = random.Random(7)
+    for _ in range(200):
+        n = rng.randint(2, 8)
+        amounts = [rng.choice([-3, -2, -1, 1, 2, 3]) * 100 for _ in range(n - 1)]
+        amounts.append(-sum(amounts))
+        balances = {f"P{i}": amount for i, amount in enumerate(amounts)}
+        transfers = settlement.settle(balances, 'exact')
+        assert all(left == 0 for left in remaining(balances, transfers).values())
+        assert len(transfers) == brute_force_transfer_count(balances)
+
+def test_exact_pairs_opposite_balances_in_ledger_order():
+    # Both creditors are owed exactly what each debtor owes; the first creditor listed goes to the first debtor
+    balances = {'A': -1000, 'B': 1000, 'C': 1000, 'D': -1000}
+    assert settlement.settle(balances, 'exact') == [('A', 'B', 1000), ('D', 'C', 1000)]
+
+def test_greedy_breaks_ties_by_ledger_order():
+    balances = {'A': -1000, 'B': -1000, 'C': 1000, 'D': 1000}
+    assert settlement.settle(balances, 'greedy') == [('A', 'C', 1000), ('B', 'D', 1000)]
+    assert settlement.settle({'A': -1000, 'B': -1000, 'C': 2000}, 'greedy') == [('A', 'C', 1000), ('B', 'C', 1000)]
+
+def test_settlement_is_deterministic():
+    balances = {f"P{i}": amount for i, amount in enumerate([-500, 250, 250, -500, 500, -250, 250])}
+    assert settlement.settle(balances, 'exact') == settlement.settle(dict(balances), 'exact')
+
+def test_unbalanced_difference_stays_open():
+    balances = {'A': -1000, 'B': 900}
+    transfers = settlement.settle(balances, 'exact')
+    assert transfers == [('A', 'B', 900)]
+    assert remaining(balances, transfers) == {'A': -100, 'B': 0}
+
+def test_auto_uses_greedy_above_the_solver_limit():
+    rng = random.Random(3)
+    amounts = [rng.randint(1, 5000) * (1 if i % 2 else -1) for i in range(settlement.EXACT_SOLVER_LIMIT + 5)]
+    amounts.append(-sum(amounts))
+    balances = {f"P{i}": amount for i, amount in enumerate(amounts)}
+    assert settlement.settle(balances, 'auto') == settlement.settle(balances, 'greedy')
+
+def test_zero_sum_groups_partitions_every_balance():
+    groups = settlement.zero_sum_groups([-5, 5, -3, 1, 2])
+    assert sorted(i for group in groups for i in group) == [0, 1, 2, 3, 4]
+    assert len(groups) == 2
+    assert all(sum([-5, 5, -3, 1, 2][i] for i in group) == 0 for group in groups)
+
+def test_simplify_debts_works_in_dkk():
+    transfers = settlement.simplify_debts({'Anna': -10.5, 'Bo': 10.5})
+    assert transfers == [('Anna', 'Bo', 10.5)]
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        settlement.settle({'A': -1, 'B': 1}, 'fastest')
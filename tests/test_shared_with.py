@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import write_workbook
+
+import ledger
+import shared_with
+import small_ledger
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with', "Anna's share", "Bo's share"]
+
+@pytest.mark.parametrize('text, names', [
+    ('Anna, Bo, Carl', ['Anna', 'Bo', 'Carl']),
+    ('Anna,Bo;Carl', ['Anna', 'Bo', 'Carl']),
+    (' Anna ;  Bo\nCarl ', ['Anna', 'Bo', 'Carl']),
+    ('Anna, , Bo,', ['Anna', 'Bo']),
+    ('Anna Berg; Bo', ['Anna Berg', 'Bo']),
+    (None, []),
+    (12.0, []),
+])
+def test_split_names_accepts_any_separator(text, names):
+    assert shared_with.split_names(text) == names
+
+# Function to validate a workbook on both the pandas path and the small-ledger path, checking they agree
+def validate_both(path, header, rows):
+    file_name = write_workbook(path, header, rows)
+    report = ledger.Ledger.load(file_name, use_cache=False).validation
+    assert small_ledger.validate_expenses(small_ledger.load_expenses(file_name, {})) == report
+    return report
+
+def test_each_problem_points_at_its_workbook_row(offline):
+    rows = [
+        ['Anna', 'hotel', 300, None, 'Anna;Bo ,Carl', None, None],  # Row 2: fine, mixed separators
+        ['Bo', 'dinner', 90, None, 'Anna, Bo, Dave', None, None],  # Row 3: Dave is nobody
+        [None, 'skipped', 10, None, 'Anna', None, None],  # Row 4: no payer, dropped
+        ['Carl', 'taxi', 40, None, 'Anna; Carl; Anna', None, None],  # Row 5: Anna twice
+        ['Anna', 'museum', 50, None, 'Anna, Bo', 30, 25],  # Row 6: 55 of 50
+        ['Bo', 'tickets', 50, None, 'Anna, Bo', 30, 20.004],  # Row 7: within rounding
+        ['Carl', 'boat', 50, None, 'Bo, Carl', 60, 10],  # Row 8: Anna's share does not apply, she is not listed
+    ]
+    report = validate_both(offline / 'expenses.xlsx', HEADER, rows)
+    assert report['checked_names']
+    assert report['unknown'] == [(3, 'Dave')]
+    assert report['duplicates'] == [(5, 'Anna')]
+    assert report['over_allocated'] == [(6, 55.0, 50.0)]
+    assert shared_with.has_issues(report)
+    assert shared_with.format_report(report) == [
+        "Unknown names in 'Shared with': 1",
+        "  row 3: Dave",
+        "Names listed twice in 'Shared with': 1",
+        "  row 5: Anna",
+        "Explicit shares exceeding the amount: 1",
+        "  row 6: shares add up to 55.00 of 50.00",
+    ]
+
+def test_names_are_only_checked_with_share_columns(offline):
+    header = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+    rows = [['Anna', 'hotel', 300, None, 'Anna, Bo, Dave'], ['Bo', 'taxi', 20, None, 'Bo; Bo']]
+    report = validate_both(offline / 'expenses.xlsx', header, rows)
+    assert not report['checked_names']
+    assert report['unknown'] == []
+    assert report['duplicates'] == [(3, 'Bo')]
+    assert shared_with.format_report(report)[-1] == "Names were not checked against the participants: the ledger has no share columns."
+
+def test_given_participants_are_checked_without_share_columns(offline):
+    header = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+    file_name = write_workbook(offline / 'expenses.xlsx', header, [['Anna', 'hotel', 300, None, 'Anna, Bo, Dave']])
+    report = shared_with.validate(ledger.Ledger.load(file_name, use_cache=False).df, participants=['Anna', 'Bo'])
+    assert report['unknown'] == [(2, 'Dave')]
+
+def test_long_lists_are_cut_short():
+    report = {'checked_names': True, 'unknown': [(row, 'X') for row in range(2, 15)], 'duplicates': [], 'over_allocated': []}
+    lines = shared_with.format_report(report, max_listed=3)
+    assert lines == ["Unknown names in 'Shared with': 13", "  row 2: X", "  row 3: X", "  row 4: X", "  ... and 10 more"]
+    assert not shared_with.has_issues({'checked_names': True, 'unknown': [], 'duplicates': [], 'over_allocated': []})
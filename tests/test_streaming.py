@@ -0,0 +1,58 @@
+import os
+
+from conftest import write_workbook
+
+import ledger
+import ledger_cache
+import streaming
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+
+# Function to build rows with a blank row and a name listed twice far into the sheet
+def sample_rows(count):
+    rows = []
+    for i in range(count):
+        payer = ['Anna', 'Bo', 'Carl'][i % 3]
+        rows.append([payer, f"item {i}", 10 + i % 7, 'EUR' if i % 5 == 0 else None, 'Anna, Bo, Carl'])
+    rows[4][0] = None  # Dropped: no paying person
+    rows[40][4] = 'Anna, Bo, Bo'  # Workbook row 42
+    return rows
+
+def test_streamed_chunks_are_indexed_by_workbook_row(offline):
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, sample_rows(60))
+    chunks = list(streaming.iter_expense_chunks(file_name, chunk_size=7))
+    index = [label for chunk in chunks for label in chunk.index]
+    assert index == [i for i in range(60) if i != 4]
+
+def test_ledger_load_after_streaming_uses_the_cached_ledger(offline):
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, sample_rows(60))
+    expected = ledger.Ledger.load(file_name, use_cache=False)
+
+    # Streaming writes the cache entry that Ledger.load reads afterwards
+    individual_expenses, total_shares, row_count = streaming.stream_balances(file_name, chunk_size=7)
+    assert row_count == expected.row_count
+    cached = ledger.Ledger.load(file_name)
+
+    assert cached.df.index.is_unique
+    assert list(cached.df.index) == list(expected.df.index)
+    assert cached.net_balances == expected.net_balances
+    assert cached.validation['duplicates'] == [(42, 'Bo')]
+    assert ledger.calculate_net_balances(individual_expenses, total_shares) == expected.net_balances
+
+def test_entry_published_by_another_process_is_kept(offline, monkeypatch):
+    file_name = write_workbook(offline / 'expenses.xlsx', HEADER, sample_rows(60))
+    expected = ledger.Ledger.load(file_name, use_cache=False)
+    replace = os.replace
+
+    # Another process publishes the same entry between the existence check and the rename
+    def publish_first(source, target):
+        os.makedirs(target)
+        open(os.path.join(target, 'theirs'), 'w').close()
+        replace(source, target)
+    monkeypatch.setattr(ledger_cache.os, 'replace', publish_first)
+
+    individual_expenses, total_shares, row_count = streaming.stream_balances(file_name, chunk_size=7)
+    assert ledger.calculate_net_balances(individual_expenses, total_shares) == expected.net_balances
+    entries = os.listdir(offline / 'ledgers')
+    assert len(entries) == 1
+    assert os.listdir(offline / 'ledgers' / entries[0]) == ['theirs']
@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from conftest import write_workbook
+
+import ledger
+import what_if
+
+HEADER = ['Paying person', 'Description', 'Amount', 'Currency', 'Shared with']
+
+# Function to apply transfers to balances, returning what is left open per person
+def remaining(balances, transfers):
+    left = dict(balances)
+    for debtor, creditor, amount in transfers:
+        left[debtor] = left.get(debtor, 0) + amount
+        left[creditor] = left.get(creditor, 0) - amount
+    return left
+
+# Function to build a ledger's totals from expenses given as (payer, amount, people sharing it equally)
+def totals_of(expenses):
+    paid, shares = {}, {}
+    for payer, amount, people in expenses:
+        paid[payer] = paid.get(payer, 0) + amount
+        for person in people:
+            shares[person] = shares.get(person, 0) + amount / len(people)
+    return paid, shares
+
+# Function to build a random ledger of equally split expenses
+def random_expenses(rng, people, count):
+    expenses = []
+    for _ in range(count):
+        sharing = rng.sample(people, rng.randint(1, len(people)))
+        expenses.append((rng.choice(people), rng.randint(1, 500) * 1.25, sharing))
+    return expenses
+
+# Function to check a scenario against a full re-settlement and a recompute of the changed ledger
+def check_scenario(scenario, expenses, change_expenses):
+    change = what_if.combine_changes(*(what_if.expense_change(payer, amount, people) for payer, amount, people in change_expenses))
+    balances, transfers = scenario.simulate(change)
+    full_balances, full_transfers = scenario.simulate(change, full=True)
+
+    recomputed = ledger.Ledger.from_totals(*totals_of(expenses + change_expenses))
+    assert balances == full_balances
+    assert balances == pytest.approx(recomputed.net_balances, abs=0.011)
+
+    # Both settle every new balance, up to what the ledger itself leaves unbalanced
+    open_amount = abs(round(sum(balances.values()), 2))
+    for result in (transfers, full_transfers):
+        assert all(amount > 0 for _, _, amount in result)
+        left = remaining(balances, result)
+        assert sum(abs(amount) for amount in left.values()) == pytest.approx(open_amount, abs=0.011)
+    return balances, transfers
+
+def test_scenario_matches_a_full_settlement_and_a_recompute():
+    expenses = [('Anna', 300, ['Anna', 'Bo', 'Carl']), ('Bo', 120, ['Bo', 'Dina']), ('Carl', 90, ['Anna', 'Carl']),
+                ('Dina', 400, ['Anna', 'Bo', 'Carl', 'Dina']), ('Eva', 60, ['Eva', 'Fred']), ('Fred', 20, ['Eva', 'Fred'])]
+    scenario = what_if.WhatIf(*totals_of(expenses))
+    check_scenario(scenario, expenses, [('Bo', 75, ['Anna', 'Bo'])])
+
+def test_transfers_of_unaffected_people_are_kept():
+    # Eva and Fred settle among themselves; a change between Anna and Bo must not touch their transfer
+    expenses = [('Anna', 100, ['Anna', 'Bo']), ('Eva', 60, ['Eva', 'Fred']), ('Carl', 30, ['Carl', 'Dina'])]
+    scenario = what_if.WhatIf(*totals_of(expenses))
+    assert ('Fred', 'Eva', 30.0) in scenario.transfers
+    balances, transfers = check_scenario(scenario, expenses, [('Bo', 40, ['Anna', 'Bo'])])
+    assert ('Fred', 'Eva', 30.0) in transfers
+    assert ('Dina', 'Carl', 15.0) in transfers
+    # Anna's old transfer is dropped and replaced by one for the new balances
+    assert ('Bo', 'Anna', 50.0) not in transfers
+    assert ('Bo', 'Anna', 30.0) in transfers
+
+def test_change_without_effect_keeps_the_baseline():
+    expenses = [('Anna', 100, ['Anna', 'Bo'])]
+    scenario = what_if.WhatIf(*totals_of(expenses))
+    balances, transfers = scenario.simulate(what_if.payment_change('Anna', 'Anna', 25))
+    assert balances == scenario.net_balances
+    assert transfers == scenario.transfers
+
+def test_new_people_and_settling_up():
+    expenses = [('Anna', 90, ['Anna', 'Bo', 'Carl'])]
+    scenario = what_if.WhatIf(*totals_of(expenses))
+    # Bo pays Anna back, and Dina joins with an expense of her own
+    balances, transfers = scenario.simulate(what_if.payment_change('Bo', 'Anna', 30), what_if.expense_change('Dina', 40, 'Dina, Carl'))
+    assert balances['Bo'] == 0
+    assert balances['Dina'] == 20
+    assert all(amount == pytest.approx(0, abs=0.011) for amount in remaining(balances, transfers).values())
+
+def test_unbalanced_ledger_keeps_its_leftover():
+    # Explicit-share rounding can leave a ledger a little off zero; the scenario must settle the rest anyway
+    paid = {'Anna': 100.0, 'Bo': 50.0, 'Carl': 0.0}
+    shares = {'Anna': 50.0, 'Bo': 50.0, 'Carl': 49.97}
+    scenario = what_if.WhatIf(paid, shares)
+    assert scenario.unsettled
+    balances, transfers = scenario.simulate(what_if.expense_change('Carl', 30, ['Bo', 'Carl']))
+    full_balances, full_transfers = scenario.simulate(what_if.expense_change('Carl', 30, ['Bo', 'Carl']), full=True)
+    assert balances == full_balances
+    left = remaining(balances, transfers)
+    assert sum(abs(amount) for amount in left.values()) == pytest.approx(abs(sum(balances.values())), abs=0.011)
+
+def test_random_scenarios():
+    rng = random.Random(11)
+    people = [f"P{i}" for i in range(8)]
+    for _ in range(100):
+        expenses = random_expenses(rng, people, rng.randint(3, 15))
+        scenario = what_if.WhatIf(*totals_of(expenses))
+        check_scenario(scenario, expenses, random_expenses(rng, people + ['New'], rng.randint(1, 3)))
+
+def test_row_edits_match_the_edited_workbook(offline):
+    rows = [['Anna', 'hotel', 300, None, 'Anna, Bo, Carl'], ['Bo', 'dinner', 120, None, 'Bo, Dina'],
+            ['Carl', 'taxi', 45, 'EUR', 'Anna, Carl'], ['Dina', 'museum', 80, None, 'Anna, Bo, Carl, Dina']]
+    expenses = ledger.Ledger.load(write_workbook(offline / 'before.xlsx', HEADER, rows))
+    scenario = expenses.what_if()
+
+    edited = [row[:] for row in rows]
+    edited[1][2] = 200
+    edited[1][4] = 'Bo, Carl, Dina'
+    del edited[3]
+    after = ledger.Ledger.load(write_workbook(offline / 'after.xlsx', HEADER, edited))
+
+    # Workbook rows: the header is row 1, so the second expense is row 3 and the fourth is row 5
+    change = what_if.combine_changes(what_if.edit_row_change(expenses, 3, amount=200, shared_with_names='Bo, Carl, Dina'),
+                                     what_if.remove_row_change(expenses, 5))
+    balances, transfers = scenario.simulate(change)
+    assert balances == pytest.approx(after.net_balances, abs=0.011)
+    assert all(amount == pytest.approx(0, abs=0.011) for amount in remaining(balances, transfers).values())
+    with pytest.raises(ValueError):
+        what_if.remove_row_change(expenses, 9)
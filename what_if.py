@@ -0,0 +1,149 @@
+import math
+
+import settlement
+import shared_with
+import small_ledger
+
+# What-if simulation on top of a computed ledger. A change is a mapping {person: (paid, share)} of amounts
+# to add to what each person paid and owes; the helpers below build one for a hypothetical expense, a recorded
+# payment, or an edited or removed row. A scenario applies its changes to the ledger's totals and only
+# re-settles the balances it affected, so thousands of scenarios run in the time of one workbook pass.
+
+# Function to add changes together into one
+def combine_changes(*changes):
+    combined = {}
+    for change in changes:
+        for person, (paid, share) in change.items():
+            old_paid, old_share = combined.get(person, (0.0, 0.0))
+            combined[person] = (old_paid + paid, old_share + share)
+    return combined
+
+# Function to build the change of one hypothetical expense, split with the same rules as the ledger:
+# explicit shares first, then an equal split, or the remainder split between the people without a share
+def expense_change(payer, amount, shared_with_names, shares=None):
+    members = shared_with.split_names(shared_with_names) if isinstance(shared_with_names, str) else list(shared_with_names)
+    change = {payer: (amount, 0.0)}
+    if members:
+        expense = {'amount': amount, 'shared_with': members, 'shares': shares or {}}
+        change = combine_changes(change, *({person: (0.0, share)} for person, share in small_ledger.expense_shares(expense)))
+    return change
+
+# Function to build the change of a payment already made: the payer paid the amount and the payee owes all of it
+def payment_change(payer, payee, amount):
+    return combine_changes({payer: (amount, 0.0)}, {payee: (0.0, amount)})
+
+# Function to find the position of a workbook row (the header is row 1) in a ledger's DataFrame
+def row_position(expenses, row):
+    if expenses.df is None:
+        raise ValueError("Row edits need a ledger loaded from its workbook")
+    try:
+        return expenses.df.index.get_loc(row - 2)
+    except KeyError:
+        raise ValueError(f"Row {row} is not an expense in {expenses.file_name or 'the ledger'}") from None
+
+# Function to build the change that removes a workbook row from a ledger
+def remove_row_change(expenses, row):
+    import numpy as np
+
+    position = row_position(expenses, row)
+    payer = expenses.df['Paying person'].iloc[position]
+    change = {payer: (-float(expenses.df['Amount'].iloc[position]), 0.0)}
+
+    # The applied share entries are in row order, so the row's entries are one contiguous slice
+    entries = expenses.applied_shares
+    entry_rows = entries['row'].to_numpy()
+    start, end = np.searchsorted(entry_rows, [position, position + 1])
+    people = entries['person'].to_numpy(dtype=object)[start:end]
+    values = entries['share'].to_numpy(dtype=float)[start:end]
+    return combine_changes(change, *({person: (0.0, -float(share))} for person, share in zip(people, values)))
+
+# Function to build the change of editing a workbook row; the fields not given keep the row's values
+def edit_row_change(expenses, row, payer=None, amount=None, shared_with_names=None, shares=None):
+    position = row_position(expenses, row)
+    df = expenses.df
+    if payer is None:
+        payer = df['Paying person'].iloc[position]
+    if amount is None:
+        amount = float(df['Amount'].iloc[position])
+    if shared_with_names is None:
+        shared_with_names = df['Shared with'].iloc[position]
+        shared_with_names = shared_with_names if isinstance(shared_with_names, list) else []
+    if shares is None:
+        shares = {}
+        for column in df.columns:
+            if isinstance(column, str) and column.endswith(shared_with.SHARE_SUFFIX):
+                value = small_ledger.to_number(df[column].iloc[position])
+                if not math.isnan(value):
+                    shares[column[:-len(shared_with.SHARE_SUFFIX)]] = value
+    return combine_changes(remove_row_change(expenses, row), expense_change(payer, amount, shared_with_names, shares))
+
+# Baseline totals and settlement of a ledger, against which scenarios are evaluated
+class WhatIf:
+
+    def __init__(self, paid_totals, share_totals, strategy='auto', net_balances=None, transfers=None):
+        import ledger
+
+        self.paid_totals = dict(paid_totals)
+        self.share_totals = dict(share_totals)
+        self.strategy = strategy
+        self.net_balances = net_balances if net_balances is not None else ledger.calculate_net_balances(self.paid_totals, self.share_totals)
+        self.transfers = transfers if transfers is not None else settlement.simplify_debts(self.net_balances, strategy)
+
+        # The baseline transfers each person takes part in, so a scenario only revisits those
+        self.transfers_by_person = {}
+        open_amounts = settlement.to_minor_units(self.net_balances)
+        for i, (debtor, creditor, amount) in enumerate(self.transfers):
+            self.transfers_by_person.setdefault(debtor, []).append(i)
+            self.transfers_by_person.setdefault(creditor, []).append(i)
+            open_amounts[debtor] += int(round(amount * 100))
+            open_amounts[creditor] -= int(round(amount * 100))
+        # Balances that do not sum to zero leave somebody partly unsettled; they can take part in any scenario
+        self.unsettled = {person: amount for person, amount in open_amounts.items() if amount != 0}
+
+    # Start from a computed ledger, reusing its balances and settlement
+    @classmethod
+    def from_ledger(cls, expenses, strategy='auto'):
+        return cls(expenses.paid_totals, expenses.share_totals, strategy, expenses.net_balances, expenses.settlement(strategy))
+
+    # The new balance of everybody a change touches, rounded as calculate_net_balances does
+    def changed_balances(self, change):
+        balances = {}
+        for person, (paid, share) in change.items():
+            if not person:
+                continue
+            paid_total = self.paid_totals.get(person, 0) + paid
+            balances[person] = round(round(paid_total, 2) - (self.share_totals.get(person, 0) + share), 2)
+        return balances
+
+    # Apply one or more changes and settle the result. Only the affected people, the people they had
+    # baseline transfers with and anybody the baseline left unsettled are settled again; the other baseline
+    # transfers stay as they are. With full=True everybody is settled again, which may need fewer transfers
+    # but costs a full settlement.
+    # Returns (net balances, transfers).
+    def simulate(self, *changes, full=False):
+        change = changes[0] if len(changes) == 1 else combine_changes(*changes)
+        balances = {person: balance for person, balance in self.changed_balances(change).items()
+                    if balance != self.net_balances.get(person)}
+        net_balances = dict(self.net_balances)
+        net_balances.update(balances)
+        if not balances:
+            return net_balances, self.transfers
+        if full:
+            return net_balances, settlement.simplify_debts(net_balances, self.strategy)
+
+        # Drop the baseline transfers of the affected people; their counterparties get those amounts back to settle
+        open_balances = {person: amount for person, amount in self.unsettled.items() if person not in balances}
+        open_balances.update(settlement.to_minor_units(balances))
+        dropped = set()
+        for person in balances:
+            dropped.update(self.transfers_by_person.get(person, ()))
+        for i in dropped:
+            debtor, creditor, amount = self.transfers[i]
+            amount = int(round(amount * 100))
+            if debtor not in balances:
+                open_balances[debtor] = open_balances.get(debtor, 0) - amount
+            if creditor not in balances:
+                open_balances[creditor] = open_balances.get(creditor, 0) + amount
+
+        kept = [transfer for i, transfer in enumerate(self.transfers) if i not in dropped] if dropped else list(self.transfers)
+        return net_balances, kept + settlement.to_major_units(settlement.settle(open_balances, self.strategy))